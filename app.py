@@ -1,11 +1,29 @@
+import time
+
+# Đo thời gian import app (SDK nặng như cohere/pymilvus/groq được import lúc warm-up, không phải ở đây)
+_import_started = time.perf_counter()
+
+import asyncio
 import logging
+import signal
+
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 
 from auth.jwt_bearer import JWTBearer
-from config.config import get_database, initiate_database, Settings
+from config.config import close_client, get_client, get_settings, reload_settings
 from routes import router as api_router
-from utils.http_response import fail, json
+from services.consultation_writer import stop_consultation_writer
+from services.diagnosis_jobs import (
+    get_diagnosis_job_queue,
+    start_diagnosis_job_queue,
+    stop_diagnosis_job_queue,
+)
+from services.groq_service import close_groq_service, get_groq_service
+from services.warmup import get_startup_state, record_import_time, stop_warm_up, warm_up
+from utils.compression import compression_report
+from utils.http_response import FastJSONResponse, fail, json
+from utils.metrics import metrics
 
 # Cấu hình logging
 logging.basicConfig(
@@ -16,10 +34,10 @@ logging.basicConfig(
     ]
 )
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 token_listener = JWTBearer()
-settings = Settings()
+settings = get_settings()
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,9 +48,37 @@ app.add_middleware(
 )
 
 
+record_import_time(time.perf_counter() - _import_started)
+
+
 @app.on_event("startup")
 async def start_database():
-    await initiate_database()
+    # MongoDB, Cohere + Milvus, Groq client và các cache được warm-up song song, xem /ready
+    await warm_up()
+    start_diagnosis_job_queue()
+    try:
+        # kill -HUP <pid> nạp lại .env/biến môi trường cho từng worker mà không cần restart
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _reload_settings_on_signal)
+    except (NotImplementedError, AttributeError, RuntimeError) as e:
+        logging.getLogger(__name__).warning(f"Không đăng ký được SIGHUP để nạp lại settings: {e}")
+
+
+def _reload_settings_on_signal():
+    try:
+        reload_settings()
+    except Exception as e:
+        # Settings mới không hợp lệ: giữ nguyên settings đang dùng
+        logging.getLogger(__name__).error(f"Lỗi khi nạp lại settings: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    stop_warm_up()
+    await stop_diagnosis_job_queue()
+    await close_groq_service()
+    # Ghi nốt consultation trong buffer trước khi đóng kết nối MongoDB
+    await stop_consultation_writer()
+    close_client()
 
 
 @app.get("/", tags=["Root"])
@@ -57,14 +103,26 @@ async def read_root():
 async def health_check():
     """Endpoint kiểm tra sức khỏe chi tiết với standardized response"""
     try:
-        db = get_database()
-        db_status = "connected" if db is not None else "disconnected"
+        try:
+            # Dùng client chung, không tạo kết nối mới cho mỗi lần kiểm tra
+            await get_client().admin.command("ping")
+            db_status = "connected"
+        except Exception:
+            db_status = "disconnected"
+        groq_service = get_groq_service()
+        job_queue = get_diagnosis_job_queue()
 
         health_data = {
             "service": "pharmacy-ai-backend",
             "status": "khỏe mạnh",
             "version": "2.0.0",
             "database": db_status,
+            "llm": {
+                "circuit_breaker": groq_service.breaker.snapshot(),
+                "providers": groq_service.router.snapshot(),
+            },
+            "diagnosis_jobs": job_queue.snapshot() if job_queue else None,
+            "startup": get_startup_state().snapshot(),
             "timestamp": "2024-01-01T00:00:00Z",
         }
 
@@ -74,4 +132,34 @@ async def health_check():
         return fail(message="Kiểm tra sức khỏe thất bại", status=500, errors=str(e))
 
 
+@app.get("/ready", tags=["Root"])
+async def readiness_check():
+    """Readiness probe: 200 khi worker đã warm-up xong, 503 khi đang khởi động hoặc MongoDB không khả dụng"""
+    startup = get_startup_state()
+    if startup.ready:
+        return json(data=startup.snapshot(), message="Sẵn sàng nhận request")
+    return json(data=startup.snapshot(), message="Đang khởi động", status=503)
+
+
+@app.get("/metrics", tags=["Root"])
+async def get_metrics():
+    """Xuất metrics trong process (cache, độ trễ, bộ đếm...)"""
+    return json(data=metrics.snapshot(), message="Metrics hệ thống")
+
+
+@app.get("/metrics/compression", tags=["Root"])
+async def get_compression_report():
+    """Số byte tiết kiệm theo endpoint nhờ nén response và 304 Not Modified"""
+    return json(data=compression_report(), message="Báo cáo nén response")
+
+
+@app.post("/admin/settings/reload", tags=["Root"], dependencies=[Depends(token_listener)])
+async def reload_app_settings():
+    """Nạp lại settings từ .env/biến môi trường cho worker nhận request (chỉ trả về tên setting đã đổi)"""
+    try:
+        return json(data=reload_settings(), message="Đã nạp lại settings")
+    except Exception as e:
+        return fail(message="Settings mới không hợp lệ, giữ nguyên settings hiện tại", status=400, errors=[str(e)])
+
+
 app.include_router(api_router, prefix="/api/v1")
@@ -1,15 +1,29 @@
-from typing import Optional
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
 
 from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic_settings import BaseSettings
 import models as models
+from utils.mongo_metrics import CommandMetricsListener, PoolMetricsListener
+
+logger = logging.getLogger(__name__)
 
 
 class Settings(BaseSettings):
     # database configurations
     DATABASE_URL: Optional[str] = "mongodb://localhost:27017"
     DATABASE_NAME: str = "pharmacy"
+    # Pool kết nối MongoDB (một client dùng chung cho toàn ứng dụng)
+    MONGO_MAX_POOL_SIZE: int = 50
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: Optional[int] = 60000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_SOCKET_TIMEOUT_MS: Optional[int] = None
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = None
+    MONGO_READ_PREFERENCE: str = "primary"  # primary, primaryPreferred, secondaryPreferred, nearest...
 
     # JWT
     SECRET_KEY: str = "secret"
@@ -18,9 +32,67 @@ class Settings(BaseSettings):
     # LLM API KEY
     GROQ_API_KEY: Optional[str] = None
     GROQ_MODEL: str = "qwen-qwq-32b"
+    GROQ_MAX_CONCURRENCY: int = 8  # Số lời gọi Groq đồng thời tối đa
+    GROQ_TIMEOUT_SECONDS: float = 30.0
+    GROQ_MAX_RETRIES: int = 1
+    GROQ_MAX_CONNECTIONS: int = 20
+    GROQ_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    GROQ_DETERMINISTIC: bool = False  # temperature=0 và seed cố định để câu trả lời lặp lại ổn định
+    GROQ_DETERMINISTIC_SEED: int = 42
+    GROQ_REASONING_FORMAT: Optional[str] = "hidden"  # hidden/parsed/raw, None để không gửi tham số
     COHERE_API_KEY: Optional[str] = None
     COHERE_EMBEDDING_MODEL: str = "embed-multilingual-v3.0"
 
+    # Profile chẩn đoán (fast/standard/detailed) và chế độ JSON của provider
+    DIAGNOSIS_DEFAULT_PROFILE: str = "detailed"
+    LLM_JSON_MODE: bool = True
+
+    # LLM router (chọn provider theo độ trễ, hedge request)
+    LLM_PROVIDERS: str = "groq,gemini,deepseek"  # Thứ tự ưu tiên, chỉ provider có API key mới được dùng
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 1.0
+    LLM_ERROR_RATE_THRESHOLD: float = 0.5
+    LLM_STATS_WINDOW: int = 100
+
+    # Provider LLM dự phòng (API tương thích OpenAI)
+    GEMINI_API_KEY: Optional[str] = None
+    GEMINI_MODEL: str = "gemini-2.0-flash"
+    GEMINI_BASE_URL: str = "https://generativelanguage.googleapis.com/v1beta/openai"
+    DEEPSEEK_API_KEY: Optional[str] = None
+    DEEPSEEK_MODEL: str = "deepseek-chat"
+    DEEPSEEK_BASE_URL: str = "https://api.deepseek.com/v1"
+
+    # Instrumentation lời gọi LLM
+    LLM_LOG_SAMPLE_RATE: float = 0.05  # Tỉ lệ lời gọi được ghi log rút gọn
+    LLM_DEBUG_RESPONSE_SAMPLE_RATE: float = 0.0  # Tỉ lệ log toàn bộ response (chỉ khi bật DEBUG)
+    # Giá USD cho 1 triệu token [input, output] theo model, dùng để ước tính chi phí
+    LLM_PRICE_PER_MILLION_TOKENS: Dict[str, List[float]] = {
+        "qwen-qwq-32b": [0.29, 0.39],
+        "gemini-2.0-flash": [0.10, 0.40],
+        "deepseek-chat": [0.27, 1.10],
+    }
+
+    # Circuit breaker cho lời gọi LLM chẩn đoán
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_BREAKER_WINDOW_SIZE: int = 20
+    CIRCUIT_BREAKER_MIN_CALLS: int = 5
+    CIRCUIT_BREAKER_ERROR_RATE: float = 0.5
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS: float = 20.0
+    CIRCUIT_BREAKER_SLOW_CALL_RATE: float = 0.8
+    CIRCUIT_BREAKER_OPEN_SECONDS: float = 30.0
+    CIRCUIT_BREAKER_HALF_OPEN_CALLS: int = 1
+
+    # Diagnosis cache (khớp chính xác triệu chứng + nhóm tuổi + giới tính)
+    DIAGNOSIS_CACHE_ENABLED: bool = True
+    DIAGNOSIS_CACHE_TTL_SECONDS: int = 3600
+    DIAGNOSIS_CACHE_MAX_ENTRIES: int = 1000
+
+    # Semantic diagnosis cache (tương đồng embedding triệu chứng)
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_MAX_AGE_SECONDS: int = 7 * 24 * 3600
+    MILVUS_DIAGNOSIS_CACHE_COLLECTION: str = "diagnosis_cache"
+
     # Milvus configurations
     MILVUS_URI: Optional[str] = None
     MILVUS_TOKEN: Optional[str] = None
@@ -29,6 +101,62 @@ class Settings(BaseSettings):
     # Embedding configurations
     EMBEDDING_DIMENSION: int = 1024
 
+    # Search cursor (phân trang kết quả vector search), lưu cùng backend với RESULT_CACHE_BACKEND
+    SEARCH_CURSOR_TTL_SECONDS: int = 600
+    SEARCH_CURSOR_MAX_ENTRIES: int = 1000
+
+    # Chế độ job chẩn đoán bất đồng bộ (POST trả job id, worker chạy nền)
+    DIAGNOSIS_JOBS_ENABLED: bool = False
+    DIAGNOSIS_JOB_WORKERS: int = 4
+    DIAGNOSIS_JOB_QUEUE_SIZE: int = 100
+    DIAGNOSIS_JOB_RESULT_TTL_SECONDS: int = 600
+    DIAGNOSIS_JOB_LONG_POLL_MAX_SECONDS: float = 30.0
+
+    # Ghi consultation kiểu write-behind (gom insert_many theo batch/khoảng thời gian)
+    CONSULTATION_WRITE_BEHIND_ENABLED: bool = False
+    CONSULTATION_WRITE_BATCH_SIZE: int = 50
+    CONSULTATION_WRITE_FLUSH_INTERVAL_SECONDS: float = 1.0
+    CONSULTATION_WRITE_MAX_PENDING: int = 10000  # Vượt quá thì ghi trực tiếp
+    CONSULTATION_WRITE_SPILL_PATH: Optional[str] = "data/consultation_spill.jsonl"  # None để tắt spill file
+    CONSULTATION_WRITE_SPILL_FSYNC: bool = False
+
+    # Cache document thuốc (read-through theo _id)
+    MEDICINE_CACHE_ENABLED: bool = True
+    MEDICINE_CACHE_TTL_SECONDS: int = 300
+    MEDICINE_CACHE_MAX_ENTRIES: int = 5000
+    MEDICINE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Rollup thống kê chẩn đoán theo giờ/ngày (cộng dồn khi ghi consultation)
+    ANALYTICS_ROLLUP_ON_WRITE: bool = True
+    ANALYTICS_MAX_RANGE_DAYS: int = 366
+
+    # Tính trước đề xuất thuốc ngay sau khi chẩn đoán
+    RECOMMENDATION_PRECOMPUTE_ENABLED: bool = False
+    RECOMMENDATION_PRECOMPUTE_LIMIT: int = 10
+    RECOMMENDATION_PRECOMPUTE_TTL_SECONDS: int = 300
+    RECOMMENDATION_PRECOMPUTE_MAX_ENTRIES: int = 500
+
+    # Cache kết quả đề xuất/thuốc tương tự theo tham số request + phiên bản chỉ mục thuốc
+    RESULT_CACHE_ENABLED: bool = True
+    # auto: mongo khi chạy nhiều worker (WEB_CONCURRENCY > 1), memory khi chạy một worker.
+    # memory giữ phiên bản chỉ mục riêng từng worker: sau khi invalidate, worker khác vẫn trả kết quả cũ đến hết TTL
+    RESULT_CACHE_BACKEND: str = "auto"  # auto, memory hoặc mongo (dùng chung giữa các worker)
+    RESULT_CACHE_TTL_SECONDS: int = 300
+    RESULT_CACHE_MAX_ENTRIES: int = 1000
+    RESULT_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # Nén response (gzip, brotli nếu cài thư viện brotli) cho các endpoint kết quả lớn
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+
+    # Warm-up khi khởi động: thời gian tối đa startup chờ Milvus/Cohere/Groq trước khi nhận request
+    STARTUP_WARMUP_TIMEOUT_SECONDS: float = 25.0
+
+    # Số worker uvicorn/gunicorn (biến môi trường chuẩn trên Heroku)
+    WEB_CONCURRENCY: int = 1
+
     # CORS Configuration
     ENVIRONMENT: str = "development"  # development, production
     CORS_ORIGINS: str = "*"  # Comma-separated list for production
@@ -37,6 +165,12 @@ class Settings(BaseSettings):
         env_file = ".env"
         from_attributes = True
 
+    def get_result_cache_backend(self) -> str:
+        """Backend cache kết quả/phiên bản chỉ mục/search cursor thực tế sau khi xử lý giá trị auto"""
+        if self.RESULT_CACHE_BACKEND == "auto":
+            return "mongo" if self.WEB_CONCURRENCY > 1 else "memory"
+        return self.RESULT_CACHE_BACKEND
+
     def get_cors_origins(self) -> list:
         """Get CORS origins based on environment"""
         if self.ENVIRONMENT == "production":
@@ -44,21 +178,141 @@ class Settings(BaseSettings):
         return ["*"]  # Allow all origins in development
 
 
-async def initiate_database():
-    settings = Settings()
-    client = AsyncIOMotorClient(settings.DATABASE_URL)
+# Các setting chỉ được đọc khi khởi tạo kết nối/worker: nạp lại không có tác dụng cho đến khi restart
+RESTART_REQUIRED_SETTINGS = {
+    "DATABASE_URL",
+    "DATABASE_NAME",
+    "MONGO_MAX_POOL_SIZE",
+    "MONGO_MIN_POOL_SIZE",
+    "MONGO_MAX_IDLE_TIME_MS",
+    "MONGO_CONNECT_TIMEOUT_MS",
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS",
+    "MONGO_SOCKET_TIMEOUT_MS",
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS",
+    "MONGO_READ_PREFERENCE",
+    "GROQ_API_KEY",
+    "GROQ_MAX_CONCURRENCY",
+    "GROQ_MAX_CONNECTIONS",
+    "GROQ_KEEPALIVE_EXPIRY_SECONDS",
+    "GROQ_MAX_RETRIES",
+    "LLM_PROVIDERS",
+    "GEMINI_API_KEY",
+    "DEEPSEEK_API_KEY",
+    "CIRCUIT_BREAKER_WINDOW_SIZE",
+    "LLM_STATS_WINDOW",
+    "DIAGNOSIS_JOBS_ENABLED",
+    "DIAGNOSIS_JOB_WORKERS",
+    "DIAGNOSIS_JOB_QUEUE_SIZE",
+    "CONSULTATION_WRITE_BEHIND_ENABLED",
+    "CONSULTATION_WRITE_SPILL_PATH",
+    "RESULT_CACHE_BACKEND",
+    "WEB_CONCURRENCY",
+    "STARTUP_WARMUP_TIMEOUT_SECONDS",
+    "ENVIRONMENT",
+    "CORS_ORIGINS",
+}
+
+_settings: Optional[Settings] = None
+_settings_lock = threading.Lock()
+_reload_hooks: List[Callable[[Settings], None]] = []
+
+
+def get_settings() -> Settings:
+    """
+    Settings dùng chung cho toàn process, chỉ đọc env/.env một lần.
+    Dùng trực tiếp trong service hoặc làm FastAPI dependency: settings: Settings = Depends(get_settings)
+    """
+    settings = _settings
+    if settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _set_settings(Settings())
+            settings = _settings
+    return settings
+
+
+def _set_settings(settings: Settings):
+    global _settings
+    _settings = settings
+
+
+def on_settings_reload(hook: Callable[[Settings], None]) -> Callable[[Settings], None]:
+    """Đăng ký hàm áp dụng tunable mới (kích thước cache, TTL, timeout...) cho các đối tượng đang chạy"""
+    _reload_hooks.append(hook)
+    return hook
+
+
+def reload_settings() -> Dict[str, Any]:
+    """
+    Đọc lại env/.env và thay settings dùng chung trong một phép gán (request đang chạy vẫn thấy bản cũ
+    nhất quán, request sau thấy bản mới). Settings không hợp lệ thì raise và giữ nguyên bản cũ
+    """
+    new_settings = Settings()
+    with _settings_lock:
+        old_settings = _settings or new_settings
+        _set_settings(new_settings)
+    changed = [
+        name
+        for name in Settings.model_fields
+        if getattr(old_settings, name) != getattr(new_settings, name)
+    ]
+    for hook in _reload_hooks:
+        try:
+            hook(new_settings)
+        except Exception as e:
+            logger.error(f"Lỗi khi áp dụng settings mới ({hook.__module__}.{hook.__name__}): {e}")
+    logger.info(f"Đã nạp lại settings, thay đổi: {', '.join(changed) or 'không có'}")
+    return {
+        "changed": changed,
+        "restart_required": sorted(RESTART_REQUIRED_SETTINGS.intersection(changed)),
+    }
+
+
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    """Lấy Motor client dùng chung (một pool kết nối cho toàn ứng dụng), tạo lần đầu khi cần"""
+    global _client
+    if _client is None:
+        settings = get_settings()
+        _client = AsyncIOMotorClient(
+            settings.DATABASE_URL,
+            maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+            connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            socketTimeoutMS=settings.MONGO_SOCKET_TIMEOUT_MS,
+            waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            readPreference=settings.MONGO_READ_PREFERENCE,
+            event_listeners=[PoolMetricsListener(settings.MONGO_MAX_POOL_SIZE), CommandMetricsListener()],
+        )
+    return _client
+
+
+def close_client():
+    """Đóng Motor client dùng chung khi ứng dụng dừng"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def initiate_database() -> bool:
+    settings = get_settings()
+    client = get_client()
     try:
         await client.admin.command("ping")
         print("MongoDB connection successful")
     except Exception as e:
         print(f"MongoDB connection failed: {e}")
-        return
+        return False
     await init_beanie(
         database=client[settings.DATABASE_NAME], document_models=models.__all__
     )
+    return True
 
 
 def get_database():
-    settings = Settings()
-    client = AsyncIOMotorClient(settings.DATABASE_URL)
-    return client[settings.DATABASE_NAME]
+    return get_client()[get_settings().DATABASE_NAME]
@@ -1,38 +1,210 @@
+import asyncio
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
+from beanie import PydanticObjectId
 from fastapi import HTTPException
 
 from models.consultation import AIData, Consultation, HumanData
 from models.medicine import Medicine
 from schemas.consultation import ConsultationRequest
-from services.groq_service import GroqService
+from services.analytics_rollups import schedule_rollup
+from services.circuit_breaker import OPEN
+from services.consultation_writer import find_consultation, persist_consultation
+from services.diagnosis_cache import diagnosis_cache_key, get_diagnosis_cache
+from services.diagnosis_profiles import get_profile
+from services.groq_service import get_groq_service
+from services.recommendation_precompute import get_recommendation_precompute
+from services.recommendation_service import RecommendationResult, recommend_for_consultation
+from services.semantic_diagnosis_cache import get_semantic_diagnosis_cache
+from services.single_flight import SingleFlight
+from utils.background import spawn
 
 consultation_collection = Consultation
 medicine_collection = Medicine
+diagnosis_flight = SingleFlight("diagnosis")
+
+
+@dataclass
+class DiagnosisResult:
+    """Kết quả chẩn đoán kèm nguồn gốc (llm, coalesced, exact_cache, semantic_cache, stale_cache)"""
+
+    ai_result: Optional[dict]
+    is_fallback: bool
+    source: str = "llm"
+    symptom_embedding: Optional[List[float]] = None
 
 
 async def create_consultation(consultation_data: ConsultationRequest) -> Consultation:
     """Tạo consultation mới với phân tích AI"""
-    groq_service = GroqService()
-    ai_result, is_fallback = groq_service.analyze_symptoms(
-        symptoms=consultation_data.symptoms,
-        patient_age=consultation_data.patient_age,
-        patient_gender=consultation_data.patient_gender,
+    diagnosis = await diagnose_symptoms(consultation_data)
+    consultation = await save_consultation(consultation_data, diagnosis.ai_result)
+    remember_diagnosis(consultation_data, consultation, diagnosis)
+    schedule_recommendations(consultation)
+    return consultation
+
+
+def schedule_recommendations(consultation: Consultation):
+    """Tính trước đề xuất thuốc trong nền vì client thường gọi đề xuất ngay sau chẩn đoán"""
+    precompute = get_recommendation_precompute()
+    if precompute:
+        precompute.start(consultation)
+
+
+async def create_consultation_with_recommendations(
+    consultation_data: ConsultationRequest, limit: int = 10, projection: Optional[Dict[str, int]] = None
+) -> Tuple[Consultation, RecommendationResult]:
+    """Chẩn đoán, sau đó lưu consultation song song với tìm kiếm và lấy thông tin thuốc đề xuất"""
+    diagnosis = await diagnose_symptoms(consultation_data)
+    consultation = build_consultation(consultation_data, diagnosis.ai_result)
+    # Gán trước ID để không phải chờ insert xong mới có consultation_id
+    consultation.id = PydanticObjectId()
+    _, recommendations = await asyncio.gather(
+        persist_consultation(consultation), recommend_for_consultation(consultation, limit, projection)
     )
+    schedule_rollup(consultation)
+    remember_diagnosis(consultation_data, consultation, diagnosis)
+    return consultation, recommendations
+
+
+async def diagnose_symptoms(consultation_data: ConsultationRequest) -> DiagnosisResult:
+    """Lấy kết quả chẩn đoán từ cache hoặc gọi AI phân tích triệu chứng"""
+    cached = await lookup_cached_diagnosis(consultation_data)
+    if cached is not None and cached.ai_result is not None:
+        return cached
+    groq_service = get_groq_service()
+    cache_key = consultation_cache_key(consultation_data)
+    cache = get_diagnosis_cache()
+    if cache and groq_service.breaker.state == OPEN:
+        # LLM đang gặp sự cố: ưu tiên kết quả cache cũ (kể cả đã hết hạn) thay vì fallback chung
+        stale_result = cache.get(cache_key, allow_stale=True)
+        if stale_result is not None:
+            return DiagnosisResult(stale_result, False, source="stale_cache")
+    # Các request giống hệt nhau đang chạy đồng thời dùng chung một lời gọi LLM
+    (ai_result, is_fallback), coalesced = await diagnosis_flight.do(
+        cache_key,
+        lambda: groq_service.analyze_symptoms(
+            symptoms=consultation_data.symptoms,
+            patient_age=consultation_data.patient_age,
+            patient_gender=consultation_data.patient_gender,
+            profile=consultation_data.profile,
+        ),
+    )
+    return DiagnosisResult(
+        ai_result=ai_result,
+        is_fallback=is_fallback,
+        source="coalesced" if coalesced else "llm",
+        symptom_embedding=cached.symptom_embedding if cached else None,
+    )
+
+
+def consultation_cache_key(consultation_data: ConsultationRequest) -> str:
+    """Khóa cache/single-flight của request, tách riêng theo profile chẩn đoán"""
+    return diagnosis_cache_key(
+        consultation_data.symptoms,
+        consultation_data.patient_age,
+        consultation_data.patient_gender,
+        get_profile(consultation_data.profile).name,
+    )
+
+
+def uses_default_profile(consultation_data: ConsultationRequest) -> bool:
+    """Cache ngữ nghĩa chỉ lưu và phục vụ kết quả của profile mặc định"""
+    return get_profile(consultation_data.profile).name == get_profile().name
+
+
+async def lookup_cached_diagnosis(consultation_data: ConsultationRequest) -> Optional[DiagnosisResult]:
+    """
+    Tra cứu cache chẩn đoán: tầng khớp chính xác trước, sau đó tầng ngữ nghĩa.
+    Khi tầng ngữ nghĩa miss, trả về DiagnosisResult chỉ chứa embedding để dùng lại khi lưu cache
+    """
+    if consultation_data.bypass_cache:
+        return None
+    cache = get_diagnosis_cache()
+    cache_key = consultation_cache_key(consultation_data)
+    if cache:
+        cached_result = cache.get(cache_key)
+        if cached_result is not None:
+            return DiagnosisResult(cached_result, False, source="exact_cache")
+    semantic_cache = get_semantic_diagnosis_cache()
+    if not semantic_cache or not uses_default_profile(consultation_data):
+        return None
+    match, symptom_embedding = await semantic_cache.alookup(
+        consultation_data.symptoms,
+        consultation_data.patient_age,
+        consultation_data.patient_gender,
+    )
+    if match:
+        consultation_id, _ = match
+        matched = await find_consultation(consultation_id)
+        if matched:
+            ai_result = matched.ai.model_dump()
+            if cache:
+                cache.set(cache_key, ai_result)
+            return DiagnosisResult(ai_result, False, source="semantic_cache")
+    return DiagnosisResult(None, False, source="miss", symptom_embedding=symptom_embedding)
+
+
+def remember_diagnosis(
+    consultation_data: ConsultationRequest, consultation: Consultation, diagnosis: DiagnosisResult
+):
+    """Lưu kết quả chẩn đoán mới từ AI vào các tầng cache (không cache fallback)"""
+    if diagnosis.is_fallback or diagnosis.source != "llm":
+        return
+    cache = get_diagnosis_cache()
+    if cache:
+        cache.set(
+            consultation_cache_key(consultation_data),
+            diagnosis.ai_result,
+        )
+    semantic_cache = get_semantic_diagnosis_cache()
+    if semantic_cache and uses_default_profile(consultation_data):
+        spawn(
+            _index_semantic_diagnosis(semantic_cache, consultation_data, consultation, diagnosis),
+            name="semantic_cache_add",
+        )
+
+
+async def _index_semantic_diagnosis(
+    semantic_cache, consultation_data: ConsultationRequest, consultation: Consultation, diagnosis: DiagnosisResult
+):
+    symptom_embedding = diagnosis.symptom_embedding or await asyncio.to_thread(
+        semantic_cache.embed_symptoms, consultation_data.symptoms
+    )
+    if symptom_embedding:
+        await asyncio.to_thread(
+            semantic_cache.add,
+            str(consultation.id),
+            symptom_embedding,
+            consultation_data.patient_age,
+            consultation_data.patient_gender,
+        )
+
+
+def build_consultation(consultation_data: ConsultationRequest, ai_result: dict) -> Consultation:
+    """Tạo document Consultation (chưa lưu) từ request và kết quả AI"""
     human_data = HumanData(
         symptoms=consultation_data.symptoms,
         patient_age=consultation_data.patient_age or 0,
         patient_gender=consultation_data.patient_gender or "không xác định",
     )
     ai_data = AIData(**ai_result)
-    consultation = Consultation(
+    now = datetime.now()
+    return Consultation(
         user_id=consultation_data.user_id,  # Sửa: Không cần PydanticObjectId
         human=human_data,  # Sửa: field name trong model
         ai=ai_data,  # Sửa: field name trong model
-        created_at=datetime.now().isoformat(),
-        updated_at=datetime.now().isoformat(),
+        created_at=now,
+        updated_at=now,
     )
-    await consultation.create()
+
+
+async def save_consultation(consultation_data: ConsultationRequest, ai_result: dict) -> Consultation:
+    """Lưu consultation với kết quả AI đã có"""
+    consultation = build_consultation(consultation_data, ai_result)
+    await persist_consultation(consultation)
+    schedule_rollup(consultation)
     return consultation
 
 
@@ -45,7 +217,46 @@ async def get_medicine_by_id(medicine_id: str) -> Medicine:
 
 async def get_consultation_by_id(consultation_id: str) -> Consultation:
     """Lấy consultation theo ID"""
-    consultation = await consultation_collection.find_one(Consultation.id == consultation_id)
+    consultation = await find_consultation(consultation_id)
     if not consultation:
         raise HTTPException(status_code=404, detail="Consultation not found")
     return consultation
+
+
+async def list_user_consultations(
+    user_id: str,
+    limit: int = 20,
+    after: Optional[Tuple[Optional[datetime], PydanticObjectId]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Tuple[List[Consultation], bool]:
+    """
+    Lấy lịch sử consultation của user, mới nhất trước, phân trang keyset theo (created_at, _id).
+    after là (created_at, _id) của phần tử cuối trang trước; trả về (danh sách, còn trang sau hay không)
+    """
+    query: Dict = {"user_id": user_id}
+    created_range: Dict = {}
+    if since:
+        created_range["$gte"] = since
+    if until:
+        created_range["$lt"] = until
+    if created_range:
+        query["created_at"] = created_range
+    if after:
+        after_created_at, after_id = after
+        if after_created_at is None:
+            # Consultation cũ không có created_at nằm cuối thứ tự giảm dần, chỉ phân trang theo _id
+            query["created_at"] = None
+            query["_id"] = {"$lt": after_id}
+        else:
+            query["$or"] = [
+                {"created_at": {"$lt": after_created_at}},
+                {"created_at": after_created_at, "_id": {"$lt": after_id}},
+                {"created_at": None},
+            ]
+    # Lấy thêm 1 phần tử để biết còn trang sau
+    consultations = await Consultation.find(query).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).limit(limit + 1).to_list()
+    return consultations[:limit], len(consultations) > limit
+
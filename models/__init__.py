@@ -1,4 +1,5 @@
+from models.analytics import DiagnosisRollup
 from models.consultation import Consultation
 from models.medicine import Medicine
 
-__all__ = [Consultation, Medicine]
+__all__ = [Consultation, Medicine, DiagnosisRollup]
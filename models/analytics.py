@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Optional
+
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+
+
+class DiagnosisRollup(Document):
+    """Số consultation đã cộng dồn theo bucket giờ/ngày cho một giá trị của một chiều thống kê"""
+
+    granularity: str  # hour, day
+    bucket: datetime
+    dimension: str  # total, diagnosis, severity
+    value: str
+    consultation_count: int = 0
+    updated_at: Optional[datetime] = None
+
+    class Settings:
+        name = "diagnosis_rollups"
+        indexes = [
+            # Khóa upsert của mỗi rollup, đồng thời phục vụ đọc theo khoảng bucket
+            IndexModel(
+                [
+                    ("granularity", ASCENDING),
+                    ("bucket", ASCENDING),
+                    ("dimension", ASCENDING),
+                    ("value", ASCENDING),
+                ],
+                name="granularity_bucket_dimension_value",
+                unique=True,
+            ),
+        ]
@@ -1,7 +1,9 @@
+from datetime import datetime
 from typing import List, Optional
 
 from beanie import Document
 from pydantic import BaseModel
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 
 class HumanData(BaseModel):
@@ -27,8 +29,8 @@ class Consultation(Document):
     user_id: str
     human: HumanData
     ai: AIData
-    created_at: Optional[str] = None
-    updated_at: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         json_schema_extra = {
@@ -59,4 +61,11 @@ class Consultation(Document):
         }
 
     class Settings:
-        name = "consultations"
\ No newline at end of file
+        name = "consultations"
+        indexes = [
+            # Lịch sử tư vấn theo user, phân trang keyset theo (created_at, _id) giảm dần
+            IndexModel(
+                [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                name="user_id_created_at_id",
+            ),
+        ]
@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 
+from .analytics import router as AnalyticsRouter
 from .consultation import router as ConsultationRouter
 from .embed import router as EmbedRouter
 from .medicine import router as MedicineRouter
@@ -8,4 +9,5 @@ router = APIRouter()
 
 router.include_router(ConsultationRouter, tags=["Consultations"], prefix="/consultation")
 router.include_router(EmbedRouter, tags=["Embeds"], prefix="/embed")
-router.include_router(MedicineRouter, tags=["Medicines"], prefix="/medicine")
\ No newline at end of file
+router.include_router(MedicineRouter, tags=["Medicines"], prefix="/medicine")
+router.include_router(AnalyticsRouter, tags=["Analytics"], prefix="/analytics")
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+
+from config.config import Settings, get_settings
+from services.analytics_rollups import GRANULARITIES, read_rollups, to_local_naive
+from utils.http_response import json, validation
+
+router = APIRouter()
+
+
+@router.get("/diagnoses", response_description="Diagnosis analytics")
+async def get_diagnosis_analytics(
+    granularity: str = "day",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    top: int = 10,
+    settings: Settings = Depends(get_settings),
+):
+    """
+    Thống kê chẩn đoán theo giờ/ngày: tổng consultation, top chẩn đoán và phân bố mức độ nghiêm trọng.
+    Đọc từ collection rollup đã cộng dồn sẵn. Mặc định 7 ngày gần nhất (hoặc 24 giờ với granularity=hour)
+    """
+    try:
+        if granularity not in GRANULARITIES:
+            return validation(validation_errors=[f"granularity phải là một trong: {', '.join(GRANULARITIES)}"])
+        if top < 0:
+            return validation(validation_errors=["top không được âm"])
+        # Tham số ISO 8601 có offset/Z được đổi về giờ local không timezone để so sánh với datetime.now() và rollup
+        until = to_local_naive(until) if until else datetime.now()
+        since = to_local_naive(since) if since else until - (timedelta(hours=24) if granularity == "hour" else timedelta(days=7))
+        if since >= until:
+            return validation(validation_errors=["since phải nhỏ hơn until"])
+        if until - since > timedelta(days=settings.ANALYTICS_MAX_RANGE_DAYS):
+            return validation(
+                validation_errors=[f"Khoảng thời gian tối đa là {settings.ANALYTICS_MAX_RANGE_DAYS} ngày"]
+            )
+        report = await read_rollups(granularity, since, until, top)
+        return json(data=report, message="Lấy thống kê chẩn đoán thành công")
+    except Exception as e:
+        print(f"Error reading diagnosis analytics: {e}")
+        return validation(
+            validation_errors=[f"Lỗi khi lấy thống kê chẩn đoán: {str(e)}"],
+            message="Đã xảy ra lỗi trong quá trình xử lý",
+        )
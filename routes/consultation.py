@@ -1,53 +1,154 @@
-from fastapi import APIRouter
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional
 
-from config.config import Settings
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from config.config import Settings, get_database, get_settings
 from database.database import create_consultation as db_create_consultation
+from database.database import (
+    DiagnosisResult,
+    create_consultation_with_recommendations,
+    list_user_consultations,
+    lookup_cached_diagnosis,
+    remember_diagnosis,
+    save_consultation,
+    schedule_recommendations,
+)
 from models.consultation import Consultation
 from schemas.consultation import ConsultationRequest
-from services.embedding_service import EmbeddingService
-from utils.http_response import json, validation
+from services.consultation_writer import find_consultation
+from services.diagnosis_jobs import (
+    SUCCEEDED,
+    DiagnosisJob,
+    QueueFullError,
+    get_diagnosis_job_queue,
+)
+from services.diagnosis_stream import stream_diagnosis_events
+from services.embedding_service import get_embedding_service
+from services.groq_service import get_groq_service
+from services.index_version import get_index_version
+from services.medicine_fields import parse_fields, select_fields
+from services.recommendation_precompute import get_recommendation_precompute
+from services.recommendation_service import (
+    RecommendationResult,
+    build_consultation_info,
+    build_consultation_query,
+    hydrate_medicines,
+)
+from services.result_cache import get_result_cache, search_page_response
+from services.search_cursor import (
+    decode_cursor,
+    decode_keyset_cursor,
+    encode_cursor,
+    encode_keyset_cursor,
+    get_search_cursor_store,
+)
+from utils.compression import compress_response
+from utils.disconnect import ClientDisconnectedError, cancel_on_disconnect
+from utils.http_cache import etag_matches, not_modified, result_etag, set_etag
+from utils.http_response import fail, json, not_found, validation
+from utils.sse import SSE_HEADERS, sse_event
 
 router = APIRouter()
 
+RECOMMEND_ENDPOINT = "recommend-medicines"
+
+
+def validate_consultation_request(consultation_request: ConsultationRequest):
+    """Kiểm tra dữ liệu đầu vào, trả về response lỗi hoặc None nếu hợp lệ"""
+    if not consultation_request.symptoms.strip():
+        return validation(
+            validation_errors=["Triệu chứng không được để trống"],
+            message="Dữ liệu đầu vào không hợp lệ",
+        )
+    if consultation_request.patient_age and (
+        consultation_request.patient_age < 0
+        or consultation_request.patient_age > 150
+    ):
+        return validation(
+            validation_errors=["Tuổi phải từ 0 đến 150"],
+            message="Dữ liệu đầu vào không hợp lệ",
+        )
+    return None
+
+
+def format_diagnosis_response(consultation: Consultation) -> dict:
+    """Tạo response chẩn đoán từ consultation đã lưu"""
+    # Create response format matching groq_diagnosis.py structure
+    ai_data = consultation.ai.model_dump()
+    return {
+        "consultation_id": str(consultation.id),  # Thêm ID của consultation
+        "primary_diagnosis": ai_data["primary_diagnosis"],
+        "alternative_diagnoses": ai_data["alternative_diagnoses"],
+        "general_advice": ai_data["general_advice"],
+        "severity_level": ai_data["overall_severity_level"],
+        "related_symptoms": ai_data.get(
+            "related_symptoms", []
+        ),  # Default to empty list if not present
+        "recommended_actions": ai_data["recommended_actions"],
+    }
+
+
+async def build_recommendation_page(
+    consultation_id: str,
+    recommendations: RecommendationResult,
+    limit: int,
+    projection: Optional[dict] = None,
+) -> dict:
+    """Tạo trang đầu tiên của kết quả đề xuất thuốc, kèm cursor cho /recommend-medicines"""
+    rag_results = recommendations.rag_results[:limit]
+    medicines = [
+        select_fields(medicine, projection, keep=("similarity_score", "rag_ranking"))
+        for medicine in recommendations.medicines
+        if medicine["rag_ranking"] <= limit
+    ]
+    has_more = len(rag_results) == limit
+    next_cursor = None
+    if has_more and recommendations.query_embedding:
+        token = await get_search_cursor_store().save(
+            recommendations.query_embedding,
+            {
+                "consultation_id": consultation_id,
+                "consultation_info": recommendations.consultation_info,
+                "search_query": recommendations.search_query,
+            },
+        )
+        next_cursor = encode_cursor(token, len(rag_results)) if token else None
+    return {
+        "consultation_id": consultation_id,
+        "consultation_info": recommendations.consultation_info,
+        "recommended_medicines": medicines,
+        "total_found": len(medicines),
+        "search_query": recommendations.search_query,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }
+
 
 @router.post("/diagnose", response_description="Consultation created")
-async def create_consultation(consultation_request: ConsultationRequest):
+async def create_consultation(request: Request, consultation_request: ConsultationRequest):
     """
     Tạo consultation mới với phân tích AI từ triệu chứng
     """
     try:
         # Validate input
-        if not consultation_request.symptoms.strip():
-            return validation(
-                validation_errors=["Triệu chứng không được để trống"],
-                message="Dữ liệu đầu vào không hợp lệ",
-            )
-        if consultation_request.patient_age and (
-            consultation_request.patient_age < 0
-            or consultation_request.patient_age > 150
-        ):
-            return validation(
-                validation_errors=["Tuổi phải từ 0 đến 150"],
-                message="Dữ liệu đầu vào không hợp lệ",
-            )
-        consultation = await db_create_consultation(consultation_request)
-        # Create response format matching groq_diagnosis.py structure
-        ai_data = consultation.ai.model_dump()
-        response_data = {
-            "consultation_id": str(consultation.id),  # Thêm ID của consultation
-            "primary_diagnosis": ai_data["primary_diagnosis"],
-            "alternative_diagnoses": ai_data["alternative_diagnoses"],
-            "general_advice": ai_data["general_advice"],
-            "severity_level": ai_data["overall_severity_level"],
-            "related_symptoms": ai_data.get(
-                "related_symptoms", []
-            ),  # Default to empty list if not present
-            "recommended_actions": ai_data["recommended_actions"],
-        }
+        error_response = validate_consultation_request(consultation_request)
+        if error_response:
+            return error_response
+        # Hủy lời gọi LLM nếu client ngắt kết nối trong lúc chờ
+        consultation = await cancel_on_disconnect(
+            request, db_create_consultation(consultation_request)
+        )
         return json(
-            data=response_data, message="Phân tích triệu chứng thành công", status=201
+            data=format_diagnosis_response(consultation),
+            message="Phân tích triệu chứng thành công",
+            status=201,
         )
+    except ClientDisconnectedError:
+        return fail(message="Client đã ngắt kết nối", status=499)
     except Exception as e:
         print(f"Error creating consultation: {e}")
         return validation(
@@ -56,105 +157,381 @@ async def create_consultation(consultation_request: ConsultationRequest):
         )
 
 
+@router.post(
+    "/diagnose-and-recommend",
+    response_description="Consultation created with medicine recommendations",
+)
+async def diagnose_and_recommend(
+    request: Request,
+    consultation_request: ConsultationRequest,
+    limit: int = 10,
+    fields: Optional[str] = None,
+):
+    """
+    Chẩn đoán và đề xuất thuốc trong cùng một request: query RAG được tạo từ kết quả chẩn đoán
+    trong bộ nhớ, việc lưu consultation chạy song song với tìm kiếm thuốc.
+    fields: bộ field của thuốc ("card", "summary") hoặc danh sách field, mặc định trả cả document
+    """
+    try:
+        error_response = validate_consultation_request(consultation_request)
+        if error_response:
+            return error_response
+        try:
+            projection = parse_fields(fields)
+        except ValueError as e:
+            return validation(validation_errors=[str(e)])
+        consultation, recommendations = await cancel_on_disconnect(
+            request,
+            create_consultation_with_recommendations(consultation_request, limit, projection),
+        )
+        recommendation_page = await build_recommendation_page(str(consultation.id), recommendations, limit)
+        response_data = {
+            **format_diagnosis_response(consultation),
+            "recommendations": recommendation_page,
+        }
+        return json(
+            data=response_data,
+            message=f"Phân tích triệu chứng thành công, tìm thấy {recommendation_page['total_found']} thuốc phù hợp",
+            status=201,
+        )
+    except ClientDisconnectedError:
+        return fail(message="Client đã ngắt kết nối", status=499)
+    except Exception as e:
+        print(f"Error in diagnose_and_recommend: {e}")
+        return validation(
+            validation_errors=[f"Lỗi khi chẩn đoán và đề xuất thuốc: {str(e)}"],
+            message="Đã xảy ra lỗi trong quá trình xử lý",
+        )
+
+
+@router.get("/diagnosis-profiles", response_description="Diagnosis profiles")
+async def get_diagnosis_profiles():
+    """
+    Liệt kê các profile chẩn đoán (fast/standard/detailed) cùng token và độ trễ đã quan sát
+    """
+    try:
+        return json(
+            data=get_groq_service().profile_report(),
+            message="Lấy danh sách profile chẩn đoán thành công",
+        )
+    except Exception as e:
+        print(f"Error getting diagnosis profiles: {e}")
+        return validation(
+            validation_errors=[f"Lỗi khi lấy profile chẩn đoán: {str(e)}"],
+            message="Đã xảy ra lỗi trong quá trình xử lý",
+        )
+
+
+@router.post("/diagnose/stream", response_description="Streaming consultation diagnosis")
+async def stream_consultation(consultation_request: ConsultationRequest):
+    """
+    Chẩn đoán dạng streaming (Server-Sent Events): gửi từng field ngay khi AI sinh xong,
+    lưu consultation khi luồng kết thúc
+    """
+    error_response = validate_consultation_request(consultation_request)
+    if error_response:
+        return error_response
+
+    async def event_stream():
+        yield sse_event("status", {"stage": "started"})
+        diagnosis = await lookup_cached_diagnosis(consultation_request)
+        if diagnosis is not None and diagnosis.ai_result is not None:
+            # Cache hit: gửi toàn bộ field ngay, không gọi Groq
+            for field, value in diagnosis.ai_result.items():
+                yield sse_event("field", {"field": field, "value": value})
+        else:
+            symptom_embedding = diagnosis.symptom_embedding if diagnosis else None
+            async for event, data in stream_diagnosis_events(
+                get_groq_service(), consultation_request
+            ):
+                if event == "result":
+                    ai_result, is_fallback = data
+                    diagnosis = DiagnosisResult(
+                        ai_result, is_fallback, symptom_embedding=symptom_embedding
+                    )
+                else:
+                    yield sse_event(event, data)
+        try:
+            consultation = await save_consultation(consultation_request, diagnosis.ai_result)
+            remember_diagnosis(consultation_request, consultation, diagnosis)
+            schedule_recommendations(consultation)
+            response_data = format_diagnosis_response(consultation)
+            response_data["is_fallback"] = diagnosis.is_fallback
+            yield sse_event("done", response_data)
+        except Exception as e:
+            print(f"Error saving streamed consultation: {e}")
+            yield sse_event("error", {"message": f"Lỗi khi lưu consultation: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+def format_job_response(job: DiagnosisJob) -> dict:
+    """Trạng thái job kèm kết quả chẩn đoán khi job đã xong"""
+    data = job.snapshot()
+    data["result"] = format_diagnosis_response(job.result) if job.status == SUCCEEDED else None
+    return data
+
+
+@router.post("/diagnose/jobs", response_description="Diagnosis job queued")
+async def submit_diagnosis_job(consultation_request: ConsultationRequest):
+    """
+    Đưa yêu cầu chẩn đoán vào hàng đợi và trả về job id ngay; kết quả lấy qua
+    GET /diagnose/jobs/{job_id} (poll hoặc long-poll với ?wait=) hoặc SSE /diagnose/jobs/{job_id}/events
+    """
+    job_queue = get_diagnosis_job_queue()
+    if job_queue is None:
+        return fail(message="Chế độ job chẩn đoán chưa được bật", status=503)
+    error_response = validate_consultation_request(consultation_request)
+    if error_response:
+        return error_response
+    try:
+        job = job_queue.submit(consultation_request)
+    except QueueFullError:
+        # Backpressure: báo client thử lại thay vì giữ kết nối chờ
+        response = fail(message="Hàng đợi chẩn đoán đã đầy, vui lòng thử lại sau", status=429)
+        response.headers["Retry-After"] = "5"
+        return response
+    return json(
+        data=format_job_response(job),
+        message="Đã nhận yêu cầu chẩn đoán",
+        status=202,
+    )
+
+
+@router.get("/diagnose/jobs/{job_id}", response_description="Diagnosis job status")
+async def get_diagnosis_job(job_id: str, wait: float = 0, settings: Settings = Depends(get_settings)):
+    """
+    Lấy trạng thái job chẩn đoán; wait > 0 giữ request tối đa wait giây cho đến khi job xong (long-poll)
+    """
+    job_queue = get_diagnosis_job_queue()
+    job = job_queue.get(job_id) if job_queue else None
+    if job is None:
+        return not_found("Job chẩn đoán")
+    if wait > 0 and not job.finished:
+        deadline = time.monotonic() + min(wait, settings.DIAGNOSIS_JOB_LONG_POLL_MAX_SECONDS)
+        while not job.finished:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await job.wait_for_change(remaining):
+                break
+    return json(data=format_job_response(job), message=f"Job chẩn đoán: {job.status}")
+
+
+@router.get("/diagnose/jobs/{job_id}/events", response_description="Diagnosis job events")
+async def stream_diagnosis_job(job_id: str):
+    """
+    Theo dõi job chẩn đoán qua Server-Sent Events: gửi mỗi lần đổi trạng thái, kết thúc bằng kết quả
+    """
+    job_queue = get_diagnosis_job_queue()
+    job = job_queue.get(job_id) if job_queue else None
+    if job is None:
+        return not_found("Job chẩn đoán")
+
+    async def event_stream():
+        while True:
+            yield sse_event("status", job.snapshot())
+            if job.finished:
+                break
+            # Gửi lại trạng thái định kỳ để giữ kết nối qua proxy
+            await job.wait_for_change(15)
+        if job.status == SUCCEEDED:
+            yield sse_event("result", format_diagnosis_response(job.result))
+        yield sse_event("done", {"status": job.status})
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
 @router.get(
     "/recommend-medicines/{consultation_id}",
     response_description="Medicine recommendations based on consultation",
 )
-async def recommend_medicines_for_consultation(consultation_id: str, limit: int = 10):
+async def recommend_medicines_for_consultation(
+    request: Request,
+    consultation_id: str,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
     """
-    Đề xuất thuốc dựa trên kết quả chẩn đoán từ consultation ID thông qua truy vấn RAG
+    Đề xuất thuốc dựa trên kết quả chẩn đoán từ consultation ID thông qua truy vấn RAG.
+    fields: bộ field của thuốc ("card", "summary") hoặc danh sách field, mặc định trả cả document.
+    Response có ETag; gửi lại If-None-Match để nhận 304 khi kết quả không đổi
     """
     try:
-        # Lấy thông tin consultation từ database
-        consultation = await Consultation.get(consultation_id)
-        if not consultation:
-            return validation(
-                validation_errors=["Không tìm thấy consultation với ID này"],
-                message="Consultation không tồn tại",
+        try:
+            projection = parse_fields(fields)
+        except ValueError as e:
+            return validation(validation_errors=[str(e)])
+        cursor_store = get_search_cursor_store()
+        if cursor:
+            # Trang tiếp theo: dùng lại query vector đã lưu, không embedding lại
+            decoded = decode_cursor(cursor)
+            entry = await cursor_store.get(decoded[0]) if decoded else None
+            if not entry or entry["context"].get("consultation_id") != consultation_id:
+                return validation(
+                    validation_errors=["Cursor không hợp lệ hoặc đã hết hạn"],
+                    message="Dữ liệu đầu vào không hợp lệ",
+                )
+            token, offset = decoded
+        else:
+            token, offset = None, 0
+        # Cùng consultation, limit, trang và fields với cùng phiên bản chỉ mục thì kết quả không đổi
+        index_version = await get_index_version()
+        result_cache = get_result_cache()
+        cache_params = {"consultation_id": consultation_id, "limit": limit, "offset": offset, "fields": fields}
+        cached = await result_cache.get(RECOMMEND_ENDPOINT, cache_params, index_version) if result_cache else None
+        if cached:
+            return await search_page_response(request, RECOMMEND_ENDPOINT, cached, cursor_store, token)
+        if cursor:
+            embedding_service = get_embedding_service()
+            query_embedding = entry["embedding"]
+            consultation_info = entry["context"]["consultation_info"]
+            query_text = entry["context"]["search_query"]
+        else:
+            precompute = get_recommendation_precompute()
+            precomputed = await precompute.get(consultation_id, limit, index_version) if precompute else None
+            if precomputed and precomputed.query_embedding:
+                # Đề xuất đã được tính trước ngay sau khi chẩn đoán
+                etag = result_etag(RECOMMEND_ENDPOINT, cache_params, precomputed.rag_results[:limit], index_version)
+                matched_etag = etag_matches(request, etag)
+                if matched_etag:
+                    return not_modified(RECOMMEND_ENDPOINT, matched_etag)
+                response_data = await build_recommendation_page(consultation_id, precomputed, limit, projection)
+                response = json(
+                    data=response_data,
+                    message=f"Tìm thấy {response_data['total_found']} thuốc phù hợp với chẩn đoán",
+                    status=200,
+                )
+                return compress_response(request, set_etag(response, etag), RECOMMEND_ENDPOINT)
+            # Lấy thông tin consultation từ database
+            # Consultation vừa tạo có thể còn nằm trong buffer write-behind
+            consultation = await find_consultation(consultation_id)
+            if not consultation:
+                return validation(
+                    validation_errors=["Không tìm thấy consultation với ID này"],
+                    message="Consultation không tồn tại",
+                )
+            # Tạo query text từ thông tin chẩn đoán
+            query_text = build_consultation_query(consultation)
+            consultation_info = build_consultation_info(consultation)
+            embedding_service = get_embedding_service()
+            # Cohere/Milvus SDK là I/O đồng bộ: chạy trong thread để không chặn event loop
+            query_embedding = await asyncio.to_thread(
+                embedding_service.generate_embedding, query_text, input_type="search_query"
             )
-        # Tạo query text từ thông tin chẩn đoán
-        ai_data = consultation.ai
-        query_parts = []
-        # Thêm chẩn đoán chính
-        primary_diagnosis = ai_data.primary_diagnosis
-        query_parts.append(f"Điều trị {primary_diagnosis.diagnosis_name}")
-        query_parts.append(f"Chữa {primary_diagnosis.diagnosis_name}")
-        # Thêm triệu chứng
-        query_parts.append(f"Triệu chứng: {consultation.human.symptoms}")
-        # Thêm triệu chứng liên quan
-        if ai_data.related_symptoms:
-            query_parts.append(f"Triệu chứng liên quan: {', '.join(ai_data.related_symptoms)}")
-        # Thêm chẩn đoán thay thế
-        if ai_data.alternative_diagnoses:
-            alt_diagnoses = [diag.diagnosis_name for diag in ai_data.alternative_diagnoses[:2]]  # Chỉ lấy 2 cái đầu
-            query_parts.append(f"có thể điều trị {', '.join(alt_diagnoses)}")
-        # Tạo query text hoàn chỉnh
-        query_text = ". ".join(query_parts)
-        # Khởi tạo embedding service và tìm kiếm thuốc
-        embedding_service = EmbeddingService()
-        rag_results = embedding_service.search_similar_medicines(query_text, limit)
-        if not rag_results:
+            if not query_embedding:
+                return json(
+                    data=[],
+                    message="Không tìm thấy thuốc phù hợp",
+                    status=200,
+                )
+        # Tìm kiếm thuốc theo query vector, bỏ qua các kết quả của trang trước
+        rag_results = await asyncio.to_thread(
+            embedding_service.search_by_embedding, query_embedding, limit, offset
+        )
+        if not rag_results and offset == 0:
             return json(
                 data=[],
                 message="Không tìm thấy thuốc phù hợp",
                 status=200,
             )
+        # Kết quả không đổi so với bản client đang có: trả 304 trước khi lấy thông tin thuốc
+        etag = result_etag(RECOMMEND_ENDPOINT, cache_params, rag_results, index_version)
+        matched_etag = etag_matches(request, etag)
+        if matched_etag:
+            return not_modified(RECOMMEND_ENDPOINT, matched_etag)
         # Lấy thông tin đầy đủ từ MongoDB
-        medicine_ids = [result["medicine_id"] for result in rag_results]
-        detailed_medicines = []
-        for i, medicine_id in enumerate(medicine_ids):
-            try:
-                # Sử dụng MongoDB query trực tiếp thay vì Beanie model để tránh validation
-                settings = Settings()
-                client = AsyncIOMotorClient(settings.DATABASE_URL)
-                db = client[settings.DATABASE_NAME]
-                collection = db["medicines"]
-                # Tìm thuốc bằng raw MongoDB query
-                medicine_doc = await collection.find_one({"_id": medicine_id})
-                if medicine_doc:
-                    # Xử lý UUID serialization
-                    if "_id" in medicine_doc:
-                        medicine_doc["id"] = str(medicine_doc["_id"])
-                        del medicine_doc["_id"]
-                    # Xử lý các UUID fields khác
-                    for field, value in medicine_doc.items():
-                        if hasattr(value, "hex"):  # Check if it's a UUID
-                            medicine_doc[field] = str(value)
-                    # Xử lý datetime fields
-                    if "created_at" in medicine_doc and hasattr(medicine_doc["created_at"], "isoformat"):
-                        medicine_doc["created_at"] = medicine_doc["created_at"].isoformat()
-                    if "updated_at" in medicine_doc and hasattr(medicine_doc["updated_at"], "isoformat"):
-                        medicine_doc["updated_at"] = medicine_doc["updated_at"].isoformat()
-                    # Thêm thông tin similarity score từ RAG
-                    medicine_doc["similarity_score"] = rag_results[i]["similarity_score"]
-                    medicine_doc["rag_ranking"] = i + 1
-                    detailed_medicines.append(medicine_doc)
-            except Exception as e:
-                print(f"Error fetching medicine {medicine_id}: {e}")
-                continue
-        response_data = {
-            "consultation_id": consultation_id,
-            "consultation_info": {
-                "primary_diagnosis": {
-                    "name": primary_diagnosis.diagnosis_name,
-                    "confidence": primary_diagnosis.confidence_percentage,
-                    "description": primary_diagnosis.description,
-                },
-                "symptoms": consultation.human.symptoms,
-                "severity_level": ai_data.overall_severity_level,
+        collection = get_database()["medicines"]
+        detailed_medicines = await hydrate_medicines(
+            collection, rag_results, "rag_ranking", start_rank=offset + 1, projection=projection
+        )
+        has_more = len(rag_results) == limit
+        page = {
+            "data": {
+                "consultation_id": consultation_id,
+                "consultation_info": consultation_info,
+                "recommended_medicines": detailed_medicines,
+                "total_found": len(detailed_medicines),
+                "search_query": query_text,
+                "next_cursor": None,
+                "has_more": has_more,
+            },
+            "message": f"Tìm thấy {len(detailed_medicines)} thuốc phù hợp với chẩn đoán",
+            "etag": etag,
+            "next_offset": offset + len(rag_results),
+            # Trang đầu cần query vector để tạo cursor mới khi phục vụ từ cache
+            "query_embedding": query_embedding if has_more and not cursor else None,
+            "cursor_context": {
+                "consultation_id": consultation_id,
+                "consultation_info": consultation_info,
+                "search_query": query_text,
             },
-            "recommended_medicines": detailed_medicines,
-            "total_found": len(detailed_medicines),
-            "search_query": query_text,
         }
-        return json(
-            data=response_data,
-            message=f"Tìm thấy {len(detailed_medicines)} thuốc phù hợp với chẩn đoán",
-            status=200,
-        )
+        if result_cache:
+            await result_cache.set(RECOMMEND_ENDPOINT, cache_params, page, index_version)
+        return await search_page_response(request, RECOMMEND_ENDPOINT, page, cursor_store, token)
     except Exception as e:
         print(f"Error in recommend_medicines_for_consultation: {e}")
         return validation(
             validation_errors=[f"Lỗi khi đề xuất thuốc: {str(e)}"],
             message="Đã xảy ra lỗi trong quá trình xử lý",
         )
+
+
+def format_history_item(consultation: Consultation) -> dict:
+    """Một phần tử trong lịch sử tư vấn của user"""
+    return {
+        **format_diagnosis_response(consultation),
+        "symptoms": consultation.human.symptoms,
+        "patient_age": consultation.human.patient_age,
+        "patient_gender": consultation.human.patient_gender,
+        "created_at": consultation.created_at,
+    }
+
+
+@router.get("/user/{user_id}", response_description="User consultation history")
+async def get_user_consultations(
+    user_id: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    Lịch sử tư vấn của user, mới nhất trước. Phân trang keyset: truyền next_cursor của trang trước vào cursor.
+    since/until lọc theo khoảng created_at (ISO 8601)
+    """
+    try:
+        if limit < 1 or limit > 100:
+            return validation(validation_errors=["limit phải từ 1 đến 100"])
+        after = None
+        if cursor:
+            after = decode_keyset_cursor(cursor)
+            if after is None:
+                return validation(validation_errors=["Cursor không hợp lệ"])
+        consultations, has_more = await list_user_consultations(
+            user_id, limit=limit, after=after, since=since, until=until
+        )
+        next_cursor = None
+        if has_more:
+            last = consultations[-1]
+            next_cursor = encode_keyset_cursor(last.created_at, str(last.id))
+        return json(
+            data={
+                "user_id": user_id,
+                "consultations": [format_history_item(consultation) for consultation in consultations],
+                "limit": limit,
+                "has_more": has_more,
+                "next_cursor": next_cursor,
+            },
+            message=f"Tìm thấy {len(consultations)} consultation",
+        )
+    except Exception as e:
+        print(f"Error listing consultations of user {user_id}: {e}")
+        return validation(
+            validation_errors=[f"Lỗi khi lấy lịch sử consultation: {str(e)}"],
+            message="Đã xảy ra lỗi trong quá trình xử lý",
+        )
@@ -1,9 +1,11 @@
+import asyncio
 from uuid import UUID
 from fastapi import APIRouter
-from motor.motor_asyncio import AsyncIOMotorClient
 
-from config.config import Settings
-from services.embedding_service import EmbeddingService
+from config.config import get_database
+from services.embedding_service import get_embedding_service
+from services.index_version import bump_index_version
+from services.medicine_cache import invalidate_medicine
 from utils.http_response import json, validation
 
 router = APIRouter()
@@ -24,8 +26,8 @@ async def get_embedding_status(medicine_id: str):
                 message="Dữ liệu đầu vào không hợp lệ",
             )
         # Kiểm tra trong vector database
-        embedding_service = EmbeddingService()
-        check_result = embedding_service.check_medicine_embedding_exists(medicine_id)
+        embedding_service = get_embedding_service()
+        check_result = await asyncio.to_thread(embedding_service.check_medicine_embedding_exists, medicine_id)
         if "error" in check_result:
             return validation(
                 validation_errors=[f"Lỗi khi kiểm tra: {check_result['error']}"],
@@ -68,10 +70,7 @@ async def embed_medicine_by_id(medicine_id: str):
                 message="Dữ liệu đầu vào không hợp lệ",
             )
         # Kết nối MongoDB và lấy thông tin thuốc
-        settings = Settings()
-        client = AsyncIOMotorClient(settings.DATABASE_URL)
-        db = client[settings.DATABASE_NAME]
-        collection = db["medicines"]
+        collection = get_database()["medicines"]
         # Tìm thuốc bằng ID
         medicine_doc = await collection.find_one({"_id": medicine_id})
         if not medicine_doc:
@@ -82,10 +81,11 @@ async def embed_medicine_by_id(medicine_id: str):
         # Chuyển đổi _id thành string để embedding service xử lý
         medicine_doc["_id"] = str(medicine_doc["_id"])
         # Khởi tạo embedding service
-        embedding_service = EmbeddingService()
+        embedding_service = get_embedding_service()
         # Kiểm tra xem thuốc đã được embedding chưa
-        existing_results = embedding_service.search_similar_medicines(
-            medicine_doc.get("name", ""), limit=1
+        # Cohere/Milvus SDK là I/O đồng bộ: chạy trong thread để không chặn event loop
+        existing_results = await asyncio.to_thread(
+            embedding_service.search_similar_medicines, medicine_doc.get("name", ""), limit=1
         )
         # Nếu đã tồn tại (similarity score rất cao), cập nhập
         should_update = False
@@ -98,8 +98,12 @@ async def embed_medicine_by_id(medicine_id: str):
                     should_update = True
                     break
         # Thực hiện embedding
-        success = embedding_service.insert_medicine_embedding(medicine_doc)
+        success = await asyncio.to_thread(embedding_service.insert_medicine_embedding, medicine_doc)
+        # Thuốc vừa được thêm/cập nhật: bỏ bản cũ trong cache thuốc
+        invalidate_medicine(medicine_id)
         if success:
+            # Kết quả tìm kiếm đã cache theo phiên bản chỉ mục cũ không còn được dùng
+            await bump_index_version()
             action = "Cập nhật" if should_update else "Thêm mới"
             response_data = {
                 "medicine_id": medicine_id,
@@ -140,17 +144,19 @@ async def delete_medicine_embedding(medicine_id: str):
                 message="Dữ liệu đầu vào không hợp lệ",
             )
         # Khởi tạo embedding service
-        embedding_service = EmbeddingService()
+        embedding_service = get_embedding_service()
         # Kiểm tra xem embedding có tồn tại không
-        check_result = embedding_service.check_medicine_embedding_exists(medicine_id)
+        check_result = await asyncio.to_thread(embedding_service.check_medicine_embedding_exists, medicine_id)
         if not check_result.get("exists", False):
             return validation(
                 validation_errors=["Không tìm thấy embedding cho thuốc này"],
                 message="Embedding không tồn tại trong vector database",
             )
         # Thực hiện xóa embedding
-        success = embedding_service.delete_medicine_embedding(medicine_id)
+        success = await asyncio.to_thread(embedding_service.delete_medicine_embedding, medicine_id)
+        invalidate_medicine(medicine_id)
         if success:
+            await bump_index_version()
             response_data = {
                 "medicine_id": medicine_id,
                 "medicine_name": check_result.get("name", ""),
@@ -1,125 +1,199 @@
-from fastapi import APIRouter
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
+from typing import Optional
 
-from config.config import Settings
-from services.embedding_service import EmbeddingService
+from fastapi import APIRouter, Request
+
+from config.config import get_database
+from services.embedding_service import get_embedding_service
+from services.index_version import bump_index_version, get_index_version
+from services.medicine_cache import get_medicine_documents, invalidate_medicine
+from services.medicine_fields import parse_fields
+from services.recommendation_service import build_similar_medicine_query, hydrate_medicines
+from services.result_cache import get_result_cache, search_page_response
+from services.search_cursor import decode_cursor, get_search_cursor_store
+from utils.http_cache import etag_matches, not_modified, result_etag
 from utils.http_response import json, validation
 
 router = APIRouter()
 
+SIMILAR_ENDPOINT = "similar-medicines"
+
+ORIGINAL_MEDICINE_PROJECTION = {
+    "name": 1,
+    "description": 1,
+    "category_id": 1,
+    "thumbnail": 1,
+    "variants": 1,
+    "details.ingredients": 1,
+    "details.usage": 1,
+}
+
 @router.get("/{medicine_id}/simmilar-medicines", response_description="Get similar medicines based on medicine ID")
-async def get_simmilar_medicines(medicine_id: str, limit: int = 4):
+async def get_simmilar_medicines(
+    request: Request,
+    medicine_id: str,
+    limit: int = 4,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
     """
-    Lấy top sản phẩm tương tự dựa trên ID sản phẩm
+    Lấy top sản phẩm tương tự dựa trên ID sản phẩm.
+    fields: bộ field của thuốc ("card", "summary") hoặc danh sách field, mặc định trả cả document.
+    Response có ETag; gửi lại If-None-Match để nhận 304 khi kết quả không đổi
     """
     try:
-        # Lấy thông tin chi tiết thuốc gốc từ MongoDB
-        settings = Settings()
-        client = AsyncIOMotorClient(settings.DATABASE_URL)
-        db = client[settings.DATABASE_NAME]
-        collection = db["medicines"]
-        # Tìm thuốc gốc
-        original_medicine = await collection.find_one({"_id": medicine_id})
-        if not original_medicine:
-            return validation(
-                validation_errors=["Không tìm thấy thuốc với ID này"],
-                message="Thuốc không tồn tại",
-            )
+        try:
+            projection = parse_fields(fields)
+        except ValueError as e:
+            return validation(validation_errors=[str(e)])
+        collection = get_database()["medicines"]
+        cursor_store = get_search_cursor_store()
+        if cursor:
+            # Trang tiếp theo: dùng lại query vector đã lưu, không đọc lại thuốc gốc và không embedding lại
+            decoded = decode_cursor(cursor)
+            entry = await cursor_store.get(decoded[0]) if decoded else None
+            if not entry or entry["context"].get("medicine_id") != medicine_id:
+                return validation(
+                    validation_errors=["Cursor không hợp lệ hoặc đã hết hạn"],
+                    message="Dữ liệu đầu vào không hợp lệ",
+                )
+            token, offset = decoded
+        else:
+            token, offset = None, 0
+        # Cùng thuốc, limit, trang và fields với cùng phiên bản chỉ mục thì kết quả không đổi
+        index_version = await get_index_version()
+        result_cache = get_result_cache()
+        cache_params = {"medicine_id": medicine_id, "limit": limit, "offset": offset, "fields": fields}
+        cached = await result_cache.get(SIMILAR_ENDPOINT, cache_params, index_version) if result_cache else None
+        if cached:
+            return await search_page_response(request, SIMILAR_ENDPOINT, cached, cursor_store, token)
         # Khởi tạo embedding service
-        embedding_service = EmbeddingService()
-        # Tạo query text từ thông tin thuốc gốc để tìm sản phẩm tương tự
-        query_parts = []
-        # Thêm tên thuốc (để tìm thuốc cùng loại)
-        query_parts.append(f"Thuốc: {original_medicine.get('name', '')}")
-        # Thêm mô tả
-        query_parts.append(f"Mô tả: {original_medicine.get('description', '')}")
-        # Thêm thông tin chi tiết nếu có
-        if "details" in original_medicine:
-            details = original_medicine["details"]
-            if "ingredients" in details:
-                query_parts.append(f"Thành phần: {details['ingredients']}")
-            if "usage" in details and isinstance(details["usage"], list):
-                usage_text = ', '.join(details['usage'])
-                query_parts.append(f"Công dụng: {usage_text}")
-                query_parts.append(f"Điều trị: {usage_text}")
-        # Thêm danh mục để tìm thuốc cùng danh mục
-        if "category_id" in original_medicine:
-            query_parts.append(f"Danh mục: {original_medicine['category_id']}")
-        # Tạo query text hoàn chỉnh
-        query_text = ". ".join(query_parts)
-        # Tìm kiếm thuốc tương tự (lấy nhiều hơn để có thể lọc)
-        similar_results = embedding_service.search_similar_medicines(query_text, limit + 5)
-        if not similar_results:
-            return json(
-                data={
-                    "original_medicine": {
-                        "id": str(original_medicine["_id"]),
-                        "name": original_medicine.get("name", ""),
-                        "description": original_medicine.get("description", "")
-                    },
-                    "similar_medicines": [],
-                    "total_found": 0
-                },
-                message="Không tìm thấy thuốc tương tự",
-                status=200,
+        embedding_service = get_embedding_service()
+        if cursor:
+            query_embedding = entry["embedding"]
+            original_medicine_info = entry["context"]["original_medicine"]
+            query_text = entry["context"]["query_used"]
+        else:
+            # Tìm thuốc gốc (qua cache thuốc), chỉ lấy các field cần cho query và thông tin thuốc gốc
+            original_medicine = (
+                await get_medicine_documents(collection, [medicine_id], ORIGINAL_MEDICINE_PROJECTION)
+            ).get(medicine_id)
+            if not original_medicine:
+                return validation(
+                    validation_errors=["Không tìm thấy thuốc với ID này"],
+                    message="Thuốc không tồn tại",
+                )
+            # Chuẩn bị thông tin thuốc gốc
+            original_medicine_info = {
+                "id": original_medicine["id"],
+                "name": original_medicine.get("name", ""),
+                "description": original_medicine.get("description", ""),
+                "category_id": original_medicine.get("category_id", ""),
+                "thumbnail": original_medicine.get("thumbnail", {}),
+                "variants": original_medicine.get("variants", {})
+            }
+            # Tạo query text từ thông tin thuốc gốc để tìm sản phẩm tương tự
+            query_text = build_similar_medicine_query(original_medicine)
+            # Cohere/Milvus SDK là I/O đồng bộ: chạy trong thread để không chặn event loop
+            query_embedding = await asyncio.to_thread(
+                embedding_service.generate_embedding, query_text, input_type="search_query"
             )
-        # Lọc bỏ thuốc gốc khỏi kết quả và lấy thông tin chi tiết
-        filtered_results = []
+            if not query_embedding:
+                return json(
+                    data={
+                        "original_medicine": original_medicine_info,
+                        "similar_medicines": [],
+                        "total_found": 0
+                    },
+                    message="Không tìm thấy thuốc tương tự",
+                    status=200,
+                )
+        cursor_context = {
+            "medicine_id": medicine_id,
+            "original_medicine": original_medicine_info,
+            "query_used": query_text,
+        }
+        # Lấy thêm 1 kết quả để bù cho thuốc gốc có thể nằm trong kết quả
+        similar_results = await asyncio.to_thread(
+            embedding_service.search_by_embedding, query_embedding, limit + 1, offset
+        )
+        # Lọc bỏ thuốc gốc khỏi kết quả
+        candidates = []
+        consumed = 0
         for result in similar_results:
-            # Bỏ qua thuốc gốc
+            if len(candidates) >= limit:
+                break
+            consumed += 1
             if result["medicine_id"] == medicine_id:
                 continue
-            # Lấy thông tin đầy đủ từ MongoDB
-            try:
-                medicine_doc = await collection.find_one({"_id": result["medicine_id"]})
-                if medicine_doc:
-                    # Xử lý UUID serialization
-                    if "_id" in medicine_doc:
-                        medicine_doc["id"] = str(medicine_doc["_id"])
-                        del medicine_doc["_id"]
-                    # Xử lý các UUID fields khác
-                    for field, value in medicine_doc.items():
-                        if hasattr(value, "hex"):  # Check if it's a UUID
-                            medicine_doc[field] = str(value)
-                    # Xử lý datetime fields
-                    if "created_at" in medicine_doc and hasattr(medicine_doc["created_at"], "isoformat"):
-                        medicine_doc["created_at"] = medicine_doc["created_at"].isoformat()
-                    if "updated_at" in medicine_doc and hasattr(medicine_doc["updated_at"], "isoformat"):
-                        medicine_doc["updated_at"] = medicine_doc["updated_at"].isoformat()
-                    # Thêm thông tin similarity score
-                    medicine_doc["similarity_score"] = result["similarity_score"]
-                    medicine_doc["similarity_ranking"] = len(filtered_results) + 1
-                    filtered_results.append(medicine_doc)
-                    # Đủ số lượng yêu cầu thì dừng
-                    if len(filtered_results) >= limit:
-                        break
-            except Exception as e:
-                print(f"Error fetching similar medicine {result['medicine_id']}: {e}")
-                continue
-        # Chuẩn bị thông tin thuốc gốc
-        original_medicine_info = {
-            "id": str(original_medicine["_id"]),
-            "name": original_medicine.get("name", ""),
-            "description": original_medicine.get("description", ""),
-            "category_id": original_medicine.get("category_id", ""),
-            "thumbnail": original_medicine.get("thumbnail", {}),
-            "variants": original_medicine.get("variants", {})
-        }
+            candidates.append(result)
+        has_more = consumed < len(similar_results) or len(similar_results) == limit + 1
+        # Kết quả không đổi so với bản client đang có: trả 304 trước khi lấy thông tin thuốc
+        etag = result_etag(
+            SIMILAR_ENDPOINT,
+            {"medicine_id": medicine_id, "limit": limit, "offset": offset, "fields": fields, "has_more": has_more},
+            candidates,
+            index_version,
+        )
+        matched_etag = etag_matches(request, etag)
+        if matched_etag:
+            return not_modified(SIMILAR_ENDPOINT, matched_etag)
+        # Lấy thông tin đầy đủ từ MongoDB
+        filtered_results = await hydrate_medicines(
+            collection, candidates, "similarity_ranking", start_rank=offset + 1, projection=projection
+        )
         response_data = {
             "original_medicine": original_medicine_info,
             "similar_medicines": filtered_results,
             "total_found": len(filtered_results),
             "search_strategy": "embedding_similarity",
-            "query_used": query_text
+            "query_used": query_text,
+            "next_cursor": None,
+            "has_more": has_more,
         }
-        return json(
-            data=response_data,
-            message=f"Tìm thấy {len(filtered_results)} sản phẩm tương tự",
-            status=200,
+        message = (
+            f"Tìm thấy {len(filtered_results)} sản phẩm tương tự"
+            if filtered_results
+            else "Không tìm thấy thuốc tương tự"
         )
+        page = {
+            "data": response_data,
+            "message": message,
+            "etag": etag,
+            "next_offset": offset + consumed,
+            # Trang đầu cần query vector để tạo cursor mới khi phục vụ từ cache
+            "query_embedding": query_embedding if has_more and not cursor else None,
+            "cursor_context": cursor_context,
+        }
+        if result_cache:
+            await result_cache.set(SIMILAR_ENDPOINT, cache_params, page, index_version)
+        return await search_page_response(request, SIMILAR_ENDPOINT, page, cursor_store, token)
     except Exception as e:
         print(f"Error in get_similar_medicines: {e}")
         return validation(
             validation_errors=[f"Lỗi khi tìm sản phẩm tương tự: {str(e)}"],
             message="Đã xảy ra lỗi trong quá trình xử lý",
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/{medicine_id}/invalidate-cache", response_description="Medicine cache invalidated")
+async def invalidate_medicine_cache(medicine_id: str):
+    """
+    Bỏ thông tin thuốc khỏi cache sau khi Laravel cập nhật các field không cần embedding lại
+    (giá, tồn kho, đánh giá...)
+    """
+    try:
+        invalidate_medicine(medicine_id)
+        # Cập nhật giá/tồn kho không đi qua EmbeddingService nhưng làm thay đổi kết quả đã cache
+        await bump_index_version()
+        return json(
+            data={"medicine_id": medicine_id, "action": "invalidated"},
+            message="Đã làm mới cache thuốc",
+            status=200,
+        )
+    except Exception as e:
+        print(f"Error invalidating medicine cache {medicine_id}: {e}")
+        return validation(
+            validation_errors=[f"Lỗi khi làm mới cache thuốc: {str(e)}"],
+            message="Đã xảy ra lỗi trong quá trình xử lý",
+        )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
 
 
 class ConsultationRequest(BaseModel):
@@ -7,6 +7,8 @@ class ConsultationRequest(BaseModel):
     symptoms: str
     patient_age: Optional[int] = None
     patient_gender: Optional[str] = None
+    bypass_cache: bool = False  # Bỏ qua cache chẩn đoán, luôn gọi AI
+    profile: Optional[Literal["fast", "standard", "detailed"]] = None  # Mặc định theo DIAGNOSIS_DEFAULT_PROFILE
 
     class Config:
         json_schema_extra = {
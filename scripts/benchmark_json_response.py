@@ -0,0 +1,121 @@
+"""
+Micro-benchmark encode response JSON: JSONResponse mặc định (json.dumps, cần chuyển UUID/datetime thủ công)
+so với FastJSONResponse (orjson) trên payload đề xuất thuốc cỡ thật.
+
+Chạy từ thư mục gốc dự án:
+    python -m scripts.benchmark_json_response --medicines 50 --iterations 2000
+"""
+import argparse
+import time
+import uuid
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+from utils.http_response import FastJSONResponse
+
+
+def build_medicine(index: int) -> Dict[str, Any]:
+    """Document thuốc giả lập với cấu trúc giống collection medicines"""
+    now = datetime.now()
+    return {
+        "id": str(uuid.uuid4()),
+        "category_id": uuid.uuid4(),
+        "supplier_id": uuid.uuid4(),
+        "name": f"Thuốc thử nghiệm {index}",
+        "slug": f"thuoc-thu-nghiem-{index}",
+        "description": "Mô tả chi tiết công dụng, liều dùng và chống chỉ định của thuốc. " * 8,
+        "thumbnail": {"url": f"https://cdn.example.com/medicines/{index}.webp", "alt": f"Thuốc {index}"},
+        "variants": [
+            {
+                "id": uuid.uuid4(),
+                "price": 125000.0 + variant,
+                "original_price": 150000.0,
+                "discount_percent": 16.7,
+                "stock_status": "in_stock",
+            }
+            for variant in range(3)
+        ],
+        "details": {
+            "ingredients": [{"name": f"Hoạt chất {n}", "amount": n * 10.5} for n in range(6)],
+            "usage": ["Uống sau ăn", "Ngày 2 lần"],
+            "paragraph": "Thông tin chi tiết về thuốc. " * 20,
+        },
+        "ratings": {"star": 4.5, "review_count": 120},
+        "similarity_score": np.float32(0.87 - index * 0.001),
+        "rag_ranking": index + 1,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def build_payload(medicine_count: int) -> Dict[str, Any]:
+    return {
+        "data": {
+            "consultation_id": uuid.uuid4().hex,
+            "recommended_medicines": [build_medicine(index) for index in range(medicine_count)],
+            "total_found": medicine_count,
+        },
+        "message": "Thành công",
+        "status": 200,
+        "locale": "en",
+        "errors": None,
+    }
+
+
+def to_plain_json(value: Any) -> Any:
+    """Chuyển đổi thủ công trước khi dùng json.dumps (cách làm trước đây trong routes)"""
+    if isinstance(value, dict):
+        return {key: to_plain_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_plain_json(item) for item in value]
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def measure(render: Callable[[], bytes], iterations: int) -> Dict[str, float]:
+    render()  # warm-up
+    samples: List[float] = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        body = render()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "mean_us": sum(samples) / len(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p95_us": samples[int(len(samples) * 0.95)] * 1e6,
+        "bytes": len(body),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh tốc độ encode JSONResponse và FastJSONResponse")
+    parser.add_argument("--medicines", type=int, default=50, help="Số thuốc trong payload")
+    parser.add_argument("--iterations", type=int, default=2000, help="Số lần encode mỗi phương án")
+    args = parser.parse_args()
+
+    payload = build_payload(args.medicines)
+    results = {
+        "JSONResponse (json.dumps + chuyển đổi thủ công)": measure(
+            lambda: JSONResponse(content=to_plain_json(payload)).body, args.iterations
+        ),
+        "FastJSONResponse (orjson)": measure(lambda: FastJSONResponse(content=payload).body, args.iterations),
+    }
+    print(f"Payload: {args.medicines} thuốc, {args.iterations} lần encode")
+    print(f"{'Phương án':<50} {'TB (µs)':>10} {'p50 (µs)':>10} {'p95 (µs)':>10} {'Byte':>10}")
+    for name, row in results.items():
+        print(f"{name:<50} {row['mean_us']:>10.1f} {row['p50_us']:>10.1f} {row['p95_us']:>10.1f} {row['bytes']:>10d}")
+    baseline, fast = results.values()
+    print(f"Nhanh hơn: {baseline['mean_us'] / fast['mean_us']:.1f}x mỗi response")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Micro-benchmark chi phí đọc cấu hình: tạo Settings() mới (đọc biến môi trường + parse .env, validate)
+so với get_settings() dùng chung, và ước tính chi phí tiết kiệm được trên mỗi request.
+
+Chạy từ thư mục gốc dự án:
+    python -m scripts.benchmark_settings --iterations 2000 --per-request 8
+"""
+import argparse
+import time
+from typing import Callable, Dict, List
+
+from config.config import Settings, get_settings
+
+
+def measure(load: Callable[[], Settings], iterations: int) -> Dict[str, float]:
+    load()  # warm-up
+    samples: List[float] = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        load()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "mean_us": sum(samples) / len(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p95_us": samples[int(len(samples) * 0.95)] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh chi phí Settings() và get_settings()")
+    parser.add_argument("--iterations", type=int, default=2000, help="Số lần đọc settings mỗi phương án")
+    parser.add_argument(
+        "--per-request",
+        type=int,
+        default=8,
+        help="Số lần Settings() trên một request trước đây (route, get_database, EmbeddingService, cache...)",
+    )
+    args = parser.parse_args()
+
+    results = {
+        "Settings() (đọc env/.env mỗi lần)": measure(Settings, args.iterations),
+        "get_settings() (dùng chung)": measure(get_settings, args.iterations),
+    }
+    print(f"{args.iterations} lần đọc settings")
+    print(f"{'Phương án':<40} {'TB (µs)':>10} {'p50 (µs)':>10} {'p95 (µs)':>10}")
+    for name, row in results.items():
+        print(f"{name:<40} {row['mean_us']:>10.2f} {row['p50_us']:>10.2f} {row['p95_us']:>10.2f}")
+    baseline, cached = results.values()
+    saved_us = (baseline["mean_us"] - cached["mean_us"]) * args.per_request
+    print(f"Tiết kiệm ~{saved_us:.0f} µs mỗi request ({args.per_request} lần tạo Settings())")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Tính lại rollup thống kê chẩn đoán từ collection consultations cho các bucket đã đóng.
+Dùng làm job định kỳ (cron) để sửa lệch do lỗi cập nhật nền, hoặc backfill dữ liệu cũ.
+
+Chạy từ thư mục gốc dự án:
+    python -m scripts.compact_analytics_rollups --days 2
+    python -m scripts.compact_analytics_rollups --since 2025-01-01 --until 2025-07-01
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+
+from services.analytics_rollups import GRANULARITIES, bucket_start, compact_rollups
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Tính lại rollup thống kê chẩn đoán theo giờ/ngày")
+    parser.add_argument("--days", type=int, default=2, help="Số ngày gần nhất cần tính lại (khi không truyền --since)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Thời điểm bắt đầu (ISO 8601)")
+    parser.add_argument(
+        "--until",
+        type=datetime.fromisoformat,
+        help="Thời điểm kết thúc (ISO 8601), mặc định đầu giờ hiện tại để bỏ qua bucket đang ghi",
+    )
+    parser.add_argument(
+        "--granularity", choices=GRANULARITIES, action="append", help="Chỉ tính lại granularity này (mặc định tất cả)"
+    )
+    args = parser.parse_args()
+
+    until = args.until or bucket_start(datetime.now(), "hour")
+    since = args.since or until - timedelta(days=args.days)
+    for granularity in args.granularity or GRANULARITIES:
+        # Bucket ngày chưa đóng thì chỉ tính đến đầu ngày
+        granularity_until = bucket_start(until, granularity)
+        written = await compact_rollups(granularity, since, granularity_until)
+        print(f"{granularity}: {since.isoformat()} -> {granularity_until.isoformat()}, {written} rollup")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Đánh giá offline cache chẩn đoán ngữ nghĩa: phát lại các consultation trong lịch sử theo thứ tự thời gian
+và báo cáo tỉ lệ hit theo từng ngưỡng tương đồng.
+
+Chạy từ thư mục gốc dự án:
+    python -m scripts.evaluate_semantic_cache --limit 2000 --thresholds 0.85,0.9,0.92,0.95
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+from config.config import get_database
+from services.diagnosis_cache import age_bucket, diagnosis_cache_key, normalize_gender, normalize_symptoms
+from services.embedding_service import EmbeddingService
+
+
+async def load_consultations(limit: int) -> List[Dict]:
+    collection = get_database()["consultations"]
+    cursor = collection.find(
+        {},
+        {"human": 1, "ai.primary_diagnosis.diagnosis_name": 1, "created_at": 1},
+    ).sort("created_at", 1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+def replay(consultations: List[Dict], embeddings: np.ndarray, thresholds: List[float]) -> Dict:
+    """Với mỗi consultation, tìm consultation trước đó tương tự nhất cùng nhóm tuổi/giới tính"""
+    seen_keys = set()
+    bands: Dict[str, List[int]] = defaultdict(list)
+    exact_hits = 0
+    best_scores = np.zeros(len(consultations))
+    same_diagnosis = np.zeros(len(consultations), dtype=bool)
+    for i, doc in enumerate(consultations):
+        human = doc.get("human", {})
+        key = diagnosis_cache_key(human.get("symptoms", ""), human.get("patient_age"), human.get("patient_gender"))
+        if key in seen_keys:
+            exact_hits += 1
+        seen_keys.add(key)
+        band = f"{age_bucket(human.get('patient_age'))}|{normalize_gender(human.get('patient_gender'))}"
+        previous = bands[band]
+        if previous:
+            scores = embeddings[previous] @ embeddings[i]
+            best = int(np.argmax(scores))
+            best_scores[i] = scores[best]
+            diagnosis = doc.get("ai", {}).get("primary_diagnosis", {}).get("diagnosis_name")
+            matched = consultations[previous[best]].get("ai", {}).get("primary_diagnosis", {}).get("diagnosis_name")
+            same_diagnosis[i] = bool(diagnosis) and diagnosis == matched
+        else:
+            best_scores[i] = -1.0
+        previous.append(i)
+    total = len(consultations)
+    rows = []
+    for threshold in thresholds:
+        hits = best_scores >= threshold
+        hit_count = int(hits.sum())
+        rows.append(
+            {
+                "threshold": threshold,
+                "hits": hit_count,
+                "hit_rate": hit_count / total if total else 0.0,
+                "same_primary_diagnosis": float(same_diagnosis[hits].mean()) if hit_count else 0.0,
+            }
+        )
+    return {"total": total, "exact_hits": exact_hits, "rows": rows}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Đánh giá tỉ lệ hit của cache chẩn đoán ngữ nghĩa")
+    parser.add_argument("--limit", type=int, default=2000, help="Số consultation tối đa được phát lại")
+    parser.add_argument(
+        "--thresholds",
+        default="0.8,0.85,0.88,0.9,0.92,0.94,0.96,0.98",
+        help="Danh sách ngưỡng tương đồng, phân tách bằng dấu phẩy",
+    )
+    args = parser.parse_args()
+    thresholds = [float(value) for value in args.thresholds.split(",")]
+
+    consultations = await load_consultations(args.limit)
+    if not consultations:
+        print("Không có consultation nào để đánh giá")
+        return
+    embedding_service = EmbeddingService()
+    texts = [normalize_symptoms(doc.get("human", {}).get("symptoms", "")) for doc in consultations]
+    vectors = embedding_service.generate_embeddings(texts, input_type="clustering")
+    # Bỏ các consultation không tạo được embedding
+    kept = [(doc, vector) for doc, vector in zip(consultations, vectors) if vector]
+    if not kept:
+        print("Không tạo được embedding nào (kiểm tra COHERE_API_KEY và kết nối Cohere)")
+        return
+    consultations = [doc for doc, _ in kept]
+    embeddings = np.array([vector for _, vector in kept], dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    report = replay(consultations, embeddings, thresholds)
+    total = report["total"]
+    print(f"Tổng consultation: {total}")
+    print(f"Hit khớp chính xác: {report['exact_hits']} ({report['exact_hits'] / total:.1%})")
+    print(f"{'Ngưỡng':>8} {'Hit':>8} {'Tỉ lệ':>8} {'Cùng chẩn đoán':>16}")
+    for row in report["rows"]:
+        print(
+            f"{row['threshold']:>8.2f} {row['hits']:>8d} {row['hit_rate']:>8.1%} "
+            f"{row['same_primary_diagnosis']:>16.1%}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""
+Server giả lập API chat completion tương thích OpenAI để thử LLM router offline.
+
+Ví dụ chạy hai provider với độ trễ và tỉ lệ lỗi khác nhau:
+    python -m scripts.fake_llm_provider --name gemini --port 9001 --latency 0.8 --jitter 0.3
+    python -m scripts.fake_llm_provider --name deepseek --port 9002 --latency 2.0 --error-rate 0.2
+
+Sau đó trỏ ứng dụng tới các server này trong .env:
+    LLM_PROVIDERS=gemini,deepseek
+    GEMINI_API_KEY=local
+    GEMINI_BASE_URL=http://localhost:9001/v1
+    DEEPSEEK_API_KEY=local
+    DEEPSEEK_BASE_URL=http://localhost:9002/v1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def build_diagnosis(provider_name: str) -> dict:
+    return {
+        "primary_diagnosis": {
+            "diagnosis_name": f"Cảm lạnh thông thường ({provider_name})",
+            "confidence_percentage": 75,
+            "description": "Nhiễm virus đường hô hấp trên, thường tự khỏi sau 7-10 ngày.",
+            "reasons": ["Sốt nhẹ", "Ho khan", "Không có dấu hiệu nặng"],
+        },
+        "alternative_diagnoses": [
+            {
+                "diagnosis_name": "Cúm mùa",
+                "confidence_percentage": 50,
+                "description": "Nhiễm virus cúm với triệu chứng toàn thân rõ hơn.",
+                "reasons": ["Sốt", "Đau mỏi", "Theo mùa"],
+            },
+            {
+                "diagnosis_name": "Viêm họng",
+                "confidence_percentage": 30,
+                "description": "Viêm niêm mạc họng do virus hoặc vi khuẩn.",
+                "reasons": ["Ho", "Đau họng", "Sốt nhẹ"],
+            },
+        ],
+        "general_advice": ["Nghỉ ngơi", "Uống nhiều nước", "Theo dõi nhiệt độ"],
+        "overall_severity_level": "nhẹ",
+        "related_symptoms": ["Sổ mũi", "Đau họng", "Mệt mỏi"],
+        "recommended_actions": ["Hạ sốt khi cần", "Khám nếu sốt trên 3 ngày", "Cấp cứu nếu khó thở"],
+    }
+
+
+def create_app(name: str, latency: float, jitter: float, error_rate: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        await asyncio.sleep(max(0.0, random.gauss(latency, jitter)))
+        if random.random() < error_rate:
+            return JSONResponse({"error": {"message": f"{name} giả lập lỗi"}}, status_code=503)
+        content = json.dumps(build_diagnosis(name), ensure_ascii=False)
+        prompt_chars = sum(len(message.get("content", "")) for message in payload.get("messages", []))
+        return {
+            "id": f"{name}-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "model": payload.get("model", name),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (prompt_chars + len(content)) // 4,
+            },
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server LLM giả lập tương thích OpenAI")
+    parser.add_argument("--name", default="local")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=1.0, help="Độ trễ trung bình (giây)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Độ lệch chuẩn độ trễ (giây)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Tỉ lệ trả về lỗi 503")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.name, args.latency, args.jitter, args.error_rate), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
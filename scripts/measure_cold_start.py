@@ -0,0 +1,61 @@
+"""
+Đo thời gian import app trong một process mới (python -X importtime) để theo dõi hồi quy cold start:
+tổng thời gian, các module tốn thời gian nhất và SDK nặng bị import sớm (cohere, pymilvus, groq).
+
+Chạy từ thư mục gốc dự án:
+    python -m scripts.measure_cold_start --top 15 --budget-ms 1500
+"""
+import argparse
+import subprocess
+import sys
+from typing import List, Tuple
+
+LAZY_MODULES = ("cohere", "pymilvus", "groq")
+
+
+def import_times(module: str) -> List[Tuple[str, int, int]]:
+    """Chạy import trong process mới, trả về (module, self µs, cumulative µs) theo thứ tự import"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian import app để theo dõi cold start")
+    parser.add_argument("--module", default="app", help="Module cần đo")
+    parser.add_argument("--top", type=int, default=15, help="Số module tốn thời gian nhất cần in")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Thoát mã 1 nếu vượt ngưỡng (dùng trong CI)")
+    args = parser.parse_args()
+
+    rows = import_times(args.module)
+    total_ms = next(cumulative for name, _, cumulative in rows if name == args.module) / 1000
+    top_level = sorted(
+        ((name, cumulative) for name, _, cumulative in rows if "." not in name and name != args.module),
+        key=lambda row: row[1],
+        reverse=True,
+    )
+    print(f"import {args.module}: {total_ms:.0f} ms")
+    print(f"{'Package':<40} {'Tích lũy (ms)':>14}")
+    for name, cumulative in top_level[: args.top]:
+        print(f"{name:<40} {cumulative / 1000:>14.1f}")
+
+    eager = [name for name in LAZY_MODULES if any(row[0] == name for row in rows)]
+    if eager:
+        print(f"Cảnh báo: SDK đáng lẽ import lúc warm-up lại bị import khi import app: {', '.join(eager)}")
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"Vượt ngưỡng {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
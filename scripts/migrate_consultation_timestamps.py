@@ -0,0 +1,110 @@
+"""
+Chuyển created_at/updated_at của các consultation cũ từ chuỗi ISO sang datetime gốc của MongoDB
+để index (user_id, created_at, _id) dùng được cho lọc theo khoảng thời gian và phân trang lịch sử.
+Consultation không có created_at được bổ sung theo thời điểm tạo ghi trong ObjectId.
+
+Chạy từ thư mục gốc dự án:
+    python -m scripts.migrate_consultation_timestamps --dry-run
+    python -m scripts.migrate_consultation_timestamps --batch-size 500
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from config.config import get_database
+from models.consultation import Consultation
+
+TIMESTAMP_FIELDS = ("created_at", "updated_at")
+
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def object_id_timestamp(document_id) -> Optional[datetime]:
+    """Thời điểm tạo ghi trong ObjectId, đổi sang giờ local không kèm timezone như datetime.now() của model"""
+    if not isinstance(document_id, ObjectId):
+        return None
+    return document_id.generation_time.astimezone().replace(tzinfo=None)
+
+
+def build_update(doc: Dict) -> Optional[UpdateOne]:
+    """Tạo lệnh cập nhật cho một consultation, None nếu không có field nào cần đổi"""
+    changes = {}
+    for field_name in TIMESTAMP_FIELDS:
+        value = doc.get(field_name)
+        if isinstance(value, str):
+            parsed = parse_timestamp(value)
+            if parsed is not None:
+                changes[field_name] = parsed
+    if doc.get("created_at") is None:
+        # Bản ghi cũ thiếu created_at: không lọc/phân trang keyset được theo thời gian
+        backfilled = object_id_timestamp(doc["_id"])
+        if backfilled is not None:
+            changes["created_at"] = backfilled
+    if not changes:
+        return None
+    # Chỉ cập nhật khi giá trị vẫn như lúc đọc, tránh ghi đè bản ghi vừa được sửa
+    return UpdateOne({"_id": doc["_id"], **{name: doc.get(name) for name in changes}}, {"$set": changes})
+
+
+async def migrate(batch_size: int, dry_run: bool) -> Dict[str, int]:
+    collection = get_database()["consultations"]
+    cursor = collection.find(
+        {"$or": [{field_name: {"$type": "string"}} for field_name in TIMESTAMP_FIELDS] + [{"created_at": None}]},
+        {field_name: 1 for field_name in TIMESTAMP_FIELDS},
+    )
+    stats = {"scanned": 0, "updated": 0, "unparsable": 0}
+    batch: List[UpdateOne] = []
+    async for doc in cursor:
+        stats["scanned"] += 1
+        update = build_update(doc)
+        if update is None:
+            stats["unparsable"] += 1
+            continue
+        batch.append(update)
+        if len(batch) >= batch_size:
+            stats["updated"] += await flush(collection, batch, dry_run)
+            batch = []
+    if batch:
+        stats["updated"] += await flush(collection, batch, dry_run)
+    return stats
+
+
+async def flush(collection, batch: List[UpdateOne], dry_run: bool) -> int:
+    if dry_run:
+        return len(batch)
+    result = await collection.bulk_write(batch, ordered=False)
+    return result.modified_count
+
+
+async def ensure_indexes():
+    """Tạo các index khai báo trên Consultation.Settings (giống lúc init_beanie khi khởi động)"""
+    collection = get_database()["consultations"]
+    await collection.create_indexes(Consultation.Settings.indexes)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Chuyển timestamp dạng chuỗi của consultation sang datetime")
+    parser.add_argument("--batch-size", type=int, default=500, help="Số document mỗi lần bulk_write")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm số document cần chuyển, không ghi")
+    args = parser.parse_args()
+
+    stats = await migrate(args.batch_size, args.dry_run)
+    if not args.dry_run:
+        await ensure_indexes()
+    action = "Cần chuyển" if args.dry_run else "Đã chuyển"
+    print(f"Đã quét: {stats['scanned']} consultation có timestamp dạng chuỗi hoặc thiếu created_at")
+    print(f"{action}: {stats['updated']}")
+    print(f"Không đọc được timestamp: {stats['unparsable']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
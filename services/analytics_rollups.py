@@ -0,0 +1,186 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from config.config import get_database, get_settings
+from models.analytics import DiagnosisRollup
+from models.consultation import Consultation
+from utils.background import spawn
+from utils.metrics import metrics
+
+ROLLUP_COLLECTION = DiagnosisRollup.Settings.name
+GRANULARITIES = ("hour", "day")
+# Chiều thống kê -> đường dẫn field trong consultation; "total" đếm tất cả consultation của bucket
+DIMENSIONS = {
+    "diagnosis": "ai.primary_diagnosis.diagnosis_name",
+    "severity": "ai.overall_severity_level",
+}
+TOTAL = "total"
+
+rollup_writes = metrics.counter(
+    "analytics_rollup_writes_total", "Số lần cập nhật rollup khi ghi consultation theo kết quả (ok/error)"
+)
+
+
+def to_local_naive(moment: datetime) -> datetime:
+    """Đổi thời điểm có timezone sang giờ local không kèm timezone như created_at và bucket của rollup"""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone().replace(tzinfo=None)
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Làm tròn thời điểm xuống đầu giờ/đầu ngày"""
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Granularity không hợp lệ: {granularity}")
+
+
+def consultation_dimensions(consultation: Consultation) -> Dict[str, str]:
+    """Giá trị của từng chiều thống kê cho một consultation"""
+    return {
+        "diagnosis": consultation.ai.primary_diagnosis.diagnosis_name,
+        "severity": consultation.ai.overall_severity_level,
+    }
+
+
+def rollup_updates(consultation: Consultation) -> List[UpdateOne]:
+    """Các lệnh $inc (upsert) cho mọi bucket giờ/ngày mà consultation thuộc về"""
+    created_at = consultation.created_at or datetime.now()
+    values = {TOTAL: TOTAL, **consultation_dimensions(consultation)}
+    now = datetime.now()
+    updates = []
+    for granularity in GRANULARITIES:
+        bucket = bucket_start(created_at, granularity)
+        for dimension, value in values.items():
+            # Giống compact_rollups: bỏ qua chiều không có giá trị để hai đường ghi cho cùng số đếm
+            if value is None:
+                continue
+            updates.append(
+                UpdateOne(
+                    {"granularity": granularity, "bucket": bucket, "dimension": dimension, "value": value},
+                    {"$inc": {"consultation_count": 1}, "$set": {"updated_at": now}},
+                    upsert=True,
+                )
+            )
+    return updates
+
+
+async def record_consultation(consultation: Consultation):
+    """Cộng dồn consultation vừa lưu vào các rollup"""
+    collection = get_database()[ROLLUP_COLLECTION]
+    try:
+        await collection.bulk_write(rollup_updates(consultation), ordered=False)
+        rollup_writes.inc(result="ok")
+    except Exception:
+        rollup_writes.inc(result="error")
+        raise
+
+
+def schedule_rollup(consultation: Consultation):
+    """Cập nhật rollup trong nền để không cộng thêm độ trễ vào request ghi consultation"""
+    if get_settings().ANALYTICS_ROLLUP_ON_WRITE:
+        spawn(record_consultation(consultation), name="analytics_rollup")
+
+
+async def compact_rollups(granularity: str, since: datetime, until: datetime) -> int:
+    """
+    Tính lại rollup của các bucket trong [since, until) từ collection consultations và ghi đè số đếm.
+    Idempotent nên dùng được cho job định kỳ (sửa lệch do lỗi ghi nền) hoặc backfill dữ liệu cũ.
+    Nên chạy cho các bucket đã đóng để không đè lên $inc của consultation đang được ghi
+    """
+    since = bucket_start(since, granularity)
+    until = bucket_start(until, granularity)
+    date_format = "%Y-%m-%dT%H" if granularity == "hour" else "%Y-%m-%d"
+    group_key = {"$dateToString": {"format": date_format, "date": "$created_at"}}
+    consultations = get_database()["consultations"]
+    counts: Dict[tuple, int] = defaultdict(int)
+    for dimension, path in {TOTAL: None, **DIMENSIONS}.items():
+        pipeline = [
+            {"$match": {"created_at": {"$gte": since, "$lt": until}}},
+            {
+                "$group": {
+                    "_id": {"bucket": group_key, "value": f"${path}" if path else TOTAL},
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+        async for row in consultations.aggregate(pipeline):
+            bucket = datetime.strptime(row["_id"]["bucket"], date_format)
+            counts[(bucket, dimension, row["_id"]["value"])] = row["count"]
+
+    collection = get_database()[ROLLUP_COLLECTION]
+    now = datetime.now()
+    updates = [
+        UpdateOne(
+            {"granularity": granularity, "bucket": bucket, "dimension": dimension, "value": value},
+            {"$set": {"consultation_count": count, "updated_at": now}},
+            upsert=True,
+        )
+        for (bucket, dimension, value), count in counts.items()
+        if value is not None
+    ]
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+    # Rollup trong khoảng không còn consultation tương ứng (không được ghi lại ở trên) thì xóa
+    await collection.delete_many(
+        {"granularity": granularity, "bucket": {"$gte": since, "$lt": until}, "updated_at": {"$lt": now}}
+    )
+    return len(updates)
+
+
+async def read_rollups(
+    granularity: str, since: datetime, until: datetime, top: Optional[int] = 10
+) -> Dict[str, Any]:
+    """
+    Đọc thống kê theo bucket từ collection rollup (O(số bucket × số giá trị), không quét consultations).
+    Trả về từng bucket (tổng, top chẩn đoán, phân bố mức độ) và tổng hợp cả khoảng thời gian
+    """
+    since = bucket_start(since, granularity)
+    collection = get_database()[ROLLUP_COLLECTION]
+    cursor = collection.find(
+        {"granularity": granularity, "bucket": {"$gte": since, "$lt": until}},
+        {"_id": 0, "bucket": 1, "dimension": 1, "value": 1, "consultation_count": 1},
+    )
+    buckets: Dict[datetime, Dict[str, Any]] = {}
+    totals: Dict[str, Dict[str, int]] = {dimension: defaultdict(int) for dimension in DIMENSIONS}
+    total = 0
+    async for row in cursor:
+        entry = buckets.setdefault(
+            row["bucket"], {"total": 0, **{dimension: defaultdict(int) for dimension in DIMENSIONS}}
+        )
+        if row["dimension"] == TOTAL:
+            entry["total"] += row["consultation_count"]
+            total += row["consultation_count"]
+        elif row["dimension"] in DIMENSIONS:
+            entry[row["dimension"]][row["value"]] += row["consultation_count"]
+            totals[row["dimension"]][row["value"]] += row["consultation_count"]
+
+    return {
+        "granularity": granularity,
+        "since": since,
+        "until": until,
+        "total": total,
+        "top_diagnoses": _ranked(totals["diagnosis"], top),
+        "severity_distribution": dict(totals["severity"]),
+        "buckets": [
+            {
+                "bucket": bucket,
+                "total": entry["total"],
+                "top_diagnoses": _ranked(entry["diagnosis"], top),
+                "severity_distribution": dict(entry["severity"]),
+            }
+            for bucket, entry in sorted(buckets.items())
+        ],
+    }
+
+
+def _ranked(counts: Dict[str, int], top: Optional[int]) -> List[Dict[str, Any]]:
+    ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    if top:
+        ranked = ranked[:top]
+    return [{"name": name, "count": count} for name, count in ranked]
@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breaker_state = metrics.gauge(
+    "circuit_breaker_state", "Trạng thái circuit breaker (0=closed, 1=half_open, 2=open)"
+)
+breaker_rejections = metrics.counter(
+    "circuit_breaker_rejections_total", "Số lời gọi bị từ chối ngay do circuit breaker đang mở"
+)
+breaker_transitions = metrics.counter(
+    "circuit_breaker_transitions_total", "Số lần circuit breaker chuyển trạng thái"
+)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker theo cửa sổ lời gọi gần nhất: mở khi tỉ lệ lỗi hoặc tỉ lệ lời gọi chậm vượt ngưỡng,
+    sau thời gian chờ chuyển sang half-open và cho một số lời gọi thử đi qua
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int = 20,
+        min_calls: int = 5,
+        error_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 20.0,
+        slow_call_rate_threshold: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        # Mỗi phần tử: (thành công, chậm)
+        self._calls = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_inflight = 0
+        self._lock = threading.Lock()
+        breaker_state.set(_STATE_VALUES[CLOSED], name=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow(self) -> bool:
+        """Kiểm tra lời gọi có được phép đi qua không (half-open chỉ cho số lượng giới hạn)"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_inflight < self.half_open_max_calls:
+                self._half_open_inflight += 1
+                return True
+            breaker_rejections.inc(name=self.name)
+            return False
+
+    def record_success(self, latency: float):
+        with self._lock:
+            slow = latency >= self.slow_call_seconds
+            if self._state == HALF_OPEN:
+                self._half_open_inflight = max(0, self._half_open_inflight - 1)
+                if slow:
+                    self._transition(OPEN)
+                else:
+                    self._transition(CLOSED)
+                return
+            self._calls.append((True, slow))
+            self._evaluate()
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._half_open_inflight = max(0, self._half_open_inflight - 1)
+                self._transition(OPEN)
+                return
+            self._calls.append((False, False))
+            self._evaluate()
+
+    def record_cancelled(self):
+        """Lời gọi bị hủy (client ngắt kết nối) không tính là thành công hay lỗi"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._half_open_inflight = max(0, self._half_open_inflight - 1)
+
+    def _evaluate(self):
+        if self._state != CLOSED or len(self._calls) < self.min_calls:
+            return
+        total = len(self._calls)
+        error_rate = sum(1 for success, _ in self._calls if not success) / total
+        slow_rate = sum(1 for _, slow in self._calls if slow) / total
+        if error_rate >= self.error_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+            logger.warning(
+                f"Circuit breaker {self.name} mở: tỉ lệ lỗi {error_rate:.0%}, tỉ lệ chậm {slow_rate:.0%}"
+            )
+            self._transition(OPEN)
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+
+    def _transition(self, state: str):
+        if state == self._state:
+            return
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state in (OPEN, CLOSED):
+            self._half_open_inflight = 0
+        if state == CLOSED:
+            self._calls.clear()
+        breaker_state.set(_STATE_VALUES[state], name=self.name)
+        breaker_transitions.inc(name=self.name, to=state)
+        logger.info(f"Circuit breaker {self.name} chuyển sang {state}")
+
+    def snapshot(self) -> Dict:
+        """Trạng thái breaker cho /health"""
+        with self._lock:
+            self._maybe_half_open()
+            total = len(self._calls)
+            return {
+                "state": self._state,
+                "window_calls": total,
+                "error_rate": round(sum(1 for success, _ in self._calls if not success) / total, 4) if total else 0.0,
+                "slow_rate": round(sum(1 for _, slow in self._calls if slow) / total, 4) if total else 0.0,
+                "open_remaining_seconds": (
+                    round(max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 1)
+                    if self._state == OPEN
+                    else 0.0
+                ),
+            }
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from beanie import PydanticObjectId
+from pymongo.errors import BulkWriteError
+
+from config.config import get_settings
+from models.consultation import Consultation
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+write_buffer_pending = metrics.gauge("consultation_write_buffer_pending", "Số consultation đang chờ ghi xuống MongoDB")
+write_batch_size = metrics.histogram("consultation_write_batch_size", "Số consultation trong mỗi lần insert_many")
+write_flush_latency = metrics.histogram("consultation_write_flush_seconds", "Thời gian một lần flush buffer")
+write_flushes = metrics.counter(
+    "consultation_write_flushes_total", "Số lần flush buffer theo lý do (size/interval/shutdown) và kết quả"
+)
+direct_writes = metrics.counter(
+    "consultation_direct_writes_total", "Số consultation ghi trực tiếp (buffer tắt hoặc đã đầy)"
+)
+
+
+class ConsultationWriteBuffer:
+    """
+    Ghi consultation kiểu write-behind: gán trước ObjectId, trả về ngay và gom nhiều consultation
+    vào một insert_many khi đủ batch hoặc hết khoảng thời gian flush.
+    Consultation chờ ghi được append vào spill file để phát lại khi khởi động lại sau sự cố
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 50,
+        flush_interval_seconds: float = 1.0,
+        max_pending: int = 10000,
+        spill_path: Optional[str] = None,
+        fsync: bool = False,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending = max_pending
+        self.spill_path = spill_path
+        self.fsync = fsync
+        self._pending: Dict[str, Consultation] = {}
+        self._flush_requested = asyncio.Event()
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+        self._spill_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        replayed = await asyncio.to_thread(self._read_spill)
+        if replayed:
+            logger.info(f"Phát lại {len(replayed)} consultation từ spill file {self.spill_path}")
+            for consultation in replayed:
+                self._pending[str(consultation.id)] = consultation
+            await self.flush(reason="replay")
+        self._task = asyncio.create_task(self._run(), name="consultation-write-buffer")
+
+    async def stop(self):
+        """Dừng vòng flush và ghi nốt các consultation còn lại (graceful shutdown)"""
+        if self._task is not None:
+            # Đánh thức vòng flush để nó tự thoát: hủy task ngay lúc wait_for vừa nhận event
+            # có thể bị nuốt (Python < 3.12), khiến stop phải chờ thêm cả flush_interval_seconds
+            self._stopping = True
+            self._flush_requested.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._pending:
+            if not await self.flush(reason="shutdown"):
+                logger.error(
+                    f"Không ghi được {len(self._pending)} consultation khi dừng, giữ lại trong spill file"
+                )
+                break
+
+    async def add(self, consultation: Consultation) -> bool:
+        """
+        Đưa consultation vào buffer, trả về False nếu buffer đầy (caller ghi trực tiếp).
+        Khi có spill file, chỉ trả về sau khi consultation đã được append xuống đĩa
+        """
+        if len(self._pending) >= self.max_pending:
+            return False
+        if consultation.id is None:
+            consultation.id = PydanticObjectId()
+        self._pending[str(consultation.id)] = consultation
+        write_buffer_pending.set(len(self._pending))
+        if self.spill_path:
+            await asyncio.to_thread(self._append_spill, consultation.model_dump_json())
+        if len(self._pending) >= self.batch_size:
+            self._flush_requested.set()
+        return True
+
+    def get(self, consultation_id: str) -> Optional[Consultation]:
+        """Consultation đang chờ ghi (chưa có trong MongoDB)"""
+        return self._pending.get(consultation_id)
+
+    async def flush(self, reason: str = "interval") -> bool:
+        """Ghi một batch xuống MongoDB bằng insert_many, trả về False nếu lỗi (batch được giữ lại để thử lại)"""
+        async with self._flush_lock:
+            batch = list(self._pending.values())[: self.batch_size]
+            if not batch:
+                return True
+            started = time.perf_counter()
+            try:
+                await Consultation.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Consultation đã được ghi trước khi process dừng (phát lại spill file) thì bỏ qua
+                other_errors = [
+                    error for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY_ERROR
+                ]
+                if other_errors:
+                    logger.error(f"Lỗi ghi batch consultation: {other_errors[0].get('errmsg')}")
+                    write_flushes.inc(reason=reason, outcome="error")
+                    return False
+            except Exception as e:
+                logger.error(f"Lỗi ghi batch consultation: {e}")
+                write_flushes.inc(reason=reason, outcome="error")
+                return False
+            write_flush_latency.observe(time.perf_counter() - started)
+            write_batch_size.observe(len(batch))
+            write_flushes.inc(reason=reason, outcome="ok")
+            for consultation in batch:
+                self._pending.pop(str(consultation.id), None)
+            write_buffer_pending.set(len(self._pending))
+            if self.spill_path:
+                await asyncio.to_thread(self._rewrite_spill)
+            return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval_seconds)
+                reason = "size"
+            except asyncio.TimeoutError:
+                reason = "interval"
+            self._flush_requested.clear()
+            if self._stopping:
+                return
+            # Flush liên tục khi còn đủ batch, lỗi thì chờ lượt sau
+            while self._pending:
+                if not await self.flush(reason=reason) or len(self._pending) < self.batch_size:
+                    break
+
+    def _append_spill(self, line: str):
+        with self._spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+                spill_file.write(line + "\n")
+                if self.fsync:
+                    spill_file.flush()
+                    os.fsync(spill_file.fileno())
+
+    def _rewrite_spill(self):
+        """Thay spill file bằng danh sách consultation còn chờ ghi (ghi file tạm rồi đổi tên)"""
+        with self._spill_lock:
+            # Lấy danh sách khi đã giữ lock: consultation được add sau đó sẽ append vào file mới,
+            # consultation add trước đó đã có trong danh sách (dòng trùng được gộp khi đọc lại)
+            remaining = list(self._pending.values())
+            if not remaining:
+                open(self.spill_path, "w").close()
+                return
+            temp_path = f"{self.spill_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as spill_file:
+                for consultation in remaining:
+                    spill_file.write(consultation.model_dump_json() + "\n")
+                if self.fsync:
+                    spill_file.flush()
+                    os.fsync(spill_file.fileno())
+            os.replace(temp_path, self.spill_path)
+
+    def _read_spill(self) -> List[Consultation]:
+        if not self.spill_path:
+            return []
+        directory = os.path.dirname(self.spill_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.spill_path):
+            return []
+        consultations: Dict[str, Consultation] = {}
+        with open(self.spill_path, encoding="utf-8") as spill_file:
+            for line in spill_file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    consultation = Consultation.model_validate_json(line)
+                except Exception as e:
+                    # Dòng cuối có thể bị ghi dở khi process dừng đột ngột
+                    logger.warning(f"Bỏ qua dòng spill file không hợp lệ: {e}")
+                    continue
+                consultations[str(consultation.id)] = consultation
+        return list(consultations.values())
+
+
+_writer: Optional[ConsultationWriteBuffer] = None
+
+
+def get_consultation_writer() -> Optional[ConsultationWriteBuffer]:
+    """Lấy buffer ghi consultation, None nếu chế độ write-behind chưa bật"""
+    return _writer
+
+
+async def start_consultation_writer() -> Optional[ConsultationWriteBuffer]:
+    """Khởi động buffer (phát lại spill file) khi CONSULTATION_WRITE_BEHIND_ENABLED bật, gọi lúc startup"""
+    global _writer
+    settings = get_settings()
+    if not settings.CONSULTATION_WRITE_BEHIND_ENABLED or _writer is not None:
+        return _writer
+    _writer = ConsultationWriteBuffer(
+        batch_size=settings.CONSULTATION_WRITE_BATCH_SIZE,
+        flush_interval_seconds=settings.CONSULTATION_WRITE_FLUSH_INTERVAL_SECONDS,
+        max_pending=settings.CONSULTATION_WRITE_MAX_PENDING,
+        spill_path=settings.CONSULTATION_WRITE_SPILL_PATH,
+        fsync=settings.CONSULTATION_WRITE_SPILL_FSYNC,
+    )
+    await _writer.start()
+    return _writer
+
+
+async def stop_consultation_writer():
+    """Flush các consultation còn lại khi ứng dụng tắt"""
+    global _writer
+    if _writer is not None:
+        await _writer.stop()
+        _writer = None
+
+
+async def persist_consultation(consultation: Consultation):
+    """Lưu consultation: qua buffer write-behind nếu đang bật, ngược lại insert trực tiếp"""
+    writer = get_consultation_writer()
+    if writer and await writer.add(consultation):
+        return
+    direct_writes.inc()
+    await consultation.create()
+
+
+async def find_consultation(consultation_id: str) -> Optional[Consultation]:
+    """Tìm consultation theo ID, ưu tiên consultation đang chờ ghi trong buffer"""
+    writer = get_consultation_writer()
+    pending = writer.get(consultation_id) if writer else None
+    if pending is not None:
+        return pending
+    return await Consultation.get(consultation_id)
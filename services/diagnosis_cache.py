@@ -0,0 +1,150 @@
+import copy
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config.config import get_settings, on_settings_reload
+from utils.metrics import metrics
+
+cache_requests = metrics.counter(
+    "diagnosis_cache_requests_total", "Số lượt tra cứu cache chẩn đoán theo tầng và kết quả"
+)
+cache_evictions = metrics.counter(
+    "diagnosis_cache_evictions_total", "Số entry bị loại khỏi cache chẩn đoán"
+)
+cache_size = metrics.gauge("diagnosis_cache_entries", "Số entry hiện có trong cache chẩn đoán")
+
+_PUNCTUATION = re.compile(r"[^\w\s]", flags=re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+_GENDER_ALIASES = {
+    "nam": "male",
+    "male": "male",
+    "m": "male",
+    "trai": "male",
+    "nu": "female",
+    "female": "female",
+    "f": "female",
+    "gai": "female",
+}
+
+
+def normalize_symptoms(symptoms: str) -> str:
+    """Chuẩn hóa triệu chứng: chữ thường, bỏ dấu tiếng Việt, bỏ dấu câu, gộp khoảng trắng"""
+    text = unicodedata.normalize("NFD", symptoms.lower())
+    text = "".join(char for char in text if unicodedata.category(char) != "Mn")
+    text = text.replace("đ", "d")
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def age_bucket(patient_age: Optional[int]) -> str:
+    """Nhóm tuổi dùng cho khóa cache"""
+    if not patient_age:
+        return "unknown"
+    if patient_age < 2:
+        return "0-1"
+    if patient_age < 12:
+        return "2-11"
+    if patient_age < 18:
+        return "12-17"
+    if patient_age < 40:
+        return "18-39"
+    if patient_age < 60:
+        return "40-59"
+    return "60+"
+
+
+def normalize_gender(patient_gender: Optional[str]) -> str:
+    """Chuẩn hóa giới tính về male/female/unknown"""
+    if not patient_gender:
+        return "unknown"
+    return _GENDER_ALIASES.get(normalize_symptoms(patient_gender), "unknown")
+
+
+def diagnosis_cache_key(
+    symptoms: str,
+    patient_age: Optional[int] = None,
+    patient_gender: Optional[str] = None,
+    profile: Optional[str] = None,
+) -> str:
+    """Tạo khóa cache từ triệu chứng đã chuẩn hóa, nhóm tuổi, giới tính và profile chẩn đoán"""
+    parts = [normalize_symptoms(symptoms), age_bucket(patient_age), normalize_gender(patient_gender)]
+    if profile:
+        parts.append(profile)
+    return "|".join(parts)
+
+
+class DiagnosisCache:
+    """Cache chẩn đoán khớp chính xác, có TTL và giới hạn số entry (LRU)"""
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Dict]:
+        """
+        Lấy kết quả AI đã cache, trả về bản sao để caller có thể chỉnh sửa.
+        allow_stale=True cho phép dùng entry đã hết hạn (khi LLM không khả dụng)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                cache_requests.inc(tier="exact", result="miss")
+                return None
+            if entry["expires_at"] < time.monotonic() and not allow_stale:
+                # Entry hết hạn được giữ lại đến khi bị LRU loại, để dùng khi LLM gặp sự cố
+                cache_requests.inc(tier="exact", result="expired")
+                return None
+            self._entries.move_to_end(key)
+            stale = entry["expires_at"] < time.monotonic()
+        cache_requests.inc(tier="exact", result="stale_hit" if stale else "hit")
+        return copy.deepcopy(entry["result"])
+
+    def set(self, key: str, result: Dict):
+        """Lưu kết quả AI vào cache"""
+        with self._lock:
+            self._entries[key] = {
+                "result": copy.deepcopy(result),
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                cache_evictions.inc(reason="size")
+            cache_size.set(len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            cache_size.set(0)
+
+
+_cache: Optional[DiagnosisCache] = None
+
+
+def get_diagnosis_cache() -> Optional[DiagnosisCache]:
+    """Lấy cache chẩn đoán dùng chung, trả về None nếu cache bị tắt"""
+    global _cache
+    settings = get_settings()
+    if not settings.DIAGNOSIS_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = DiagnosisCache(
+            ttl_seconds=settings.DIAGNOSIS_CACHE_TTL_SECONDS,
+            max_entries=settings.DIAGNOSIS_CACHE_MAX_ENTRIES,
+        )
+    return _cache
+
+
+@on_settings_reload
+def _apply_reloaded_settings(settings):
+    # Giảm max_entries có hiệu lực từ lần ghi kế tiếp (entry thừa bị đẩy ra theo LRU)
+    if _cache is not None:
+        _cache.ttl_seconds = settings.DIAGNOSIS_CACHE_TTL_SECONDS
+        _cache.max_entries = settings.DIAGNOSIS_CACHE_MAX_ENTRIES
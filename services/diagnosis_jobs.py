@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config.config import get_settings
+from database.database import create_consultation
+from schemas.consultation import ConsultationRequest
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+job_queue_depth = metrics.gauge("diagnosis_job_queue_depth", "Số job chẩn đoán đang chờ trong hàng đợi")
+job_wait = metrics.histogram("diagnosis_job_wait_seconds", "Thời gian job chờ trong hàng đợi trước khi chạy")
+job_run = metrics.histogram("diagnosis_job_run_seconds", "Thời gian chạy một job chẩn đoán")
+job_workers_busy = metrics.gauge("diagnosis_job_workers_busy", "Số worker đang xử lý job")
+job_worker_utilization = metrics.gauge(
+    "diagnosis_job_worker_utilization", "Tỉ lệ worker đang bận (0-1)"
+)
+jobs_total = metrics.counter("diagnosis_jobs_total", "Số job chẩn đoán theo trạng thái cuối (kể cả bị từ chối)")
+
+
+class QueueFullError(Exception):
+    """Hàng đợi job đã đầy, client cần thử lại sau"""
+
+
+@dataclass
+class DiagnosisJob:
+    """Một yêu cầu chẩn đoán chạy nền"""
+
+    id: str
+    request: ConsultationRequest
+    status: str = QUEUED
+    created_at: datetime = field(default_factory=datetime.now)
+    enqueued_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def transition(self, status: str):
+        self.status = status
+        if self.finished:
+            self.finished_at = time.monotonic()
+        # Đánh thức các client đang long-poll/SSE rồi tạo event mới cho lần đổi trạng thái sau
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """Chờ job đổi trạng thái, trả về False nếu hết thời gian"""
+        if self.finished:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.shield(self._changed.wait()), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "error": self.error,
+        }
+
+
+class DiagnosisJobQueue:
+    """
+    Hàng đợi job chẩn đoán có giới hạn với pool worker trong process.
+    Request trả về job id ngay, worker chạy chẩn đoán và lưu consultation ở nền
+    """
+
+    def __init__(self, workers: int = 4, max_queue_size: int = 100, result_ttl_seconds: int = 600):
+        self.workers = workers
+        self.result_ttl_seconds = result_ttl_seconds
+        self._queue: "asyncio.Queue[DiagnosisJob]" = asyncio.Queue(maxsize=max_queue_size)
+        self._jobs: "OrderedDict[str, DiagnosisJob]" = OrderedDict()
+        self._worker_tasks: List[asyncio.Task] = []
+        self._busy = 0
+
+    def start(self):
+        for index in range(self.workers):
+            self._worker_tasks.append(
+                asyncio.create_task(self._worker(), name=f"diagnosis-job-worker-{index}")
+            )
+        logger.info(f"Khởi động {self.workers} worker cho job chẩn đoán")
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks.clear()
+
+    def submit(self, request: ConsultationRequest) -> DiagnosisJob:
+        """Đưa request vào hàng đợi, raise QueueFullError khi hàng đợi đầy"""
+        self._evict_expired()
+        job = DiagnosisJob(id=uuid.uuid4().hex, request=request)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            jobs_total.inc(status="rejected")
+            raise QueueFullError("Hàng đợi chẩn đoán đã đầy")
+        self._jobs[job.id] = job
+        job_queue_depth.set(self._queue.qsize())
+        return job
+
+    def get(self, job_id: str) -> Optional[DiagnosisJob]:
+        return self._jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job_queue_depth.set(self._queue.qsize())
+            job_wait.observe(time.monotonic() - job.enqueued_at)
+            self._set_busy(1)
+            job.transition(RUNNING)
+            started = time.perf_counter()
+            try:
+                job.result = await create_consultation(job.request)
+                job.transition(SUCCEEDED)
+            except asyncio.CancelledError:
+                job.error = "Job bị hủy khi dừng ứng dụng"
+                job.transition(FAILED)
+                raise
+            except Exception as e:
+                logger.error(f"Job chẩn đoán {job.id} lỗi: {e}")
+                job.error = str(e)
+                job.transition(FAILED)
+            finally:
+                job_run.observe(time.perf_counter() - started)
+                jobs_total.inc(status=job.status)
+                self._set_busy(-1)
+                self._queue.task_done()
+
+    def _set_busy(self, delta: int):
+        self._busy += delta
+        job_workers_busy.set(self._busy)
+        job_worker_utilization.set(self._busy / self.workers if self.workers else 0.0)
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job.finished and now - job.finished_at > self.result_ttl_seconds:
+                del self._jobs[job_id]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "busy": self._busy,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_size": self._queue.maxsize,
+            "tracked_jobs": len(self._jobs),
+        }
+
+
+_job_queue: Optional[DiagnosisJobQueue] = None
+
+
+def get_diagnosis_job_queue() -> Optional[DiagnosisJobQueue]:
+    """Lấy hàng đợi job chẩn đoán, None nếu chế độ job chưa bật"""
+    return _job_queue
+
+
+def start_diagnosis_job_queue() -> Optional[DiagnosisJobQueue]:
+    """Khởi động hàng đợi job khi DIAGNOSIS_JOBS_ENABLED bật (gọi lúc startup)"""
+    global _job_queue
+    settings = get_settings()
+    if not settings.DIAGNOSIS_JOBS_ENABLED or _job_queue is not None:
+        return _job_queue
+    _job_queue = DiagnosisJobQueue(
+        workers=settings.DIAGNOSIS_JOB_WORKERS,
+        max_queue_size=settings.DIAGNOSIS_JOB_QUEUE_SIZE,
+        result_ttl_seconds=settings.DIAGNOSIS_JOB_RESULT_TTL_SECONDS,
+    )
+    _job_queue.start()
+    return _job_queue
+
+
+async def stop_diagnosis_job_queue():
+    """Dừng các worker khi ứng dụng tắt"""
+    global _job_queue
+    if _job_queue is not None:
+        await _job_queue.stop()
+        _job_queue = None
@@ -0,0 +1,57 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from config.config import get_settings
+
+
+@dataclass(frozen=True)
+class DiagnosisProfile:
+    """Cấu hình ngân sách token cho prompt chẩn đoán"""
+
+    name: str
+    max_tokens: int
+    description_words: str
+    alternative_description_words: str
+    reason_words: str
+    advice_words: str
+    action_words: str
+    verbose_prompt: bool = False  # Dùng prompt đầy đủ (hướng dẫn phân tích chi tiết)
+
+
+PROFILES: Dict[str, DiagnosisProfile] = {
+    "fast": DiagnosisProfile(
+        name="fast",
+        max_tokens=1500,
+        description_words="tối đa 25 từ",
+        alternative_description_words="tối đa 15 từ",
+        reason_words="tối đa 10 từ",
+        advice_words="tối đa 12 từ",
+        action_words="tối đa 12 từ",
+    ),
+    "standard": DiagnosisProfile(
+        name="standard",
+        max_tokens=2500,
+        description_words="khoảng 30-40 từ",
+        alternative_description_words="khoảng 20-30 từ",
+        reason_words="khoảng 10-15 từ",
+        advice_words="khoảng 15-20 từ",
+        action_words="khoảng 15-20 từ",
+    ),
+    "detailed": DiagnosisProfile(
+        name="detailed",
+        max_tokens=5000,
+        description_words="ít nhất 50-80 từ",
+        alternative_description_words="ít nhất 40-60 từ",
+        reason_words="ít nhất 15-20 từ",
+        advice_words="ít nhất 20-30 từ",
+        action_words="ít nhất 25-35 từ",
+        verbose_prompt=True,
+    ),
+}
+
+
+def get_profile(name: Optional[str] = None) -> DiagnosisProfile:
+    """Lấy profile theo tên, mặc định theo DIAGNOSIS_DEFAULT_PROFILE"""
+    if name and name in PROFILES:
+        return PROFILES[name]
+    return PROFILES.get(get_settings().DIAGNOSIS_DEFAULT_PROFILE, PROFILES["detailed"])
@@ -0,0 +1,163 @@
+import json
+import logging
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+class ThinkTagFilter:
+    """Loại bỏ phần <think>...</think> khỏi luồng text ngay khi nhận, kể cả khi tag bị cắt giữa các chunk"""
+
+    def __init__(self):
+        self._in_think = False
+        self._pending = ""
+        self.think_chars = 0
+
+    def feed(self, chunk: str) -> str:
+        """Nhận thêm một chunk, trả về phần text hiển thị được (ngoài think)"""
+        text = self._pending + chunk
+        self._pending = ""
+        visible = []
+        while text:
+            tag = THINK_CLOSE if self._in_think else THINK_OPEN
+            index = text.find(tag)
+            if index == -1:
+                # Giữ lại phần đuôi có thể là tiền tố của tag
+                keep = self._partial_tag_length(text, tag)
+                body, self._pending = text[: len(text) - keep], text[len(text) - keep :]
+                if self._in_think:
+                    self.think_chars += len(body)
+                else:
+                    visible.append(body)
+                break
+            if self._in_think:
+                self.think_chars += index
+            else:
+                visible.append(text[:index])
+            text = text[index + len(tag) :]
+            self._in_think = not self._in_think
+        return "".join(visible)
+
+    def flush(self) -> str:
+        """Trả về phần text còn giữ lại khi luồng kết thúc"""
+        pending, self._pending = self._pending, ""
+        return "" if self._in_think else pending
+
+    @staticmethod
+    def _partial_tag_length(text: str, tag: str) -> int:
+        for size in range(min(len(tag) - 1, len(text)), 0, -1):
+            if tag.startswith(text[-size:]):
+                return size
+        return 0
+
+
+class IncrementalJSONParser:
+    """Parse object JSON cấp cao nhất theo từng phần, trả về từng field ngay khi field đó hoàn chỉnh"""
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = 0
+        self.completed = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Nhận thêm text, trả về danh sách (key, value) của các field vừa hoàn chỉnh"""
+        fields: List[Tuple[str, Any]] = []
+        if self.completed:
+            return fields
+        self._buffer += chunk
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if not self._started:
+                # Bỏ qua mọi thứ trước dấu { đầu tiên (markdown, text thừa)
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._member_start = self._pos + 1
+                self._pos += 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    field = self._parse_member(buffer[self._member_start : self._pos])
+                    if field:
+                        fields.append(field)
+                    self.completed = True
+                    self._pos += 1
+                    break
+            elif char == "," and self._depth == 1:
+                field = self._parse_member(buffer[self._member_start : self._pos])
+                if field:
+                    fields.append(field)
+                self._member_start = self._pos + 1
+            self._pos += 1
+        return fields
+
+    @staticmethod
+    def _parse_member(member: str) -> Optional[Tuple[str, Any]]:
+        member = member.strip()
+        if not member:
+            return None
+        try:
+            parsed = json.loads("{" + member + "}")
+        except ValueError:
+            return None
+        return next(iter(parsed.items()), None)
+
+
+async def stream_diagnosis_events(
+    groq_service, consultation_request
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Chạy chẩn đoán streaming và sinh các event (tên, dữ liệu):
+    "status" khi mô hình bắt đầu suy nghĩ, "field" cho từng field JSON hoàn chỉnh,
+    cuối cùng là "result" với (kết quả đã parse, is_fallback)
+    """
+    think_filter = ThinkTagFilter()
+    json_parser = IncrementalJSONParser()
+    visible_parts = []
+    thinking_reported = False
+    try:
+        async for chunk in groq_service.stream_diagnosis(
+            symptoms=consultation_request.symptoms,
+            patient_age=consultation_request.patient_age,
+            patient_gender=consultation_request.patient_gender,
+            profile=consultation_request.profile,
+        ):
+            visible = think_filter.feed(chunk)
+            if think_filter.think_chars and not thinking_reported:
+                thinking_reported = True
+                yield "status", {"stage": "thinking"}
+            if not visible:
+                continue
+            visible_parts.append(visible)
+            for field, value in json_parser.feed(visible):
+                yield "field", {"field": field, "value": value}
+        visible_parts.append(think_filter.flush())
+        response_text = "".join(visible_parts)
+        if response_text.strip():
+            yield "result", groq_service._parse_ai_response(response_text)
+        else:
+            yield "result", (groq_service._get_fallback_response(), True)
+    except Exception as e:
+        logger.error(f"Lỗi khi streaming chẩn đoán: {e}")
+        yield "result", (groq_service._get_fallback_response(), True)
@@ -1,28 +1,22 @@
 import logging
+import threading
 from typing import Any, Dict, List, Optional
 
-import cohere
-from pymilvus import (
-    Collection,
-    CollectionSchema,
-    DataType,
-    FieldSchema,
-    connections,
-    utility,
-)
-
-from config.config import Settings
+from config.config import get_settings
 
 logger = logging.getLogger(__name__)
 
 
 class EmbeddingService:
     def __init__(self):
-        self.settings = Settings()
         self.cohere_client = None
         self.milvus_collection = None
+        self._collection_loaded = False
         if self.settings.COHERE_API_KEY:
             try:
+                # SDK Cohere/pymilvus import khá nặng (~1s) nên chỉ import khi thực sự khởi tạo service
+                import cohere
+
                 self.cohere_client = cohere.ClientV2(self.settings.COHERE_API_KEY)
                 logger.info("Khởi tạo Cohere client thành công")
             except Exception as e:
@@ -31,9 +25,15 @@ class EmbeddingService:
             logger.warning("Không tìm thấy COHERE_API_KEY trong config")
         self._init_milvus_connection()
 
+    @property
+    def settings(self):
+        return get_settings()
+
     def _init_milvus_connection(self):
         """Khởi tạo kết nối Milvus/Zilliz Cloud"""
         try:
+            from pymilvus import connections
+
             if self.settings.MILVUS_URI and self.settings.MILVUS_TOKEN:
                 connections.connect(
                     alias="default",
@@ -50,6 +50,8 @@ class EmbeddingService:
     def _create_collection_if_not_exists(self):
         """Tạo collection nếu chưa tồn tại"""
         try:
+            from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
             collection_name = self.settings.MILVUS_COLLECTION_NAME
             if utility.has_collection(collection_name):
                 self.milvus_collection = Collection(collection_name)
@@ -101,15 +103,20 @@ class EmbeddingService:
             logger.info(f"Tạo collection {collection_name} thành công!")
         except Exception as e:
             logger.error(f"Lỗi khi tạo collection: {e}")
-            
+
+    def load_collection(self):
+        """Load collection vào bộ nhớ Milvus một lần cho mỗi process thay vì trước mỗi lần query/search"""
+        if not self._collection_loaded:
+            self.milvus_collection.load()
+            self._collection_loaded = True
+
     def check_medicine_embedding_exists(self, medicine_id: str) -> Dict[str, Any]:
         """Kiểm tra xem embedding của thuốc có tồn tại không"""
         try:
             if not self.milvus_collection:
                 logger.error("Collection Milvus chưa được khởi tạo")
                 return {"exists": False, "error": "Collection không khả dụng"}
-            # Load collection
-            self.milvus_collection.load()
+            self.load_collection()
             # Query để tìm thuốc
             search_results = self.milvus_collection.query(
                 expr=f'medicine_id == "{medicine_id}"',
@@ -136,8 +143,7 @@ class EmbeddingService:
             if not self.milvus_collection:
                 logger.error("Collection Milvus chưa được khởi tạo")
                 return False
-            # Load collection để thực hiện delete
-            self.milvus_collection.load()
+            self.load_collection()
             # Kiểm tra xem thuốc có tồn tại trong vector database không
             search_results = self.milvus_collection.query(
                 expr=f'medicine_id == "{medicine_id}"',
@@ -224,6 +230,30 @@ class EmbeddingService:
             logger.error(f"Lỗi khi tạo embedding: {e}")
             return None
 
+    def generate_embeddings(
+        self, texts: List[str], input_type: str = "search_document", batch_size: int = 96
+    ) -> List[Optional[List[float]]]:
+        """Tạo embedding cho nhiều text, gọi Cohere theo lô"""
+        embeddings: List[Optional[List[float]]] = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start : start + batch_size]
+            try:
+                if not self.cohere_client:
+                    logger.error("Cohere client chưa được khởi tạo")
+                    return [None] * len(texts)
+                response = self.cohere_client.embed(
+                    texts=batch,
+                    model=self.settings.COHERE_EMBEDDING_MODEL,
+                    input_type=input_type,
+                    embedding_types=["float"],
+                    output_dimension=self.settings.EMBEDDING_DIMENSION,
+                )
+                embeddings.extend(response.embeddings.float)
+            except Exception as e:
+                logger.error(f"Lỗi khi tạo embedding theo lô: {e}")
+                embeddings.extend([None] * len(batch))
+        return embeddings
+
     def insert_medicine_embedding(self, medicine_data: Dict[str, Any]) -> bool:
         """Thêm embedding vào Milvus"""
         try:
@@ -289,12 +319,24 @@ class EmbeddingService:
             if not self.milvus_collection:
                 logger.error("Collection Milvus chưa được khởi tạo")
                 return []
-            # Load collection
-            self.milvus_collection.load()
             # Tạo embedding cho query
             query_embedding = self.generate_embedding(query_text, input_type="search_query")
             if not query_embedding:
                 return []
+            return self.search_by_embedding(query_embedding, limit)
+        except Exception as e:
+            logger.error(f"Lỗi khi tìm kiếm: {e}")
+            return []
+
+    def search_by_embedding(
+        self, query_embedding: List[float], limit: int = 10, offset: int = 0
+    ) -> List[Dict]:
+        """Tìm kiếm thuốc theo query vector có sẵn, hỗ trợ offset để phân trang"""
+        try:
+            if not self.milvus_collection:
+                logger.error("Collection Milvus chưa được khởi tạo")
+                return []
+            self.load_collection()
             # Search parameters
             search_params = {
                 "metric_type": "COSINE",
@@ -305,6 +347,7 @@ class EmbeddingService:
                 anns_field="embedding",
                 param=search_params,
                 limit=limit,
+                offset=offset,
                 output_fields=[
                     "medicine_id",
                     "name", 
@@ -353,3 +396,18 @@ class EmbeddingService:
             f"Batch insert hoàn thành: {success_count} thành công, {error_count} lỗi"
         )
         return {"success": success_count, "error": error_count}
+
+
+_embedding_service: Optional[EmbeddingService] = None
+_embedding_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Lấy EmbeddingService dùng chung (Cohere client, kết nối Milvus), khởi tạo một lần cho mỗi worker"""
+    global _embedding_service
+    if _embedding_service is None:
+        # Có thể được gọi đồng thời từ warm-up (thread) và request đầu tiên
+        with _embedding_service_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService()
+    return _embedding_service
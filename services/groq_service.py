@@ -1,70 +1,382 @@
-import json
+import asyncio
 import logging
-import re
 import time
-from typing import Dict, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-from groq import Groq
+import httpx
 
-from config.config import Settings
+from config.config import get_settings, on_settings_reload
+from services.circuit_breaker import CircuitBreaker
+from services.diagnosis_profiles import PROFILES, DiagnosisProfile, get_profile
+from services.llm_providers import GroqProvider, LLMProvider, LLMRouter, OpenAICompatibleProvider
+from services.llm_telemetry import (
+    LLMCallRecord,
+    call_latency,
+    call_tokens,
+    record_llm_call,
+    think_tokens,
+    usage_ttft,
+)
+from utils.json_repair import extract_json_object, strip_think
+from utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+parse_outcomes = metrics.counter(
+    "llm_parse_outcomes_total",
+    "Kết quả parse output LLM: complete/extracted/repaired/salvaged/unusable/no_json/empty/error",
+)
+
 
 class GroqService:
     def __init__(self):
-        self.settings = Settings()
         self.api_key = self.settings.GROQ_API_KEY
         self.model = self.settings.GROQ_MODEL
+        # Giới hạn số lời gọi LLM đồng thời để tránh dồn request lên Groq
+        self._semaphore = asyncio.Semaphore(self.settings.GROQ_MAX_CONCURRENCY)
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self.client = None
         if not self.api_key:
             logger.warning("GROQ_API_KEY không được tìm thấy")
-            self.client = None
-            return
-        try:
-            self.client = Groq(api_key=self.api_key)
-            logger.info(f"Khởi tạo Groq client thành công với mô hình: {self.model}")
-        except Exception as e:
-            logger.error(f"Lỗi khi khởi tạo Groq client: {e}")
-            self.client = None
+        else:
+            try:
+                # Import SDK khi khởi tạo (warm-up lúc startup) thay vì khi import app
+                from groq import AsyncGroq
 
-    def analyze_symptoms(
-        self, symptoms: str, patient_age: int = None, patient_gender: str = None
+                # HTTP client dùng chung với keep-alive cho toàn bộ vòng đời ứng dụng
+                self._http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.settings.GROQ_MAX_CONNECTIONS,
+                        max_keepalive_connections=self.settings.GROQ_MAX_CONNECTIONS,
+                        keepalive_expiry=self.settings.GROQ_KEEPALIVE_EXPIRY_SECONDS,
+                    ),
+                )
+                self.client = AsyncGroq(
+                    api_key=self.api_key,
+                    timeout=self.timeout,
+                    max_retries=self.settings.GROQ_MAX_RETRIES,
+                    http_client=self._http_client,
+                )
+                logger.info(f"Khởi tạo Groq client thành công với mô hình: {self.model}")
+            except Exception as e:
+                logger.error(f"Lỗi khi khởi tạo Groq client: {e}")
+                self.client = None
+        # Timeout của từng lời gọi được truyền theo request nên GROQ_TIMEOUT_SECONDS nạp lại được;
+        # giá trị lúc khởi tạo chỉ là mặc định của client
+        self.router = LLMRouter(
+            self._create_providers(),
+            hedge_enabled=self.settings.LLM_HEDGE_ENABLED,
+            hedge_min_delay=self.settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+            error_rate_threshold=self.settings.LLM_ERROR_RATE_THRESHOLD,
+            window=self.settings.LLM_STATS_WINDOW,
+            timeout=self.timeout,
+        )
+        self.breaker = CircuitBreaker(
+            "llm_diagnosis",
+            window_size=self.settings.CIRCUIT_BREAKER_WINDOW_SIZE,
+            min_calls=self.settings.CIRCUIT_BREAKER_MIN_CALLS,
+            error_rate_threshold=self.settings.CIRCUIT_BREAKER_ERROR_RATE,
+            slow_call_seconds=self.settings.CIRCUIT_BREAKER_SLOW_CALL_SECONDS,
+            slow_call_rate_threshold=self.settings.CIRCUIT_BREAKER_SLOW_CALL_RATE,
+            open_seconds=self.settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+            half_open_max_calls=self.settings.CIRCUIT_BREAKER_HALF_OPEN_CALLS,
+        )
+
+    @property
+    def settings(self):
+        return get_settings()
+
+    @property
+    def timeout(self) -> float:
+        return self.settings.GROQ_TIMEOUT_SECONDS
+
+    def apply_settings(self, settings):
+        """Áp dụng ngưỡng hedging/circuit breaker mới mà không tạo lại client và provider"""
+        self.router.hedge_enabled = settings.LLM_HEDGE_ENABLED
+        self.router.hedge_min_delay = settings.LLM_HEDGE_MIN_DELAY_SECONDS
+        self.router.error_rate_threshold = settings.LLM_ERROR_RATE_THRESHOLD
+        self.router.timeout = settings.GROQ_TIMEOUT_SECONDS
+        self.breaker.min_calls = settings.CIRCUIT_BREAKER_MIN_CALLS
+        self.breaker.error_rate_threshold = settings.CIRCUIT_BREAKER_ERROR_RATE
+        self.breaker.slow_call_seconds = settings.CIRCUIT_BREAKER_SLOW_CALL_SECONDS
+        self.breaker.slow_call_rate_threshold = settings.CIRCUIT_BREAKER_SLOW_CALL_RATE
+        self.breaker.open_seconds = settings.CIRCUIT_BREAKER_OPEN_SECONDS
+        self.breaker.half_open_max_calls = settings.CIRCUIT_BREAKER_HALF_OPEN_CALLS
+
+    def _create_providers(self) -> List[LLMProvider]:
+        """Tạo danh sách provider theo LLM_PROVIDERS, bỏ qua provider chưa cấu hình API key"""
+        providers: List[LLMProvider] = []
+        for name in [item.strip() for item in self.settings.LLM_PROVIDERS.split(",") if item.strip()]:
+            if name == "groq" and self.client:
+                providers.append(
+                    GroqProvider(
+                        self.client, self.model, reasoning_format=self.settings.GROQ_REASONING_FORMAT
+                    )
+                )
+            elif name == "gemini" and self.settings.GEMINI_API_KEY:
+                providers.append(
+                    OpenAICompatibleProvider(
+                        "gemini",
+                        self.settings.GEMINI_BASE_URL,
+                        self.settings.GEMINI_API_KEY,
+                        self.settings.GEMINI_MODEL,
+                        timeout=self.timeout,
+                    )
+                )
+            elif name == "deepseek" and self.settings.DEEPSEEK_API_KEY:
+                providers.append(
+                    OpenAICompatibleProvider(
+                        "deepseek",
+                        self.settings.DEEPSEEK_BASE_URL,
+                        self.settings.DEEPSEEK_API_KEY,
+                        self.settings.DEEPSEEK_MODEL,
+                        timeout=self.timeout,
+                    )
+                )
+        if providers:
+            logger.info(f"LLM providers: {', '.join(provider.name for provider in providers)}")
+        return providers
+
+    async def aclose(self):
+        """Đóng HTTP client khi ứng dụng dừng"""
+        await self.router.aclose()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+
+    async def analyze_symptoms(
+        self,
+        symptoms: str,
+        patient_age: int = None,
+        patient_gender: str = None,
+        profile: Optional[str] = None,
     ) -> Tuple[Dict, bool]:
         """Phân tích triệu chứng và trả về chẩn đoán"""
-        if not self.client:
+        diagnosis_profile = get_profile(profile)
+        if not self.router.providers:
+            return self._get_fallback_response(), True
+        use_breaker = self.settings.CIRCUIT_BREAKER_ENABLED
+        if use_breaker and not self.breaker.allow():
+            # Breaker đang mở: trả fallback ngay thay vì chờ timeout
             return self._get_fallback_response(), True
+        started = time.perf_counter()
         try:
-            prompt = self._create_diagnosis_prompt(
-                symptoms, patient_age, patient_gender
+            async with self._semaphore:
+                started = time.perf_counter()
+                # Router áp timeout cho từng provider và chuyển provider khác khi bị timeout
+                completion = await self.router.complete(
+                    json_mode=self.settings.LLM_JSON_MODE,
+                    **self._build_completion_params(
+                        symptoms, patient_age, patient_gender, diagnosis_profile
+                    ),
+                )
+        except asyncio.CancelledError:
+            # Client đã ngắt kết nối, hủy lời gọi LLM
+            if use_breaker:
+                self.breaker.record_cancelled()
+            logger.info("Lời gọi LLM bị hủy do client ngắt kết nối")
+            raise
+        except asyncio.TimeoutError:
+            if use_breaker:
+                self.breaker.record_failure()
+            logger.error(f"LLM API quá thời gian chờ {self.timeout}s")
+            self._record_failed_call(diagnosis_profile, started, "timeout")
+            return self._get_fallback_response(), True
+        except Exception as e:
+            if use_breaker:
+                self.breaker.record_failure()
+            logger.error(f"Lỗi khi gọi LLM API: {e}")
+            self._record_failed_call(diagnosis_profile, started, "call_error")
+            return self._get_fallback_response(), True
+        latency = time.perf_counter() - started
+        if use_breaker:
+            self.breaker.record_success(latency)
+        result, is_fallback, outcome = self._parse_with_outcome(completion.content)
+        record_llm_call(
+            LLMCallRecord(
+                model=completion.model,
+                provider=completion.provider,
+                profile=diagnosis_profile.name,
+                mode="complete",
+                latency=latency,
+                ttft=usage_ttft(completion.usage),
+                prompt_tokens=completion.usage.get("prompt_tokens") or 0,
+                completion_tokens=completion.usage.get("completion_tokens") or 0,
+                think_tokens=think_tokens(completion.usage, completion.content),
+                parse_outcome=outcome,
+                is_fallback=is_fallback,
+            ),
+            content=completion.content,
+        )
+        return result, is_fallback
+
+    async def stream_diagnosis(
+        self,
+        symptoms: str,
+        patient_age: int = None,
+        patient_gender: str = None,
+        profile: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Gọi Groq ở chế độ streaming, trả về từng đoạn nội dung thô (bao gồm cả think)"""
+        diagnosis_profile = get_profile(profile)
+        if not self.client:
+            return
+        use_breaker = self.settings.CIRCUIT_BREAKER_ENABLED
+        if use_breaker and not self.breaker.allow():
+            return
+        async with self._semaphore:
+            started = time.perf_counter()
+            first_token_at: Optional[float] = None
+            usage: Dict = {}
+            parts: List[str] = []
+            try:
+                # Groq không hỗ trợ JSON mode khi streaming, chỉ ẩn phần reasoning
+                extra = (
+                    {"reasoning_format": self.settings.GROQ_REASONING_FORMAT}
+                    if self.settings.GROQ_REASONING_FORMAT
+                    else {}
+                )
+                stream = await asyncio.wait_for(
+                    self.client.chat.completions.create(
+                        model=self.model,
+                        **self._build_completion_params(
+                            symptoms, patient_age, patient_gender, diagnosis_profile
+                        ),
+                        **extra,
+                        stream=True,
+                    ),
+                    timeout=self.timeout,
+                )
+                try:
+                    async for chunk in stream:
+                        x_groq = getattr(chunk, "x_groq", None)
+                        if x_groq is not None and x_groq.usage is not None:
+                            # Chunk cuối của Groq mang usage của cả lời gọi
+                            usage = x_groq.usage.model_dump()
+                        if not chunk.choices:
+                            continue
+                        content = chunk.choices[0].delta.content
+                        if content:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            parts.append(content)
+                            yield content
+                finally:
+                    await stream.close()
+            except (asyncio.CancelledError, GeneratorExit):
+                if use_breaker:
+                    self.breaker.record_cancelled()
+                raise
+            except asyncio.TimeoutError:
+                if use_breaker:
+                    self.breaker.record_failure()
+                # Stream gọi thẳng Groq nhưng vẫn cập nhật thống kê để router xếp hạng đúng
+                self.router.record_failure("groq", time.perf_counter() - started, result="timeout")
+                raise
+            except Exception:
+                if use_breaker:
+                    self.breaker.record_failure()
+                self.router.record_failure("groq")
+                raise
+            latency = time.perf_counter() - started
+            if use_breaker:
+                self.breaker.record_success(latency)
+            content = "".join(parts)
+            # Kết quả parse của luồng stream được đếm riêng khi diagnosis_stream parse xong
+            record_llm_call(
+                LLMCallRecord(
+                    model=self.model,
+                    provider="groq",
+                    profile=diagnosis_profile.name,
+                    mode="stream",
+                    latency=latency,
+                    ttft=first_token_at - started if first_token_at is not None else None,
+                    prompt_tokens=usage.get("prompt_tokens") or 0,
+                    completion_tokens=usage.get("completion_tokens") or 0,
+                    think_tokens=think_tokens(usage, content),
+                ),
+                content=content,
             )
-            random_seed = int(time.time() * 1000) % 10000
-            response = self.client.chat.completions.create(
+
+    def _record_failed_call(self, profile: DiagnosisProfile, started: float, outcome: str):
+        """Ghi nhận lời gọi LLM lỗi/timeout (không có response để parse)"""
+        record_llm_call(
+            LLMCallRecord(
                 model=self.model,
-                messages=[
+                provider="router",
+                profile=profile.name,
+                mode="complete",
+                latency=time.perf_counter() - started,
+                parse_outcome=outcome,
+                is_fallback=True,
+            )
+        )
+
+    def profile_report(self) -> List[Dict]:
+        """Cấu hình từng profile kèm token trung bình và độ trễ quan sát được (từ metrics llm_call_*)"""
+        report = []
+        for profile in PROFILES.values():
+            latency = call_latency.summary(profile=profile.name)
+            prompt = call_tokens.summary(profile=profile.name, kind="prompt")
+            completion = call_tokens.summary(profile=profile.name, kind="completion")
+            report.append(
+                {
+                    "name": profile.name,
+                    "max_tokens": profile.max_tokens,
+                    "verbose_prompt": profile.verbose_prompt,
+                    "is_default": profile.name == get_profile().name,
+                    "calls": latency["count"],
+                    # Token chỉ có ở lời gọi thành công nên chia theo số lần ghi nhận token
+                    "avg_prompt_tokens": round(prompt["sum"] / prompt["count"], 1) if prompt["count"] else None,
+                    "avg_completion_tokens": (
+                        round(completion["sum"] / completion["count"], 1) if completion["count"] else None
+                    ),
+                    "latency_p50": latency["p50"],
+                    "latency_p95": latency["p95"],
+                }
+            )
+        return report
+
+    def _build_completion_params(
+        self,
+        symptoms: str,
+        patient_age: int = None,
+        patient_gender: str = None,
+        profile: Optional[DiagnosisProfile] = None,
+    ) -> Dict:
+        """Tạo messages và tham số sampling cho chẩn đoán (model do provider quyết định)"""
+        profile = profile or get_profile()
+        if profile.verbose_prompt:
+            prompt = self._create_diagnosis_prompt(symptoms, patient_age, patient_gender)
+        else:
+            prompt = self._create_compact_prompt(symptoms, patient_age, patient_gender, profile)
+        if self.settings.GROQ_DETERMINISTIC:
+            # Chế độ ổn định: không chèn seed ngẫu nhiên, sampling greedy
+            return {
+                "messages": [
                     {
                         "role": "system",
-                        "content": f"""Bạn là chuyên gia y tế AI. Phân tích triệu chứng và trả về JSON tiếng Việt.
-                        Tạo phản hồi đa dạng với seed: {random_seed}""",
+                        "content": "Bạn là chuyên gia y tế AI. Phân tích triệu chứng và trả về JSON tiếng Việt.",
                     },
                     {"role": "user", "content": prompt},
                 ],
-                temperature=0.8,
-                max_tokens=5000,
-                top_p=0.9,
-            )
-            
-            # Log AI thinking và response
-            ai_response = response.choices[0].message.content
-            logger.info(f"AI thinking và response: {ai_response}")
-            
-            result, is_fallback = self._parse_ai_response(ai_response)
-            
-            # Log kết quả sau khi parse
-            logger.info(f"Kết quả sau khi parse: {json.dumps(result, ensure_ascii=False, indent=2)}")
-            return result, is_fallback
-        except Exception as e:
-            logger.error(f"Lỗi khi gọi Groq API: {e}")
-            return self._get_fallback_response(), True
+                "temperature": 0,
+                "max_tokens": profile.max_tokens,
+                "seed": self.settings.GROQ_DETERMINISTIC_SEED,
+            }
+        random_seed = int(time.time() * 1000) % 10000
+        return {
+            "messages": [
+                {
+                    "role": "system",
+                    "content": f"""Bạn là chuyên gia y tế AI. Phân tích triệu chứng và trả về JSON tiếng Việt.
+                    Tạo phản hồi đa dạng với seed: {random_seed}""",
+                },
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": 0.8,
+            "max_tokens": profile.max_tokens,
+            "top_p": 0.9,
+        }
 
     def _create_diagnosis_prompt(
         self, symptoms: str, patient_age: int = None, patient_gender: str = None
@@ -152,72 +464,151 @@ class GroqService:
         - Chỉ trả về JSON, không thêm text khác
         """
 
+    def _create_compact_prompt(
+        self,
+        symptoms: str,
+        patient_age: int = None,
+        patient_gender: str = None,
+        profile: Optional[DiagnosisProfile] = None,
+    ) -> str:
+        """Prompt rút gọn cho profile fast/standard: chỉ giữ schema JSON và giới hạn độ dài"""
+        profile = profile or get_profile("standard")
+        patient_info = ""
+        if patient_age:
+            patient_info += f"Tuổi: {patient_age}. "
+        if patient_gender:
+            patient_info += f"Giới tính: {patient_gender}. "
+
+        return f"""Phân tích triệu chứng với vai trò bác sĩ. Triệu chứng: {symptoms}. {patient_info}
+Chỉ trả về một object JSON tiếng Việt, ngắn gọn, không giải thích thêm:
+{{"primary_diagnosis": {{"diagnosis_name": "<tên>", "confidence_percentage": <70-90>, "description": "<{profile.description_words}>", "reasons": ["<{profile.reason_words}>", "...", "..."]}},
+"alternative_diagnoses": [{{"diagnosis_name": "<tên>", "confidence_percentage": <40-70>, "description": "<{profile.alternative_description_words}>", "reasons": ["<{profile.reason_words}>", "...", "..."]}}, {{"diagnosis_name": "<tên>", "confidence_percentage": <20-50>, "description": "<{profile.alternative_description_words}>", "reasons": ["...", "...", "..."]}}],
+"general_advice": ["<{profile.advice_words}>", "...", "..."],
+"overall_severity_level": "<nhẹ/trung bình/nghiêm trọng>",
+"related_symptoms": ["<triệu chứng>", "...", "..."],
+"recommended_actions": ["<khi nào đi khám, {profile.action_words}>", "<tự chăm sóc tại nhà>", "<dấu hiệu cần cấp cứu>"]}}"""
+
     def _parse_ai_response(self, response_text: str) -> Tuple[Dict, bool]:
-        """Parse response từ AI"""
+        """Parse response từ AI, trả về (kết quả, is_fallback)"""
+        result, is_fallback, _ = self._parse_with_outcome(response_text)
+        return result, is_fallback
+
+    def _parse_with_outcome(self, response_text: str) -> Tuple[Dict, bool, str]:
+        """
+        Parse response từ AI. Output bị cắt hoặc lẫn text thừa được sửa lại; field nào
+        hoàn chỉnh thì giữ, chỉ field bị thiếu mới dùng giá trị mặc định.
+        Trả về (kết quả, is_fallback, loại kết quả parse)
+        """
+        outcome = "error"
         try:
-            # Làm sạch response
-            cleaned_response = response_text.strip()
-            # Xử lý think tags
-            if "<think>" in cleaned_response and "</think>" in cleaned_response:
-                parts = cleaned_response.split("</think>")
-                cleaned_response = (
-                    parts[-1].strip()
-                    if len(parts) > 1
-                    else re.sub(
-                        r"<think>.*?</think>", "", cleaned_response, flags=re.DOTALL
-                    ).strip()
-                )
-            # Xử lý markdown
-            if cleaned_response.startswith("```json"):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith("```"):
-                cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip()
-            # Parse JSON
-            result = json.loads(cleaned_response)
-            # Validate cấu trúc cơ bản
-            required_fields = [
-                "primary_diagnosis",
-                "alternative_diagnoses",
-                "general_advice",
-                "overall_severity_level",
-                "related_symptoms",
-                "recommended_actions",
-            ]
-            for field in required_fields:
-                if field not in result:
-                    raise ValueError(f"Missing field: {field}")
-            # Đảm bảo có đủ 2 alternative diagnoses
-            if len(result["alternative_diagnoses"]) < 2:
-                result["alternative_diagnoses"].extend(
-                    [
-                        {
-                            "diagnosis_name": "Cần thêm thông tin",
-                            "confidence_percentage": 30,
-                            "description": "Cần thêm triệu chứng để chẩn đoán",
-                            "reasons": [
-                                "Triệu chứng chưa rõ",
-                                "Cần gặp bác sĩ",
-                                "Theo dõi thêm",
-                            ],
-                        }
-                    ]
-                    * (2 - len(result["alternative_diagnoses"]))
-                )
-            # Đảm bảo các list có ít nhất 3 items
-            self._ensure_min_items(
-                result, "general_advice", ["Nghỉ ngơi", "Uống nước", "Theo dõi"]
-            )
-            self._ensure_min_items(
-                result, "related_symptoms", ["Mệt mỏi", "Khó chịu", "Lo lắng"]
-            )
-            self._ensure_min_items(
-                result, "recommended_actions", ["Gặp bác sĩ", "Theo dõi", "Nghỉ ngơi"]
-            )
-            return result, False
+            if not response_text or not response_text.strip():
+                outcome = "empty"
+                return self._get_fallback_response(), True, outcome
+            parsed, status = extract_json_object(strip_think(response_text))
+            if not isinstance(parsed, dict):
+                outcome = "no_json"
+                logger.error("Không tìm thấy JSON trong response AI")
+                return self._get_fallback_response(), True, outcome
+            result, missing = self._complete_diagnosis(parsed)
+            if "primary_diagnosis" in missing:
+                # Không có chẩn đoán chính thì phần còn lại không đủ dùng
+                outcome = "unusable"
+                logger.error("Response AI thiếu chẩn đoán chính")
+                return self._get_fallback_response(), True, outcome
+            outcome = "salvaged" if missing else status
+            if missing:
+                logger.warning(f"Response AI thiếu field {', '.join(missing)}, dùng giá trị mặc định")
+            return result, False, outcome
         except Exception as e:
             logger.error(f"Lỗi parse response: {e}")
-            return self._get_fallback_response(), True
+            return self._get_fallback_response(), True, outcome
+        finally:
+            parse_outcomes.inc(outcome=outcome)
+
+    def _complete_diagnosis(self, parsed: Dict) -> Tuple[Dict, List[str]]:
+        """Giữ các field hợp lệ, bổ sung field thiếu bằng giá trị mặc định; trả về (kết quả, field bị thiếu)"""
+        fallback = self._get_fallback_response()
+        missing: List[str] = []
+        result: Dict = {}
+
+        primary = self._valid_diagnosis(parsed.get("primary_diagnosis"))
+        if primary is None:
+            missing.append("primary_diagnosis")
+            primary = fallback["primary_diagnosis"]
+        result["primary_diagnosis"] = primary
+
+        alternatives = parsed.get("alternative_diagnoses")
+        if not isinstance(alternatives, list):
+            missing.append("alternative_diagnoses")
+            alternatives = []
+        alternatives = [
+            diagnosis
+            for diagnosis in (self._valid_diagnosis(item) for item in alternatives)
+            if diagnosis is not None
+        ]
+        # Đảm bảo có đủ 2 alternative diagnoses
+        if len(alternatives) < 2:
+            alternatives.extend(
+                [
+                    {
+                        "diagnosis_name": "Cần thêm thông tin",
+                        "confidence_percentage": 30,
+                        "description": "Cần thêm triệu chứng để chẩn đoán",
+                        "reasons": [
+                            "Triệu chứng chưa rõ",
+                            "Cần gặp bác sĩ",
+                            "Theo dõi thêm",
+                        ],
+                    }
+                    for _ in range(2 - len(alternatives))
+                ]
+            )
+        result["alternative_diagnoses"] = alternatives
+
+        severity = parsed.get("overall_severity_level")
+        if not isinstance(severity, str) or not severity.strip():
+            missing.append("overall_severity_level")
+            severity = fallback["overall_severity_level"]
+        result["overall_severity_level"] = severity
+
+        for key, defaults in (
+            ("general_advice", ["Nghỉ ngơi", "Uống nước", "Theo dõi"]),
+            ("related_symptoms", ["Mệt mỏi", "Khó chịu", "Lo lắng"]),
+            ("recommended_actions", ["Gặp bác sĩ", "Theo dõi", "Nghỉ ngơi"]),
+        ):
+            items = parsed.get(key)
+            if not isinstance(items, list):
+                missing.append(key)
+                items = []
+            result[key] = [item for item in items if isinstance(item, str) and item.strip()]
+            # Đảm bảo các list có ít nhất 3 items
+            self._ensure_min_items(result, key, defaults)
+        return result, missing
+
+    @staticmethod
+    def _valid_diagnosis(diagnosis: object) -> Optional[Dict]:
+        """Chuẩn hóa một chẩn đoán; trả về None nếu không có tên chẩn đoán"""
+        if not isinstance(diagnosis, dict):
+            return None
+        name = diagnosis.get("diagnosis_name")
+        if not isinstance(name, str) or not name.strip():
+            return None
+        confidence = diagnosis.get("confidence_percentage")
+        if isinstance(confidence, str):
+            confidence = confidence.strip().rstrip("%")
+        try:
+            confidence = float(confidence)
+        except (TypeError, ValueError):
+            confidence = 50
+        description = diagnosis.get("description")
+        reasons = diagnosis.get("reasons")
+        reasons = [reason for reason in reasons if isinstance(reason, str)] if isinstance(reasons, list) else []
+        return {
+            "diagnosis_name": name,
+            "confidence_percentage": confidence,
+            "description": description if isinstance(description, str) else "",
+            "reasons": reasons or ["Cần thêm thông tin", "Khuyến khích gặp bác sĩ", "Theo dõi thêm"],
+        }
 
     def _ensure_min_items(
         self, result: Dict, key: str, defaults: list, min_count: int = 3
@@ -266,3 +657,28 @@ class GroqService:
                 "Nghỉ ngơi và tránh hoạt động nặng",
             ],
         }
+
+
+_groq_service: Optional[GroqService] = None
+
+
+def get_groq_service() -> GroqService:
+    """Lấy GroqService dùng chung, khởi tạo một lần khi ứng dụng khởi động"""
+    global _groq_service
+    if _groq_service is None:
+        _groq_service = GroqService()
+    return _groq_service
+
+
+@on_settings_reload
+def _apply_reloaded_settings(settings):
+    if _groq_service is not None:
+        _groq_service.apply_settings(settings)
+
+
+async def close_groq_service():
+    """Giải phóng GroqService dùng chung"""
+    global _groq_service
+    if _groq_service is not None:
+        await _groq_service.aclose()
+        _groq_service = None
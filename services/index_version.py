@@ -0,0 +1,76 @@
+import logging
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from config.config import get_database, get_settings
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+index_version_gauge = metrics.gauge("medicine_index_version", "Phiên bản hiện tại của chỉ mục thuốc")
+
+COUNTERS_COLLECTION = "counters"
+INDEX_VERSION_ID = "medicine_index_version"
+
+
+class MemoryIndexVersion:
+    """Phiên bản chỉ mục trong process (chỉ đúng khi chạy một worker)"""
+
+    def __init__(self):
+        self._version = 0
+
+    async def get(self) -> int:
+        return self._version
+
+    async def bump(self) -> int:
+        self._version += 1
+        return self._version
+
+
+class MongoIndexVersion:
+    """Phiên bản chỉ mục lưu trong MongoDB, dùng chung giữa các worker/instance"""
+
+    async def get(self) -> int:
+        document = await get_database()[COUNTERS_COLLECTION].find_one({"_id": INDEX_VERSION_ID})
+        return document["value"] if document else 0
+
+    async def bump(self) -> int:
+        document = await get_database()[COUNTERS_COLLECTION].find_one_and_update(
+            {"_id": INDEX_VERSION_ID},
+            {"$inc": {"value": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return document["value"]
+
+
+_backend: Optional[object] = None
+
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        backend = get_settings().get_result_cache_backend()
+        _backend = MongoIndexVersion() if backend == "mongo" else MemoryIndexVersion()
+    return _backend
+
+
+async def get_index_version() -> int:
+    """Phiên bản chỉ mục thuốc, thay đổi mỗi khi thuốc được embedding lại, cập nhật hoặc xóa"""
+    return await _get_backend().get()
+
+
+async def bump_index_version() -> Optional[int]:
+    """
+    Tăng phiên bản chỉ mục để ETag/kết quả đã cache theo phiên bản cũ không còn khớp.
+    Gọi sau khi embedding, cập nhật hoặc xóa thuốc thành công
+    """
+    try:
+        version = await _get_backend().bump()
+    except Exception as e:
+        # Không làm hỏng thao tác embedding/xóa; kết quả cache cũ vẫn hết hạn theo TTL
+        logger.error(f"Lỗi khi tăng phiên bản chỉ mục thuốc: {e}")
+        return None
+    index_version_gauge.set(version)
+    return version
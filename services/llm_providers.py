@@ -0,0 +1,341 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+provider_latency = metrics.histogram(
+    "llm_provider_latency_seconds", "Độ trễ hoàn thành của từng LLM provider"
+)
+provider_requests = metrics.counter(
+    "llm_provider_requests_total", "Số lời gọi LLM theo provider và kết quả"
+)
+hedged_requests = metrics.counter(
+    "llm_hedged_requests_total", "Số request được gửi thêm bản hedge, theo provider thắng"
+)
+
+
+@dataclass
+class LLMCompletion:
+    """Kết quả hoàn thành từ một LLM provider"""
+
+    content: str
+    provider: str
+    model: str
+    latency: float
+    usage: Dict[str, int] = field(default_factory=dict)
+    raw: object = None
+
+
+def _failed_generation(body: object) -> Optional[str]:
+    if not isinstance(body, dict):
+        return None
+    error = body.get("error", body)
+    if isinstance(error, dict) and error.get("code") == "json_validate_failed":
+        return error.get("failed_generation")
+    return None
+
+
+class LLMProvider:
+    """Giao diện chung cho các backend chat completion"""
+
+    name = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def structured_output_params(self) -> Dict:
+        """Tham số bật chế độ JSON/structured output của provider (rỗng nếu không hỗ trợ)"""
+        return {}
+
+    async def complete(self, messages: List[Dict], json_mode: bool = False, **params) -> LLMCompletion:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class GroqProvider(LLMProvider):
+    """Provider dùng Groq SDK (AsyncGroq)"""
+
+    name = "groq"
+
+    def __init__(self, client, model: str, reasoning_format: Optional[str] = None):
+        super().__init__(model)
+        self.client = client
+        self.reasoning_format = reasoning_format
+
+    def structured_output_params(self) -> Dict:
+        params = {"response_format": {"type": "json_object"}}
+        if self.reasoning_format:
+            # Ẩn phần <think> của mô hình reasoning ngay từ phía Groq
+            params["reasoning_format"] = self.reasoning_format
+        return params
+
+    async def complete(self, messages: List[Dict], json_mode: bool = False, **params) -> LLMCompletion:
+        # SDK groq đã được import khi tạo client, ở đây chỉ là tra cứu sys.modules
+        from groq import BadRequestError
+
+        started = time.perf_counter()
+        if json_mode:
+            params = {**self.structured_output_params(), **params}
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model, messages=messages, **params
+            )
+        except BadRequestError as e:
+            # JSON mode trả 400 khi output không hợp lệ (thường do bị cắt ở max_tokens);
+            # giữ lại phần đã sinh để parser sửa thay vì bỏ đi
+            failed_generation = _failed_generation(e.body)
+            if failed_generation is None:
+                raise
+            return LLMCompletion(
+                content=failed_generation,
+                provider=self.name,
+                model=self.model,
+                latency=time.perf_counter() - started,
+            )
+        usage = response.usage.model_dump() if getattr(response, "usage", None) else {}
+        return LLMCompletion(
+            content=response.choices[0].message.content or "",
+            provider=self.name,
+            model=self.model,
+            latency=time.perf_counter() - started,
+            usage=usage,
+            raw=response,
+        )
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Provider cho các API tương thích OpenAI (Gemini, DeepSeek, server giả lập local)"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        api_key: str,
+        model: str,
+        timeout: float = 30.0,
+        max_connections: int = 20,
+    ):
+        super().__init__(model)
+        self.name = name
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections, max_keepalive_connections=max_connections
+            ),
+        )
+
+    def structured_output_params(self) -> Dict:
+        return {"response_format": {"type": "json_object"}}
+
+    async def complete(self, messages: List[Dict], json_mode: bool = False, **params) -> LLMCompletion:
+        started = time.perf_counter()
+        if json_mode:
+            params = {**self.structured_output_params(), **params}
+        response = await self._client.post(
+            "/chat/completions",
+            json={"model": self.model, "messages": messages, **params},
+        )
+        response.raise_for_status()
+        payload = response.json()
+        return LLMCompletion(
+            content=payload["choices"][0]["message"].get("content") or "",
+            provider=self.name,
+            model=payload.get("model", self.model),
+            latency=time.perf_counter() - started,
+            usage=payload.get("usage") or {},
+            raw=payload,
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class ProviderStats:
+    """Thống kê độ trễ và tỉ lệ lỗi trong cửa sổ gần nhất của một provider"""
+
+    def __init__(self, window: int = 100):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+    def record(self, success: bool, latency: Optional[float] = None):
+        # Lỗi nhanh (kết nối, 4xx/5xx) không có latency; timeout được ghi với thời gian đã chờ
+        self.outcomes.append(success)
+        if latency is not None:
+            self.latencies.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+
+class LLMRouter:
+    """
+    Chọn provider nhanh nhất còn khỏe cho mỗi request dựa trên p50 độ trễ và tỉ lệ lỗi.
+    Có thể hedge: sau khoảng thời gian p95 của provider chính, gửi thêm request tới provider
+    thứ hai và lấy kết quả về trước. Mỗi lời gọi provider có timeout riêng để provider bị treo
+    được tính là lỗi và request chuyển sang provider khác
+    """
+
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        hedge_enabled: bool = False,
+        hedge_min_delay: float = 1.0,
+        error_rate_threshold: float = 0.5,
+        min_samples: int = 5,
+        window: int = 100,
+        timeout: Optional[float] = None,
+    ):
+        self.providers = providers
+        self.timeout = timeout
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.stats = {provider.name: ProviderStats(window) for provider in providers}
+
+    def is_healthy(self, provider: LLMProvider) -> bool:
+        stats = self.stats[provider.name]
+        if len(stats.outcomes) < self.min_samples:
+            return True
+        return stats.error_rate < self.error_rate_threshold
+
+    def ranked_providers(self) -> List[LLMProvider]:
+        """Sắp xếp provider: khỏe trước, sau đó theo p50 độ trễ (chưa có số liệu thì xếp sau provider đã đo)"""
+
+        def sort_key(indexed):
+            index, provider = indexed
+            p50 = self.stats[provider.name].percentile(0.5)
+            return (not self.is_healthy(provider), p50 is None, p50 or 0.0, index)
+
+        return [provider for _, provider in sorted(enumerate(self.providers), key=sort_key)]
+
+    async def complete(self, messages: List[Dict], **params) -> LLMCompletion:
+        """Gọi provider tốt nhất, tự chuyển sang provider tiếp theo khi lỗi"""
+        ranked = self.ranked_providers()
+        if not ranked:
+            raise RuntimeError("Không có LLM provider nào được cấu hình")
+        last_error: Optional[Exception] = None
+        index = 0
+        while index < len(ranked):
+            primary = ranked[index]
+            secondary = ranked[index + 1] if index + 1 < len(ranked) else None
+            try:
+                if self.hedge_enabled and secondary is not None:
+                    return await self._hedged(primary, secondary, messages, params)
+                return await self._call(primary, messages, params)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                last_error = e
+                logger.warning(f"LLM provider {primary.name} lỗi, chuyển provider khác: {e!r}")
+                # Khi hedge thì cả hai provider đã được thử
+                index += 2 if self.hedge_enabled and secondary is not None else 1
+        raise last_error
+
+    async def _call(self, provider: LLMProvider, messages: List[Dict], params: Dict) -> LLMCompletion:
+        started = time.perf_counter()
+        try:
+            completion = await asyncio.wait_for(provider.complete(messages, **params), self.timeout)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.record_failure(provider.name, time.perf_counter() - started, result="timeout")
+            raise
+        except Exception:
+            self.record_failure(provider.name)
+            raise
+        latency = time.perf_counter() - started
+        self.stats[provider.name].record(True, latency)
+        provider_latency.observe(latency, provider=provider.name)
+        provider_requests.inc(provider=provider.name, result="success")
+        return completion
+
+    async def _hedged(
+        self, primary: LLMProvider, secondary: LLMProvider, messages: List[Dict], params: Dict
+    ) -> LLMCompletion:
+        started = {}
+        primary_task = asyncio.ensure_future(self._call(primary, messages, params))
+        started[primary_task] = (primary, time.perf_counter())
+        tasks = {primary_task}
+        try:
+            delay = max(self.hedge_min_delay, self.stats[primary.name].percentile(0.95) or 0.0)
+            done, tasks = await asyncio.wait(tasks, timeout=delay)
+            last_error: Optional[BaseException] = None
+            if done:
+                # Kết quả (thành công hoặc lỗi) của provider chính đã được ghi nhận trong _call
+                if primary_task.exception() is None:
+                    return primary_task.result()
+                last_error = primary_task.exception()
+                logger.warning(f"LLM provider {primary.name} lỗi trước khi hedge, gọi {secondary.name}: {last_error!r}")
+            secondary_task = asyncio.ensure_future(self._call(secondary, messages, params))
+            started[secondary_task] = (secondary, time.perf_counter())
+            tasks.add(secondary_task)
+            while tasks:
+                finished, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    if task.exception() is None:
+                        completion = task.result()
+                        hedged_requests.inc(winner=completion.provider)
+                        return completion
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            # Có kết quả, hết provider hoặc request bị hủy (client ngắt kết nối, single-flight không còn ai chờ):
+            # hủy mọi lời gọi còn chạy để không trả tiền cho request không ai dùng
+            for task, (provider, task_started) in started.items():
+                if task.done():
+                    if not task.cancelled():
+                        task.exception()  # Đánh dấu đã đọc lỗi của lời gọi thua (đã ghi nhận trong _call)
+                    continue
+                task.cancel()
+                self._record_cancelled(provider.name, time.perf_counter() - task_started)
+
+    def _record_cancelled(self, provider_name: str, elapsed: float):
+        """Lời gọi bị hủy không tính là lỗi; thời gian đã chờ là cận dưới độ trễ của provider"""
+        self.stats[provider_name].latencies.append(elapsed)
+        provider_requests.inc(provider=provider_name, result="cancelled")
+
+    def record_failure(self, provider_name: str, latency: Optional[float] = None, result: str = "error"):
+        """Ghi nhận lời gọi lỗi (latency chỉ có khi timeout) của provider, kể cả lời gọi stream ngoài router"""
+        if provider_name in self.stats:
+            self.stats[provider_name].record(False, latency)
+        provider_requests.inc(provider=provider_name, result=result)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Trạng thái từng provider (dùng cho /health và debug)"""
+        return {
+            provider.name: {
+                "model": provider.model,
+                "healthy": self.is_healthy(provider),
+                "p50": self.stats[provider.name].percentile(0.5),
+                "p95": self.stats[provider.name].percentile(0.95),
+                "error_rate": round(self.stats[provider.name].error_rate, 4),
+                "samples": len(self.stats[provider.name].outcomes),
+            }
+            for provider in self.providers
+        }
+
+    async def aclose(self):
+        for provider in self.providers:
+            await provider.aclose()
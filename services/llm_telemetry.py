@@ -0,0 +1,114 @@
+import logging
+import random
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from config.config import get_settings
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 1500, 2000, 3000, 4000, 5000, 8000)
+
+call_latency = metrics.histogram(
+    "llm_call_latency_seconds", "Tổng độ trễ mỗi lời gọi LLM chẩn đoán theo model, chế độ và profile"
+)
+time_to_first_token = metrics.histogram(
+    "llm_time_to_first_token_seconds", "Thời gian đến token đầu tiên theo model"
+)
+call_tokens = metrics.histogram(
+    "llm_call_tokens",
+    "Số token mỗi lời gọi theo model, profile và loại (prompt/completion/think)",
+    buckets=TOKEN_BUCKETS,
+)
+calls_total = metrics.counter(
+    "llm_calls_total", "Số lời gọi LLM chẩn đoán theo model, kết quả parse và fallback"
+)
+cost_total = metrics.counter("llm_cost_usd_total", "Chi phí ước tính (USD) theo model")
+
+
+@dataclass
+class LLMCallRecord:
+    """Số liệu của một lời gọi LLM chẩn đoán"""
+
+    model: str
+    provider: str
+    profile: str
+    mode: str  # complete hoặc stream
+    latency: float
+    ttft: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    think_tokens: int = 0
+    parse_outcome: Optional[str] = None
+    is_fallback: bool = False
+
+    @property
+    def cost(self) -> Optional[float]:
+        """Chi phí ước tính theo bảng giá LLM_PRICE_PER_MILLION_TOKENS, None nếu model chưa có giá"""
+        price = get_settings().LLM_PRICE_PER_MILLION_TOKENS.get(self.model)
+        if not price:
+            return None
+        input_price, output_price = price
+        return (self.prompt_tokens * input_price + self.completion_tokens * output_price) / 1_000_000
+
+
+def usage_ttft(usage: Dict) -> Optional[float]:
+    """Ước tính TTFT từ usage của Groq (thời gian chờ hàng đợi + xử lý prompt) khi không streaming"""
+    if usage.get("prompt_time") is None:
+        return None
+    return (usage.get("queue_time") or 0.0) + usage["prompt_time"]
+
+
+def think_tokens(usage: Dict, content: str) -> int:
+    """
+    Số token dùng cho phần suy luận: lấy từ usage nếu provider trả về (reasoning_tokens),
+    nếu không thì ước tính theo tỉ lệ độ dài khối <think> trong nội dung
+    """
+    details = usage.get("completion_tokens_details") or {}
+    if details.get("reasoning_tokens"):
+        return details["reasoning_tokens"]
+    completion_tokens = usage.get("completion_tokens") or 0
+    if not completion_tokens or not content or "<think>" not in content:
+        return 0
+    start = content.find("<think>")
+    end = content.find("</think>")
+    think_chars = (end if end != -1 else len(content)) - start
+    return round(completion_tokens * think_chars / len(content))
+
+
+def record_llm_call(record: LLMCallRecord, content: Optional[str] = None):
+    """Xuất metrics cho lời gọi LLM và ghi log rút gọn theo tỉ lệ lấy mẫu"""
+    settings = get_settings()
+    call_latency.observe(record.latency, model=record.model, mode=record.mode, profile=record.profile)
+    if record.ttft is not None:
+        time_to_first_token.observe(record.ttft, model=record.model)
+    for kind in ("prompt", "completion", "think"):
+        tokens = getattr(record, f"{kind}_tokens")
+        if tokens:
+            call_tokens.observe(tokens, model=record.model, kind=kind, profile=record.profile)
+    calls_total.inc(
+        model=record.model,
+        outcome=record.parse_outcome or "unparsed",
+        fallback=str(record.is_fallback).lower(),
+    )
+    cost = record.cost
+    if cost is not None:
+        cost_total.inc(cost, model=record.model)
+
+    # Lời gọi phải dùng fallback luôn được log, còn lại lấy mẫu để tránh tốn chi phí log
+    if record.is_fallback or random.random() < settings.LLM_LOG_SAMPLE_RATE:
+        ttft = f"{record.ttft:.2f}s" if record.ttft is not None else "-"
+        log = logger.warning if record.is_fallback else logger.info
+        log(
+            f"llm_call provider={record.provider} model={record.model} profile={record.profile} "
+            f"mode={record.mode} latency={record.latency:.2f}s ttft={ttft} "
+            f"tokens={record.prompt_tokens}/{record.completion_tokens}/{record.think_tokens} "
+            f"outcome={record.parse_outcome or '-'} fallback={record.is_fallback}"
+        )
+    if (
+        content is not None
+        and logger.isEnabledFor(logging.DEBUG)
+        and random.random() < settings.LLM_DEBUG_RESPONSE_SAMPLE_RATE
+    ):
+        logger.debug(f"llm_response provider={record.provider} model={record.model}: {content}")
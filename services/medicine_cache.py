@@ -0,0 +1,153 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from config.config import get_settings, on_settings_reload
+from services.medicine_fields import select_fields, serialize_document
+from utils.http_response import dumps
+from utils.metrics import metrics
+
+cache_requests = metrics.counter(
+    "medicine_cache_requests_total", "Số lượt tra cứu cache document thuốc theo kết quả (hit/miss/expired)"
+)
+cache_evictions = metrics.counter("medicine_cache_evictions_total", "Số entry bị loại khỏi cache thuốc theo lý do")
+cache_entries = metrics.gauge("medicine_cache_entries", "Số document thuốc đang cache")
+cache_bytes = metrics.gauge("medicine_cache_bytes", "Dung lượng ước tính của cache thuốc (byte JSON)")
+
+
+class MedicineCache:
+    """
+    Cache read-through các document thuốc đã serialize theo _id, giới hạn theo TTL, số entry và dung lượng.
+    Đọc nhiều id một lần: id nào chưa có mới truy vấn MongoDB bằng $in
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 5000, max_bytes: int = 64 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        # Tăng mỗi lần invalidate để bỏ kết quả đọc từ MongoDB bắt đầu trước khi invalidate
+        self._generation = 0
+
+    async def get_many(self, collection, medicine_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Lấy document theo danh sách id, chỉ đọc MongoDB cho các id chưa có trong cache"""
+        found: Dict[str, Dict[str, Any]] = {}
+        misses: List[str] = []
+        now = time.monotonic()
+        for medicine_id in dict.fromkeys(medicine_ids):
+            entry = self._entries.get(medicine_id)
+            if entry is None:
+                cache_requests.inc(result="miss")
+                misses.append(medicine_id)
+            elif entry["expires_at"] < now:
+                cache_requests.inc(result="expired")
+                self._remove(medicine_id)
+                misses.append(medicine_id)
+            else:
+                cache_requests.inc(result="hit")
+                self._entries.move_to_end(medicine_id)
+                found[medicine_id] = entry["document"]
+        if misses:
+            generation = self._generation
+            async for medicine_doc in collection.find({"_id": {"$in": misses}}):
+                document = serialize_document(medicine_doc)
+                found[document["id"]] = document
+                if generation == self._generation:
+                    self._store(document["id"], document)
+        return found
+
+    def invalidate(self, medicine_id: str):
+        """Xóa document khỏi cache khi thuốc được cập nhật/embedding lại/xóa"""
+        self._generation += 1
+        if medicine_id in self._entries:
+            self._remove(medicine_id)
+            cache_evictions.inc(reason="invalidated")
+            self._update_gauges()
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._bytes = 0
+        self._update_gauges()
+
+    def _store(self, medicine_id: str, document: Dict[str, Any]):
+        size = len(dumps(document))
+        if size > self.max_bytes:
+            return
+        if medicine_id in self._entries:
+            self._remove(medicine_id)
+        self._entries[medicine_id] = {
+            "document": document,
+            "size": size,
+            "expires_at": time.monotonic() + self.ttl_seconds,
+        }
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            cache_evictions.inc(reason="size")
+        self._update_gauges()
+
+    def _remove(self, medicine_id: str):
+        entry = self._entries.pop(medicine_id)
+        self._bytes -= entry["size"]
+
+    def _update_gauges(self):
+        cache_entries.set(len(self._entries))
+        cache_bytes.set(self._bytes)
+
+
+_cache: Optional[MedicineCache] = None
+
+
+def get_medicine_cache() -> Optional[MedicineCache]:
+    """Lấy cache thuốc dùng chung, trả về None nếu cache bị tắt"""
+    global _cache
+    settings = get_settings()
+    if not settings.MEDICINE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = MedicineCache(
+            ttl_seconds=settings.MEDICINE_CACHE_TTL_SECONDS,
+            max_entries=settings.MEDICINE_CACHE_MAX_ENTRIES,
+            max_bytes=settings.MEDICINE_CACHE_MAX_BYTES,
+        )
+    return _cache
+
+
+@on_settings_reload
+def _apply_reloaded_settings(settings):
+    if _cache is not None:
+        _cache.ttl_seconds = settings.MEDICINE_CACHE_TTL_SECONDS
+        _cache.max_entries = settings.MEDICINE_CACHE_MAX_ENTRIES
+        _cache.max_bytes = settings.MEDICINE_CACHE_MAX_BYTES
+
+
+def invalidate_medicine(medicine_id: str):
+    """Bỏ document thuốc khỏi cache (nếu cache đang bật)"""
+    cache = get_medicine_cache()
+    if cache:
+        cache.invalidate(medicine_id)
+
+
+async def get_medicine_documents(
+    collection, medicine_ids: List[str], projection: Optional[Dict[str, int]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Lấy document thuốc đã serialize theo id, qua cache nếu đang bật.
+    Cache lưu cả document, projection được áp dụng trong bộ nhớ; khi tắt cache thì projection đẩy xuống MongoDB
+    """
+    cache = get_medicine_cache()
+    if cache:
+        documents = await cache.get_many(collection, medicine_ids)
+        # Bản sao nông để caller thêm field (điểm, thứ hạng) không làm bẩn cache
+        return {
+            medicine_id: dict(select_fields(document, projection))
+            for medicine_id, document in documents.items()
+        }
+    documents = {}
+    async for medicine_doc in collection.find({"_id": {"$in": medicine_ids}}, projection):
+        document = serialize_document(medicine_doc)
+        documents[document["id"]] = document
+    return documents
@@ -0,0 +1,98 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+from models.medicine import Medicine
+
+# Bộ field định sẵn cho tham số fields=
+FIELD_SETS: Dict[str, List[str]] = {
+    # Đủ để hiển thị thẻ sản phẩm: vài trăm byte thay vì cả document
+    "card": [
+        "name",
+        "slug",
+        "category_id",
+        "thumbnail.url",
+        "thumbnail.alt",
+        "variants.price",
+        "variants.original_price",
+        "variants.discount_percent",
+        "variants.stock_status",
+        "ratings.star",
+        "ratings.review_count",
+    ],
+    "summary": [
+        "name",
+        "slug",
+        "category_id",
+        "supplier_id",
+        "description",
+        "thumbnail",
+        "variants",
+        "ratings",
+    ],
+}
+
+_TOP_LEVEL_FIELDS = {field_name for field_name in Medicine.model_fields if field_name != "id"}
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """
+    Chuyển tham số fields= (tên bộ field như "card" hoặc danh sách field cách nhau bởi dấu phẩy,
+    hỗ trợ field lồng như "variants.price") thành projection MongoDB.
+    Trả về None khi không truyền fields (lấy cả document). Raise ValueError nếu có field không hợp lệ
+    """
+    if not fields or fields.strip() in ("", "full"):
+        return None
+    names: List[str] = []
+    for item in (part.strip() for part in fields.split(",")):
+        if not item:
+            continue
+        names.extend(FIELD_SETS.get(item, [item]))
+    invalid = [name for name in names if name.split(".")[0] not in _TOP_LEVEL_FIELDS]
+    if invalid:
+        raise ValueError(f"Field không hợp lệ: {', '.join(invalid)}")
+    return {name: 1 for name in names}
+
+
+def serialize_document(document: Any) -> Any:
+    """
+    Đổi _id -> id (dạng chuỗi) trong document MongoDB.
+    UUID, datetime, ObjectId ở các field khác để nguyên, response encoder tự serialize
+    """
+    if isinstance(document, dict):
+        result = {}
+        for key, value in document.items():
+            if key == "_id":
+                result["id"] = str(value)
+            else:
+                result[key] = serialize_document(value)
+        return result
+    if isinstance(document, list):
+        return [serialize_document(item) for item in document]
+    return document
+
+
+def select_fields(
+    document: Dict[str, Any], projection: Optional[Dict[str, int]], keep: Iterable[str] = ()
+) -> Dict[str, Any]:
+    """Áp dụng projection lên document đã có trong bộ nhớ (vd kết quả đề xuất tính trước)"""
+    if projection is None:
+        return document
+    selected: Dict[str, Any] = {}
+    for key in ("id", "_id", *keep):
+        if key in document:
+            selected[key] = document[key]
+    for path in projection:
+        _copy_path(document, selected, path.split("."))
+    return selected
+
+
+def _copy_path(source: Any, target: Dict[str, Any], parts: Iterable[str]):
+    parts = list(parts)
+    if not isinstance(source, dict) or parts[0] not in source:
+        return
+    head = parts[0]
+    if len(parts) == 1:
+        target[head] = source[head]
+        return
+    child = target.setdefault(head, {})
+    if isinstance(child, dict):
+        _copy_path(source[head], child, parts[1:])
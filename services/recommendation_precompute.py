@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from config.config import get_settings, on_settings_reload
+from models.consultation import Consultation
+from services.index_version import get_index_version
+from services.recommendation_service import RecommendationResult, recommend_for_consultation
+from utils.background import spawn
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+precompute_requests = metrics.counter(
+    "recommendation_precompute_requests_total",
+    "Số lượt tra cứu đề xuất tính trước theo kết quả (hit, inflight, miss, stale, error)",
+)
+precompute_wait = metrics.histogram(
+    "recommendation_precompute_wait_seconds", "Thời gian chờ task đề xuất tính trước còn đang chạy"
+)
+
+
+class RecommendationPrecompute:
+    """
+    Tính trước đề xuất thuốc ngay sau khi chẩn đoán, lưu theo consultation_id với TTL ngắn.
+    Request đề xuất đến sau dùng kết quả có sẵn hoặc chờ task đang chạy
+    """
+
+    def __init__(self, limit: int = 10, ttl_seconds: int = 300, max_entries: int = 500):
+        self.limit = limit
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def start(self, consultation: Consultation):
+        """Bắt đầu task tính đề xuất cho consultation vừa tạo"""
+        consultation_id = str(consultation.id)
+        # limit có thể đổi khi nạp lại settings: lưu limit task thực sự dùng
+        task = spawn(
+            self._compute(consultation, self.limit),
+            name=f"recommendation_precompute:{consultation_id}",
+        )
+        self._entries[consultation_id] = {
+            "task": task,
+            "limit": self.limit,
+            "expires_at": time.monotonic() + self.ttl_seconds,
+        }
+        self._entries.move_to_end(consultation_id)
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            if not evicted["task"].done():
+                evicted["task"].cancel()
+
+    @staticmethod
+    async def _compute(consultation: Consultation, limit: int) -> Tuple[RecommendationResult, int]:
+        # Đọc phiên bản chỉ mục trước khi tìm kiếm: chỉ mục đổi trong lúc tính thì kết quả bị coi là cũ
+        index_version = await get_index_version()
+        return await recommend_for_consultation(consultation, limit), index_version
+
+    async def get(self, consultation_id: str, limit: int, index_version: int) -> Optional[RecommendationResult]:
+        """
+        Lấy đề xuất đã tính trước; chờ nếu task còn chạy. None nếu không có, đã hết hạn,
+        được tính với limit nhỏ hơn hoặc theo phiên bản chỉ mục khác
+        """
+        entry = self._entries.get(consultation_id)
+        if entry is None or entry["expires_at"] < time.monotonic():
+            self._entries.pop(consultation_id, None)
+            precompute_requests.inc(result="miss")
+            return None
+        if limit > entry["limit"]:
+            precompute_requests.inc(result="miss")
+            return None
+        task: asyncio.Task = entry["task"]
+        result_label = "hit" if task.done() else "inflight"
+        started = time.perf_counter()
+        try:
+            # shield: client ngắt kết nối không được hủy task dùng chung
+            result, computed_version = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                self._entries.pop(consultation_id, None)
+                precompute_requests.inc(result="miss")
+                return None
+            raise
+        except Exception as e:
+            self._entries.pop(consultation_id, None)
+            precompute_requests.inc(result="error")
+            logger.warning(f"Đề xuất tính trước cho {consultation_id} lỗi: {e}")
+            return None
+        if result_label == "inflight":
+            precompute_wait.observe(time.perf_counter() - started)
+        if computed_version != index_version:
+            # Thuốc đã được embedding lại/cập nhật sau khi tính: ETag và kết quả theo phiên bản mới
+            self._entries.pop(consultation_id, None)
+            precompute_requests.inc(result="stale")
+            return None
+        precompute_requests.inc(result=result_label)
+        return result
+
+
+_precompute: Optional[RecommendationPrecompute] = None
+
+
+def get_recommendation_precompute() -> Optional[RecommendationPrecompute]:
+    """Lấy bộ tính trước đề xuất dùng chung, trả về None nếu tính năng bị tắt"""
+    global _precompute
+    settings = get_settings()
+    if not settings.RECOMMENDATION_PRECOMPUTE_ENABLED:
+        return None
+    if _precompute is None:
+        _precompute = RecommendationPrecompute(
+            limit=settings.RECOMMENDATION_PRECOMPUTE_LIMIT,
+            ttl_seconds=settings.RECOMMENDATION_PRECOMPUTE_TTL_SECONDS,
+            max_entries=settings.RECOMMENDATION_PRECOMPUTE_MAX_ENTRIES,
+        )
+    return _precompute
+
+
+@on_settings_reload
+def _apply_reloaded_settings(settings):
+    if _precompute is not None:
+        _precompute.limit = settings.RECOMMENDATION_PRECOMPUTE_LIMIT
+        _precompute.ttl_seconds = settings.RECOMMENDATION_PRECOMPUTE_TTL_SECONDS
+        _precompute.max_entries = settings.RECOMMENDATION_PRECOMPUTE_MAX_ENTRIES
@@ -0,0 +1,141 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from config.config import get_database
+from models.consultation import Consultation
+from services.embedding_service import get_embedding_service
+from services.medicine_cache import get_medicine_documents
+
+
+@dataclass
+class RecommendationResult:
+    """Kết quả đề xuất thuốc cho một consultation (trang đầu tiên)"""
+
+    search_query: str
+    consultation_info: Dict[str, Any]
+    query_embedding: Optional[List[float]]
+    rag_results: List[Dict]
+    medicines: List[Dict[str, Any]]
+
+
+def build_consultation_query(consultation: Consultation) -> str:
+    """Tạo query text RAG từ thông tin chẩn đoán của consultation"""
+    ai_data = consultation.ai
+    query_parts = []
+    # Thêm chẩn đoán chính
+    primary_diagnosis = ai_data.primary_diagnosis
+    query_parts.append(f"Điều trị {primary_diagnosis.diagnosis_name}")
+    query_parts.append(f"Chữa {primary_diagnosis.diagnosis_name}")
+    # Thêm triệu chứng
+    query_parts.append(f"Triệu chứng: {consultation.human.symptoms}")
+    # Thêm triệu chứng liên quan
+    if ai_data.related_symptoms:
+        query_parts.append(f"Triệu chứng liên quan: {', '.join(ai_data.related_symptoms)}")
+    # Thêm chẩn đoán thay thế
+    if ai_data.alternative_diagnoses:
+        alt_diagnoses = [diag.diagnosis_name for diag in ai_data.alternative_diagnoses[:2]]  # Chỉ lấy 2 cái đầu
+        query_parts.append(f"có thể điều trị {', '.join(alt_diagnoses)}")
+    # Tạo query text hoàn chỉnh
+    return ". ".join(query_parts)
+
+
+def build_consultation_info(consultation: Consultation) -> Dict[str, Any]:
+    """Tóm tắt thông tin chẩn đoán trả về cùng danh sách thuốc đề xuất"""
+    primary_diagnosis = consultation.ai.primary_diagnosis
+    return {
+        "primary_diagnosis": {
+            "name": primary_diagnosis.diagnosis_name,
+            "confidence": primary_diagnosis.confidence_percentage,
+            "description": primary_diagnosis.description,
+        },
+        "symptoms": consultation.human.symptoms,
+        "severity_level": consultation.ai.overall_severity_level,
+    }
+
+
+def build_similar_medicine_query(original_medicine: Dict[str, Any]) -> str:
+    """Tạo query text từ thông tin thuốc gốc để tìm sản phẩm tương tự"""
+    query_parts = []
+    # Thêm tên thuốc (để tìm thuốc cùng loại)
+    query_parts.append(f"Thuốc: {original_medicine.get('name', '')}")
+    # Thêm mô tả
+    query_parts.append(f"Mô tả: {original_medicine.get('description', '')}")
+    # Thêm thông tin chi tiết nếu có
+    if "details" in original_medicine:
+        details = original_medicine["details"]
+        if "ingredients" in details:
+            query_parts.append(f"Thành phần: {details['ingredients']}")
+        if "usage" in details and isinstance(details["usage"], list):
+            usage_text = ', '.join(details['usage'])
+            query_parts.append(f"Công dụng: {usage_text}")
+            query_parts.append(f"Điều trị: {usage_text}")
+    # Thêm danh mục để tìm thuốc cùng danh mục
+    if "category_id" in original_medicine:
+        query_parts.append(f"Danh mục: {original_medicine['category_id']}")
+    # Tạo query text hoàn chỉnh
+    return ". ".join(query_parts)
+
+
+async def hydrate_medicines(
+    collection,
+    rag_results: List[Dict],
+    ranking_field: str,
+    start_rank: int = 1,
+    projection: Optional[Dict[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Lấy thông tin thuốc cho các kết quả RAG qua cache thuốc, id chưa cache được đọc bằng một truy vấn $in
+    (không qua Beanie model để tránh chi phí validation), chỉ lấy các field trong projection nếu có
+    """
+    if not rag_results:
+        return []
+    documents = await get_medicine_documents(
+        collection, [result["medicine_id"] for result in rag_results], projection
+    )
+    detailed_medicines = []
+    # Giữ đúng thứ tự xếp hạng của RAG
+    for i, result in enumerate(rag_results):
+        medicine = documents.get(result["medicine_id"])
+        if medicine is None:
+            continue
+        # Thêm thông tin similarity score từ RAG
+        medicine["similarity_score"] = result["similarity_score"]
+        medicine[ranking_field] = start_rank + i
+        detailed_medicines.append(medicine)
+    return detailed_medicines
+
+
+async def search_medicines_by_text(query_text: str, limit: int):
+    """Embedding query và tìm kiếm vector trong thread riêng để không chặn event loop"""
+
+    def search():
+        embedding_service = get_embedding_service()
+        query_embedding = embedding_service.generate_embedding(query_text, input_type="search_query")
+        if not query_embedding:
+            return None, []
+        return query_embedding, embedding_service.search_by_embedding(query_embedding, limit)
+
+    return await asyncio.to_thread(search)
+
+
+async def recommend_for_consultation(
+    consultation: Consultation, limit: int = 10, projection: Optional[Dict[str, int]] = None
+) -> RecommendationResult:
+    """Đề xuất thuốc trực tiếp từ consultation trong bộ nhớ (không cần đọc lại từ MongoDB)"""
+    query_text = build_consultation_query(consultation)
+    query_embedding, rag_results = await search_medicines_by_text(query_text, limit)
+    medicines = (
+        await hydrate_medicines(
+            get_database()["medicines"], rag_results, "rag_ranking", projection=projection
+        )
+        if rag_results
+        else []
+    )
+    return RecommendationResult(
+        search_query=query_text,
+        consultation_info=build_consultation_info(consultation),
+        query_embedding=query_embedding,
+        rag_results=rag_results,
+        medicines=medicines,
+    )
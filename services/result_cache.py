@@ -0,0 +1,192 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import orjson
+
+from fastapi import Request, Response
+
+from config.config import get_database, get_settings, on_settings_reload
+from services.search_cursor import SearchCursorStore, encode_cursor
+from utils.compression import compress_response
+from utils.http_cache import etag_matches, not_modified, set_etag
+from utils.http_response import dumps, json
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+result_cache_requests = metrics.counter(
+    "result_cache_requests_total", "Số lượt tra cứu cache kết quả tìm kiếm theo endpoint và kết quả (hit/miss)"
+)
+result_cache_errors = metrics.counter(
+    "result_cache_errors_total", "Số lỗi backend cache kết quả theo endpoint và thao tác (get/set)"
+)
+result_cache_entries = metrics.gauge("result_cache_entries", "Số entry trong cache kết quả (backend memory)")
+result_cache_bytes = metrics.gauge("result_cache_bytes", "Dung lượng ước tính cache kết quả (backend memory)")
+
+
+class MemoryResultCacheBackend:
+    """Backend trong process: LRU giới hạn số entry và dung lượng, có TTL"""
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 1000, max_bytes: int = 32 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry["value"]
+
+    async def set(self, key: str, value: Any):
+        size = len(dumps(value))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = {"value": value, "size": size, "expires_at": time.monotonic() + self.ttl_seconds}
+        self._bytes += size
+        # Entry của phiên bản chỉ mục cũ không còn được đọc và sẽ bị đẩy ra theo LRU
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+        result_cache_entries.set(len(self._entries))
+        result_cache_bytes.set(self._bytes)
+
+    def _remove(self, key: str):
+        self._bytes -= self._entries.pop(key)["size"]
+
+
+class MongoResultCacheBackend:
+    """Backend MongoDB dùng chung giữa các worker; entry hết hạn được TTL index của MongoDB xóa"""
+
+    def __init__(self, ttl_seconds: int = 300, collection_name: str = "result_cache"):
+        self.ttl_seconds = ttl_seconds
+        self.collection_name = collection_name
+        self._index_ready = False
+
+    @property
+    def collection(self):
+        return get_database()[self.collection_name]
+
+    async def get(self, key: str) -> Optional[Any]:
+        document = await self.collection.find_one({"_id": key})
+        # TTL monitor của MongoDB chạy mỗi 60 giây nên vẫn kiểm tra hạn khi đọc
+        if document is None or document["expires_at"] < datetime.utcnow():
+            return None
+        return orjson.loads(document["value"])
+
+    async def set(self, key: str, value: Any):
+        if not self._index_ready:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self._index_ready = True
+        await self.collection.replace_one(
+            {"_id": key},
+            {"value": dumps(value), "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds)},
+            upsert=True,
+        )
+
+
+class ResultCache:
+    """
+    Cache kết quả tìm kiếm thuốc theo tham số request và phiên bản chỉ mục thuốc.
+    Khi chỉ mục thay đổi (embedding, cập nhật, xóa thuốc) phiên bản tăng nên mọi entry cũ tự động không khớp
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _key(endpoint: str, params: Dict[str, Any], index_version: int) -> str:
+        digest = hashlib.blake2b(dumps(params), digest_size=16).hexdigest()
+        return f"{endpoint}:{index_version}:{digest}"
+
+    async def get(self, endpoint: str, params: Dict[str, Any], index_version: int) -> Optional[Dict[str, Any]]:
+        try:
+            value = await self.backend.get(self._key(endpoint, params, index_version))
+        except Exception as e:
+            # Backend lỗi (MongoDB không khả dụng...) thì coi như miss, request vẫn tính kết quả bình thường
+            logger.warning(f"Lỗi khi đọc cache kết quả {endpoint}: {e}")
+            result_cache_errors.inc(endpoint=endpoint, operation="get")
+            value = None
+        result_cache_requests.inc(endpoint=endpoint, result="hit" if value is not None else "miss")
+        return value
+
+    async def set(self, endpoint: str, params: Dict[str, Any], value: Dict[str, Any], index_version: int):
+        """
+        Lưu kết quả theo phiên bản chỉ mục đã đọc trước khi tính kết quả: nếu chỉ mục đổi trong lúc tính
+        thì entry nằm ở phiên bản cũ và không bao giờ được đọc
+        """
+        try:
+            await self.backend.set(self._key(endpoint, params, index_version), value)
+        except Exception as e:
+            logger.warning(f"Lỗi khi ghi cache kết quả {endpoint}: {e}")
+            result_cache_errors.inc(endpoint=endpoint, operation="set")
+
+
+_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Lấy cache kết quả dùng chung, None nếu cache bị tắt"""
+    global _cache
+    settings = get_settings()
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        if settings.get_result_cache_backend() == "mongo":
+            backend = MongoResultCacheBackend(ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS)
+        else:
+            backend = MemoryResultCacheBackend(
+                ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+                max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+                max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+            )
+        _cache = ResultCache(backend)
+    return _cache
+
+
+@on_settings_reload
+def _apply_reloaded_settings(settings):
+    # Đổi RESULT_CACHE_BACKEND cần restart vì phiên bản chỉ mục dùng chung backend
+    if _cache is None:
+        return
+    backend = _cache.backend
+    backend.ttl_seconds = settings.RESULT_CACHE_TTL_SECONDS
+    if isinstance(backend, MemoryResultCacheBackend):
+        backend.max_entries = settings.RESULT_CACHE_MAX_ENTRIES
+        backend.max_bytes = settings.RESULT_CACHE_MAX_BYTES
+
+
+async def search_page_response(
+    request: Request,
+    endpoint: str,
+    page: Dict[str, Any],
+    cursor_store: SearchCursorStore,
+    token: Optional[str] = None,
+) -> Response:
+    """
+    Tạo response từ một trang kết quả (vừa tính hoặc lấy từ cache): 304 nếu ETag khớp,
+    gắn next_cursor (tạo lượt tìm kiếm mới từ query vector đã lưu nếu là trang đầu), nén body
+    """
+    matched_etag = etag_matches(request, page["etag"])
+    if matched_etag:
+        return not_modified(endpoint, matched_etag)
+    data = dict(page["data"])
+    if data["has_more"]:
+        if token is None:
+            token = await cursor_store.save(page["query_embedding"], page["cursor_context"])
+        if token:
+            data["next_cursor"] = encode_cursor(token, page["next_offset"])
+    response = json(data=data, message=page["message"], status=200)
+    return compress_response(request, set_etag(response, page["etag"]), endpoint)
+
@@ -0,0 +1,189 @@
+import base64
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from bson import ObjectId
+
+from config.config import get_database, get_settings, on_settings_reload
+from utils.http_response import dumps
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+search_cursor_errors = metrics.counter(
+    "search_cursor_errors_total", "Số lỗi backend lưu search cursor theo thao tác (save/get)"
+)
+
+
+class MemorySearchCursorBackend:
+    """Backend trong process (chỉ đúng khi chạy một worker): LRU giới hạn số entry, TTL gia hạn khi dùng"""
+
+    def __init__(self, ttl_seconds: int = 600, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def save(self, token: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[token] = {**entry, "expires_at": time.monotonic() + self.ttl_seconds}
+            # Loại bỏ entry cũ nhất khi vượt quá giới hạn
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry["expires_at"] < time.monotonic():
+                del self._entries[token]
+                return None
+            # Gia hạn TTL khi cursor còn được sử dụng
+            entry["expires_at"] = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end(token)
+            return entry
+
+
+class MongoSearchCursorBackend:
+    """
+    Backend MongoDB dùng chung giữa các worker: next_cursor tạo ở worker này dùng được ở worker khác.
+    Entry hết hạn được TTL index của MongoDB xóa
+    """
+
+    def __init__(self, ttl_seconds: int = 600, collection_name: str = "search_cursors"):
+        self.ttl_seconds = ttl_seconds
+        self.collection_name = collection_name
+        self._index_ready = False
+
+    @property
+    def collection(self):
+        return get_database()[self.collection_name]
+
+    async def save(self, token: str, entry: Dict[str, Any]):
+        if not self._index_ready:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self._index_ready = True
+        await self.collection.insert_one(
+            {
+                "_id": token,
+                "value": dumps(entry),
+                "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds),
+            }
+        )
+
+    async def get(self, token: str) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        # Gia hạn TTL khi cursor còn được sử dụng; TTL monitor chạy mỗi 60 giây nên vẫn kiểm tra hạn khi đọc
+        document = await self.collection.find_one_and_update(
+            {"_id": token, "expires_at": {"$gte": now}},
+            {"$set": {"expires_at": now + timedelta(seconds=self.ttl_seconds)}},
+        )
+        if document is None:
+            return None
+        return orjson.loads(document["value"])
+
+
+class SearchCursorStore:
+    """Lưu query vector của các lượt tìm kiếm để phục vụ phân trang bằng cursor"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def save(self, query_embedding: List[float], context: Dict[str, Any]) -> Optional[str]:
+        """Lưu query vector cùng context, trả về token của lượt tìm kiếm (None nếu backend lỗi)"""
+        token = uuid.uuid4().hex
+        try:
+            await self.backend.save(token, {"embedding": query_embedding, "context": context})
+        except Exception as e:
+            # Backend lỗi thì trang hiện tại vẫn được trả về, chỉ không có next_cursor
+            logger.warning(f"Lỗi khi lưu search cursor: {e}")
+            search_cursor_errors.inc(operation="save")
+            return None
+        return token
+
+    async def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Lấy entry theo token, trả về None nếu không tồn tại, đã hết hạn hoặc backend lỗi"""
+        try:
+            return await self.backend.get(token)
+        except Exception as e:
+            logger.warning(f"Lỗi khi đọc search cursor: {e}")
+            search_cursor_errors.inc(operation="get")
+            return None
+
+
+def encode_cursor(token: str, offset: int) -> str:
+    """Mã hóa token và offset thành cursor dạng opaque"""
+    raw = json.dumps({"t": token, "o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    """Giải mã cursor, trả về (token, offset) hoặc None nếu cursor không hợp lệ"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        token, offset = payload["t"], int(payload["o"])
+        if not isinstance(token, str) or offset < 0:
+            return None
+        return token, offset
+    except Exception:
+        return None
+
+
+def encode_keyset_cursor(created_at: Optional[datetime], document_id: str) -> str:
+    """
+    Mã hóa khóa (created_at, _id) của phần tử cuối trang thành cursor cho phân trang keyset.
+    created_at None (consultation cũ chưa được migrate) chỉ phân trang tiếp theo _id
+    """
+    created = created_at.isoformat() if created_at is not None else None
+    raw = json.dumps({"c": created, "i": document_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_keyset_cursor(cursor: str) -> Optional[Tuple[Optional[datetime], ObjectId]]:
+    """Giải mã cursor keyset, trả về (created_at, _id) hoặc None nếu cursor không hợp lệ"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        created_at = datetime.fromisoformat(payload["c"]) if payload["c"] is not None else None
+        return created_at, ObjectId(payload["i"])
+    except Exception:
+        return None
+
+
+_store: Optional[SearchCursorStore] = None
+
+
+def get_search_cursor_store() -> SearchCursorStore:
+    """Lấy cursor store dùng chung; dùng MongoDB khi cache kết quả dùng MongoDB (nhiều worker)"""
+    global _store
+    if _store is None:
+        settings = get_settings()
+        if settings.get_result_cache_backend() == "mongo":
+            backend = MongoSearchCursorBackend(ttl_seconds=settings.SEARCH_CURSOR_TTL_SECONDS)
+        else:
+            backend = MemorySearchCursorBackend(
+                ttl_seconds=settings.SEARCH_CURSOR_TTL_SECONDS,
+                max_entries=settings.SEARCH_CURSOR_MAX_ENTRIES,
+            )
+        _store = SearchCursorStore(backend)
+    return _store
+
+
+@on_settings_reload
+def _apply_reloaded_settings(settings):
+    # Đổi backend (RESULT_CACHE_BACKEND/WEB_CONCURRENCY) cần restart
+    if _store is None:
+        return
+    backend = _store.backend
+    backend.ttl_seconds = settings.SEARCH_CURSOR_TTL_SECONDS
+    if isinstance(backend, MemorySearchCursorBackend):
+        backend.max_entries = settings.SEARCH_CURSOR_MAX_ENTRIES
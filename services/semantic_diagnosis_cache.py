@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from config.config import get_settings
+from services.diagnosis_cache import age_bucket, cache_requests, normalize_gender, normalize_symptoms
+from services.embedding_service import EmbeddingService, get_embedding_service
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    from pymilvus import Collection
+
+logger = logging.getLogger(__name__)
+
+semantic_similarity = metrics.histogram(
+    "semantic_cache_best_similarity",
+    "Độ tương đồng cao nhất tìm được khi tra cứu cache ngữ nghĩa",
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 1.0),
+)
+
+
+class SemanticDiagnosisCache:
+    """Cache chẩn đoán theo độ tương đồng embedding của triệu chứng, lưu trong collection Milvus riêng"""
+
+    def __init__(self, embedding_service: EmbeddingService):
+        self.embedding_service = embedding_service
+        self.collection: Optional["Collection"] = None
+        self._collection_loaded = False
+        if embedding_service.milvus_collection is not None:
+            self._create_collection_if_not_exists()
+
+    @property
+    def settings(self):
+        return get_settings()
+
+    @property
+    def threshold(self) -> float:
+        return self.settings.SEMANTIC_CACHE_THRESHOLD
+
+    def _create_collection_if_not_exists(self):
+        """Tạo collection cho cache ngữ nghĩa nếu chưa tồn tại"""
+        try:
+            from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+            collection_name = self.settings.MILVUS_DIAGNOSIS_CACHE_COLLECTION
+            if utility.has_collection(collection_name):
+                self.collection = Collection(collection_name)
+                return
+            fields = [
+                FieldSchema(
+                    name="consultation_id", dtype=DataType.VARCHAR, max_length=64, is_primary=True
+                ),
+                FieldSchema(name="age_band", dtype=DataType.VARCHAR, max_length=16),
+                FieldSchema(name="gender", dtype=DataType.VARCHAR, max_length=16),
+                FieldSchema(name="created_ts", dtype=DataType.INT64),
+                FieldSchema(
+                    name="embedding",
+                    dtype=DataType.FLOAT_VECTOR,
+                    dim=self.settings.EMBEDDING_DIMENSION,
+                ),
+            ]
+            schema = CollectionSchema(fields, "Cache ngữ nghĩa cho kết quả chẩn đoán")
+            self.collection = Collection(collection_name, schema)
+            # Collection nhỏ nên dùng FLAT để tìm kiếm chính xác
+            self.collection.create_index(
+                field_name="embedding",
+                index_params={"metric_type": "COSINE", "index_type": "FLAT", "params": {}},
+            )
+            logger.info(f"Tạo collection {collection_name} thành công!")
+        except Exception as e:
+            logger.error(f"Lỗi khi tạo collection cache ngữ nghĩa: {e}")
+            self.collection = None
+
+    def load_collection(self):
+        """Load collection một lần cho mỗi process"""
+        if not self._collection_loaded:
+            self.collection.load()
+            self._collection_loaded = True
+
+    def embed_symptoms(self, symptoms: str) -> Optional[List[float]]:
+        """Tạo embedding cho triệu chứng đã chuẩn hóa"""
+        return self.embedding_service.generate_embedding(
+            normalize_symptoms(symptoms), input_type="clustering"
+        )
+
+    def lookup(
+        self,
+        symptom_embedding: List[float],
+        patient_age: Optional[int] = None,
+        patient_gender: Optional[str] = None,
+    ) -> Optional[Tuple[str, float]]:
+        """Tìm consultation đã chẩn đoán có triệu chứng tương tự, cùng nhóm tuổi và giới tính"""
+        if self.collection is None:
+            return None
+        try:
+            self.load_collection()
+            min_created_ts = int(time.time()) - self.settings.SEMANTIC_CACHE_MAX_AGE_SECONDS
+            results = self.collection.search(
+                data=[symptom_embedding],
+                anns_field="embedding",
+                param={"metric_type": "COSINE", "params": {}},
+                limit=1,
+                expr=(
+                    f'age_band == "{age_bucket(patient_age)}" '
+                    f'and gender == "{normalize_gender(patient_gender)}" '
+                    f"and created_ts >= {min_created_ts}"
+                ),
+                output_fields=["consultation_id"],
+            )
+            for hits in results:
+                for hit in hits:
+                    semantic_similarity.observe(hit.score)
+                    if hit.score >= self.threshold:
+                        cache_requests.inc(tier="semantic", result="hit")
+                        return hit.entity.get("consultation_id"), hit.score
+            cache_requests.inc(tier="semantic", result="miss")
+            return None
+        except Exception as e:
+            logger.error(f"Lỗi khi tra cứu cache ngữ nghĩa: {e}")
+            return None
+
+    def add(
+        self,
+        consultation_id: str,
+        symptom_embedding: List[float],
+        patient_age: Optional[int] = None,
+        patient_gender: Optional[str] = None,
+    ) -> bool:
+        """Thêm consultation vừa chẩn đoán vào cache ngữ nghĩa"""
+        if self.collection is None:
+            return False
+        try:
+            self.collection.insert(
+                [
+                    [consultation_id],
+                    [age_bucket(patient_age)],
+                    [normalize_gender(patient_gender)],
+                    [int(time.time())],
+                    [symptom_embedding],
+                ]
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Lỗi khi thêm vào cache ngữ nghĩa: {e}")
+            return False
+
+    async def alookup(
+        self, symptoms: str, patient_age: Optional[int] = None, patient_gender: Optional[str] = None
+    ) -> Tuple[Optional[Tuple[str, float]], Optional[List[float]]]:
+        """Tra cứu không chặn event loop, trả về (kết quả, embedding triệu chứng)"""
+        symptom_embedding = await asyncio.to_thread(self.embed_symptoms, symptoms)
+        if not symptom_embedding:
+            return None, None
+        match = await asyncio.to_thread(
+            self.lookup, symptom_embedding, patient_age, patient_gender
+        )
+        return match, symptom_embedding
+
+
+_semantic_cache: Optional[SemanticDiagnosisCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_diagnosis_cache() -> Optional[SemanticDiagnosisCache]:
+    """Lấy cache ngữ nghĩa dùng chung, trả về None nếu bị tắt hoặc Milvus không khả dụng"""
+    global _semantic_cache
+    if not get_settings().SEMANTIC_CACHE_ENABLED:
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticDiagnosisCache(get_embedding_service())
+    return _semantic_cache if _semantic_cache.collection is not None else None
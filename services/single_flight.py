@@ -0,0 +1,57 @@
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from utils.metrics import metrics
+
+singleflight_calls = metrics.counter(
+    "singleflight_calls_total", "Số lời gọi qua single-flight theo vai trò (leader/coalesced)"
+)
+singleflight_inflight = metrics.gauge(
+    "singleflight_inflight", "Số lời gọi dùng chung đang chạy"
+)
+
+
+class SingleFlight:
+    """Gộp các lời gọi đồng thời có cùng khóa thành một lời gọi duy nhất"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, Dict[str, Any]] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Chạy fn() hoặc chờ lời gọi đang chạy với cùng khóa
+
+        Args:
+            key: Khóa gộp request
+            fn: Hàm tạo coroutine thực hiện công việc
+
+        Returns:
+            (kết quả, coalesced) - coalesced=True nếu dùng chung kết quả của request khác
+        """
+        call = self._calls.get(key)
+        coalesced = call is not None
+        if call is None:
+            call = {"task": asyncio.ensure_future(fn()), "waiters": 0}
+            self._calls[key] = call
+            singleflight_inflight.set(len(self._calls), name=self.name)
+            call["task"].add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+        singleflight_calls.inc(name=self.name, role="coalesced" if coalesced else "leader")
+        call["waiters"] += 1
+        try:
+            # shield để một request bị hủy không làm hủy kết quả của các request khác
+            result = await asyncio.shield(call["task"])
+        except asyncio.CancelledError:
+            call["waiters"] -= 1
+            if call["waiters"] == 0 and not call["task"].done():
+                # Không còn ai chờ kết quả thì hủy luôn công việc
+                call["task"].cancel()
+            raise
+        call["waiters"] -= 1
+        return (copy.deepcopy(result) if coalesced else result), coalesced
+
+    def _forget(self, key: str, call: Dict[str, Any]):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        singleflight_inflight.set(len(self._calls), name=self.name)
@@ -0,0 +1,172 @@
+import asyncio
+import importlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config.config import get_settings, initiate_database
+from services.consultation_writer import start_consultation_writer
+from services.diagnosis_cache import get_diagnosis_cache
+from services.embedding_service import get_embedding_service
+from services.groq_service import get_groq_service
+from services.medicine_cache import get_medicine_cache
+from services.recommendation_precompute import get_recommendation_precompute
+from services.result_cache import get_result_cache
+from services.search_cursor import get_search_cursor_store
+from services.semantic_diagnosis_cache import get_semantic_diagnosis_cache
+from utils.background import spawn
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+startup_phase_seconds = metrics.gauge(
+    "startup_phase_seconds", "Thời gian từng bước khởi động worker (import app, mongo, embedding, llm...)"
+)
+app_ready = metrics.gauge("app_ready", "1 khi worker đã warm-up xong và sẵn sàng nhận request")
+
+
+class StartupState:
+    """Trạng thái khởi động của worker: thời gian, kết quả từng bước warm-up và cờ sẵn sàng"""
+
+    def __init__(self):
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.ready = False
+        self.ready_seconds: Optional[float] = None
+        self.pending: List[asyncio.Task] = []
+
+    def record(self, phase: str, seconds: float, status: str = "ok", error: Optional[str] = None):
+        self.phases[phase] = {"seconds": round(seconds, 4), "status": status, "error": error}
+        startup_phase_seconds.set(seconds, phase=phase)
+
+    def mark_ready(self, seconds: float):
+        self.ready = True
+        self.ready_seconds = round(seconds, 4)
+        app_ready.set(1)
+        phases = ", ".join(
+            f"{name}={phase['seconds']:.2f}s/{phase['status']}" for name, phase in self.phases.items()
+        )
+        logger.info(f"Worker sẵn sàng sau {seconds:.2f}s warm-up ({phases})")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "warmup_seconds": self.ready_seconds, "phases": dict(self.phases)}
+
+
+_state = StartupState()
+
+
+def get_startup_state() -> StartupState:
+    """Trạng thái khởi động của worker hiện tại"""
+    return _state
+
+
+def record_import_time(seconds: float):
+    """Ghi nhận thời gian import app (đo trong app.py) để theo dõi hồi quy cold start"""
+    _state.record("import", seconds)
+
+
+async def _run_phase(phase: str, warm: Callable[[], Awaitable[str]], required: bool = False) -> str:
+    """Chạy một bước warm-up và ghi nhận thời gian; lỗi ở bước không bắt buộc chỉ được log"""
+    started = time.perf_counter()
+    try:
+        status = await warm()
+    except Exception as e:
+        _state.record(phase, time.perf_counter() - started, status="error", error=str(e))
+        logger.error(f"Lỗi warm-up {phase}: {e}")
+        if required:
+            raise
+        return "error"
+    _state.record(phase, time.perf_counter() - started, status=status)
+    return status
+
+
+async def _warm_mongo() -> str:
+    if not await initiate_database():
+        return "unavailable"
+    # Phát lại consultation còn trong spill file trước khi nhận request
+    await start_consultation_writer()
+    return "ok"
+
+
+def _load_embedding() -> str:
+    # Import Cohere/pymilvus, tạo Cohere client, kết nối Milvus và load collection (I/O đồng bộ)
+    embedding_service = get_embedding_service()
+    if embedding_service.milvus_collection is None:
+        return "unavailable"
+    embedding_service.load_collection()
+    return "ok" if embedding_service.cohere_client is not None else "degraded"
+
+
+def _load_semantic_cache() -> str:
+    semantic_cache = get_semantic_diagnosis_cache()
+    if semantic_cache is None:
+        return "disabled" if not get_settings().SEMANTIC_CACHE_ENABLED else "unavailable"
+    semantic_cache.load_collection()
+    return "ok"
+
+
+async def _warm_embedding() -> str:
+    return await asyncio.to_thread(_load_embedding)
+
+
+async def _warm_semantic_cache() -> str:
+    return await asyncio.to_thread(_load_semantic_cache)
+
+
+async def _warm_llm() -> str:
+    # Import SDK trong thread để không chặn event loop, tạo client (cần event loop) sau đó
+    await asyncio.to_thread(importlib.import_module, "groq")
+    return "ok" if get_groq_service().client is not None else "unavailable"
+
+
+async def _warm_caches() -> str:
+    get_medicine_cache()
+    get_result_cache()
+    get_search_cursor_store()
+    get_diagnosis_cache()
+    get_recommendation_precompute()
+    return "ok"
+
+
+async def _warm_vector_store():
+    # Cache ngữ nghĩa dùng chung kết nối Milvus của EmbeddingService nên chạy sau
+    if await _run_phase("embedding", _warm_embedding) != "unavailable":
+        await _run_phase("semantic_cache", _warm_semantic_cache)
+
+
+async def warm_up():
+    """
+    Warm-up song song khi startup: MongoDB (bắt buộc), Cohere + Milvus, Groq client và các cache.
+    Chờ tối đa STARTUP_WARMUP_TIMEOUT_SECONDS; bước chưa xong tiếp tục chạy nền và /ready chỉ trả 200 khi xong
+    """
+    started = time.perf_counter()
+    optional = [
+        asyncio.create_task(_warm_vector_store(), name="warmup-vector-store"),
+        asyncio.create_task(_run_phase("llm", _warm_llm), name="warmup-llm"),
+        asyncio.create_task(_run_phase("caches", _warm_caches), name="warmup-caches"),
+    ]
+    mongo_status = await _run_phase("mongo", _warm_mongo, required=True)
+    remaining = get_settings().STARTUP_WARMUP_TIMEOUT_SECONDS - (time.perf_counter() - started)
+    _, pending = await asyncio.wait(optional, timeout=max(remaining, 0))
+    _state.pending = list(pending)
+    if mongo_status != "ok":
+        logger.error("MongoDB không khả dụng, worker chưa sẵn sàng nhận request")
+        return
+    if not pending:
+        _state.mark_ready(time.perf_counter() - started)
+        return
+    pending_names = ", ".join(task.get_name() for task in pending)
+    logger.warning(f"Warm-up chưa xong sau thời gian chờ, tiếp tục chạy nền: {pending_names}")
+    spawn(_finish_warm_up(pending, started), name="warmup-finish")
+
+
+async def _finish_warm_up(pending, started: float):
+    await asyncio.wait(pending)
+    _state.pending = []
+    _state.mark_ready(time.perf_counter() - started)
+
+
+def stop_warm_up():
+    """Hủy các bước warm-up còn đang chạy khi ứng dụng dừng"""
+    for task in _state.pending:
+        task.cancel()
+    _state.pending = []
@@ -0,0 +1,46 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from config.config import get_settings
+from routes import analytics
+from services.analytics_rollups import to_local_naive
+
+
+def run_analytics(monkeypatch, **params):
+    calls = []
+
+    async def fake_read_rollups(granularity, since, until, top):
+        calls.append((since, until))
+        return {}
+
+    monkeypatch.setattr(analytics, "read_rollups", fake_read_rollups)
+    response = asyncio.run(analytics.get_diagnosis_analytics(settings=get_settings(), **params))
+    return response, calls
+
+
+def test_to_local_naive():
+    naive = datetime(2026, 1, 1, 12)
+    assert to_local_naive(naive) is naive
+    aware = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    converted = to_local_naive(aware)
+    assert converted.tzinfo is None
+    assert converted == aware.astimezone().replace(tzinfo=None)
+
+
+def test_since_with_offset_and_default_until(monkeypatch):
+    since = datetime.now(timezone(timedelta(hours=7))) - timedelta(days=2)
+    response, calls = run_analytics(monkeypatch, since=since)
+    assert response.status_code == 200
+    (called_since, called_until), = calls
+    assert called_since.tzinfo is None and called_until.tzinfo is None
+    assert called_since == since.astimezone().replace(tzinfo=None)
+
+
+def test_mixed_naive_and_aware_range_is_validated(monkeypatch):
+    until = datetime(2026, 1, 1, 0, 0, tzinfo=timezone.utc)
+    since = to_local_naive(until) + timedelta(hours=1)
+    response, calls = run_analytics(monkeypatch, since=since, until=until)
+    assert response.status_code == 400
+    assert json.loads(response.body)["errors"] == "since phải nhỏ hơn until"
+    assert calls == []
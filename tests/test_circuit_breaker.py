@@ -0,0 +1,112 @@
+import pytest
+
+from services import circuit_breaker
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", fake)
+    return fake
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    options = dict(
+        window_size=10,
+        min_calls=4,
+        error_rate_threshold=0.5,
+        slow_call_seconds=5.0,
+        slow_call_rate_threshold=0.75,
+        open_seconds=30.0,
+        half_open_max_calls=1,
+    )
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_opens_on_error_rate(clock):
+    breaker = make_breaker()
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_opens_on_slow_call_rate(clock):
+    breaker = make_breaker()
+    breaker.record_success(0.1)
+    for _ in range(3):
+        breaker.record_success(6.0)
+    assert breaker.state == OPEN
+
+
+def test_half_open_after_timeout_limits_trial_calls(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 29.9
+    assert breaker.state == OPEN
+    clock.now += 0.1
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_half_open_success_closes_and_resets_window(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["window_calls"] == 0
+
+
+def test_half_open_failure_or_slow_call_reopens(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success(6.0)
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["open_remaining_seconds"] == 30.0
+
+
+def test_cancelled_trial_call_frees_half_open_slot(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_cancelled()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
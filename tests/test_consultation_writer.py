@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from beanie import init_beanie
+
+import models
+from database.database import build_consultation
+from models.consultation import Consultation
+from schemas.consultation import ConsultationRequest
+from services.consultation_writer import ConsultationWriteBuffer
+from services.groq_service import GroqService
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+async def init_db():
+    client = mongomock_motor.AsyncMongoMockClient()
+    await init_beanie(database=client["pharmacy"], document_models=models.__all__)
+
+
+def make_consultation(symptoms: str) -> Consultation:
+    ai_result = GroqService.__new__(GroqService)._get_fallback_response()
+    return build_consultation(ConsultationRequest(user_id="user", symptoms=symptoms), ai_result)
+
+
+def spill_lines(path) -> int:
+    return len([line for line in path.read_text(encoding="utf-8").splitlines() if line.strip()])
+
+
+def test_flush_writes_batch_and_truncates_spill(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+
+    async def run():
+        await init_db()
+        writer = ConsultationWriteBuffer(batch_size=3, flush_interval_seconds=60, spill_path=str(spill))
+        consultations = [make_consultation(f"s{i}") for i in range(5)]
+        for consultation in consultations:
+            assert await writer.add(consultation)
+        assert consultations[0].id is not None
+        assert writer.get(str(consultations[4].id)) is consultations[4]
+        assert spill_lines(spill) == 5
+
+        assert await writer.flush()
+        assert await Consultation.count() == 3
+        assert writer.pending_count == 2
+        assert spill_lines(spill) == 2
+
+        assert await writer.flush()
+        assert await Consultation.count() == 5
+        assert writer.pending_count == 0
+        assert spill_lines(spill) == 0
+
+    asyncio.run(run())
+
+
+def test_add_rejects_when_buffer_full():
+    async def run():
+        await init_db()
+        writer = ConsultationWriteBuffer(max_pending=1)
+        assert await writer.add(make_consultation("a"))
+        assert not await writer.add(make_consultation("b"))
+
+    asyncio.run(run())
+
+
+def test_start_replays_spill_and_skips_duplicates_and_broken_lines(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+
+    async def run():
+        await init_db()
+        crashed = ConsultationWriteBuffer(batch_size=10, spill_path=str(spill))
+        pending = make_consultation("chưa ghi")
+        already_written = make_consultation("đã ghi")
+        await crashed.add(pending)
+        await crashed.add(already_written)
+        await crashed.add(pending)
+        await already_written.create()
+        with open(spill, "a", encoding="utf-8") as spill_file:
+            spill_file.write('{"broken')
+
+        writer = ConsultationWriteBuffer(batch_size=10, flush_interval_seconds=60, spill_path=str(spill))
+        await writer.start()
+        try:
+            assert writer.pending_count == 0
+            assert await Consultation.count() == 2
+            assert await Consultation.get(pending.id) is not None
+            assert spill_lines(spill) == 0
+        finally:
+            await writer.stop()
+
+    asyncio.run(run())
+
+
+def test_stop_flushes_remaining(tmp_path):
+    async def run():
+        await init_db()
+        writer = ConsultationWriteBuffer(batch_size=2, flush_interval_seconds=60, spill_path=str(tmp_path / "s.jsonl"))
+        await writer.start()
+        for i in range(3):
+            await writer.add(make_consultation(f"s{i}"))
+        # Không phải chờ hết flush_interval_seconds khi dừng
+        await asyncio.wait_for(writer.stop(), 5)
+        assert writer.pending_count == 0
+        assert await Consultation.count() == 3
+
+    asyncio.run(run())
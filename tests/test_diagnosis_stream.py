@@ -0,0 +1,57 @@
+from services.diagnosis_stream import IncrementalJSONParser, ThinkTagFilter
+
+
+def feed_all(stream_filter, chunks):
+    return "".join(stream_filter.feed(chunk) for chunk in chunks) + stream_filter.flush()
+
+
+def test_think_filter_removes_think_block():
+    think_filter = ThinkTagFilter()
+    assert feed_all(think_filter, ["<think>suy nghĩ</think>{\"a\": 1}"]) == '{"a": 1}'
+    assert think_filter.think_chars == len("suy nghĩ")
+
+
+def test_think_filter_handles_tags_split_across_chunks():
+    think_filter = ThinkTagFilter()
+    chunks = ["trước <th", "ink>bí", " mật</th", "ink> sau"]
+    assert feed_all(think_filter, chunks) == "trước  sau"
+    assert think_filter.think_chars == len("bí mật")
+
+
+def test_think_filter_holds_back_possible_tag_prefix():
+    think_filter = ThinkTagFilter()
+    assert think_filter.feed("abc<thi") == "abc"
+    # Không phải tag thì phần giữ lại được trả ra ở chunk sau
+    assert think_filter.feed("s is text") == "<this is text"
+
+
+def test_think_filter_drops_unclosed_think_on_flush():
+    think_filter = ThinkTagFilter()
+    assert think_filter.feed("ok<think>đang nghĩ</thi") == "ok"
+    assert think_filter.flush() == ""
+
+
+def test_json_parser_emits_fields_as_they_complete():
+    parser = IncrementalJSONParser()
+    assert parser.feed('```json\n{"name": "Cảm c') == []
+    assert parser.feed('úm", "severity": "nhẹ"') == [("name", "Cảm cúm")]
+    assert parser.feed(', "tags": ["a", "b"]}') == [("severity", "nhẹ"), ("tags", ["a", "b"])]
+    assert parser.completed
+
+
+def test_json_parser_ignores_commas_and_braces_inside_strings_and_nesting():
+    parser = IncrementalJSONParser()
+    text = '{"note": "a, b} \\"c\\"", "nested": {"x": [1, 2], "y": {"z": 3}}}'
+    fields = [field for char in text for field in parser.feed(char)]
+    assert fields == [("note", 'a, b} "c"'), ("nested", {"x": [1, 2], "y": {"z": 3}})]
+
+
+def test_json_parser_stops_after_top_level_object():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": 1} {"b": 2}') == [("a", 1)]
+    assert parser.feed(', "c": 3}') == []
+
+
+def test_json_parser_skips_unparsable_member():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": nope, "b": 2}') == [("b", 2)]
@@ -0,0 +1,51 @@
+from utils.json_repair import COMPLETE, EXTRACTED, NOT_FOUND, REPAIRED, extract_json_object, strip_think
+
+
+def test_complete_object():
+    assert extract_json_object('  {"a": 1, "b": [1, 2]}\n') == ({"a": 1, "b": [1, 2]}, COMPLETE)
+
+
+def test_object_inside_markdown_is_extracted():
+    text = 'Kết quả:\n```json\n{"name": "Cảm cúm", "note": "dấu } trong chuỗi"}\n```'
+    assert extract_json_object(text) == ({"name": "Cảm cúm", "note": "dấu } trong chuỗi"}, EXTRACTED)
+
+
+def test_trailing_commas_are_removed():
+    assert extract_json_object('{"a": [1, 2,], "b": 3,}') == ({"a": [1, 2], "b": 3}, COMPLETE)
+
+
+def test_truncated_string_value_is_kept():
+    parsed, status = extract_json_object('{"name": "Viêm họng", "description": "Đau họng và s')
+    assert status == REPAIRED
+    assert parsed == {"name": "Viêm họng", "description": "Đau họng và s"}
+
+
+def test_truncated_nested_structure_is_closed():
+    parsed, status = extract_json_object('{"items": [{"a": 1}, {"a": 2')
+    assert status == REPAIRED
+    assert parsed == {"items": [{"a": 1}, {"a": 2}]}
+
+
+def test_truncated_key_falls_back_to_last_complete_value():
+    parsed, status = extract_json_object('{"a": 1, "b": {"c": 2}, "unfinished_ke')
+    assert status == REPAIRED
+    assert parsed == {"a": 1, "b": {"c": 2}}
+
+
+def test_truncated_after_colon_drops_dangling_member():
+    parsed, status = extract_json_object('{"a": 1, "b": ')
+    assert status == REPAIRED
+    assert parsed == {"a": 1}
+
+
+def test_no_object():
+    assert extract_json_object("không có json") == (None, NOT_FOUND)
+
+
+def test_invalid_balanced_object():
+    assert extract_json_object("{khong hop le}") == (None, NOT_FOUND)
+
+
+def test_strip_think_removes_closed_and_unclosed_blocks():
+    assert strip_think('<think>a</think>{"x": 1}') == '{"x": 1}'
+    assert strip_think('{"x": 1}<think>đang nghĩ') == '{"x": 1}'
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from services.llm_providers import LLMCompletion, LLMProvider, LLMRouter
+
+
+class FakeProvider(LLMProvider):
+    def __init__(self, name: str, delay: float = 0.0, error: Exception = None):
+        super().__init__(model=f"{name}-model")
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def complete(self, messages, json_mode=False, **params) -> LLMCompletion:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return LLMCompletion(content="{}", provider=self.name, model=self.model, latency=self.delay)
+
+    async def aclose(self):
+        pass
+
+
+def names(providers):
+    return [provider.name for provider in providers]
+
+
+def test_ranks_by_p50_and_puts_unmeasured_last():
+    slow, fast, new = FakeProvider("slow"), FakeProvider("fast"), FakeProvider("new")
+    router = LLMRouter([new, slow, fast])
+    for _ in range(3):
+        router.stats["slow"].record(True, 2.0)
+        router.stats["fast"].record(True, 0.5)
+    assert names(router.ranked_providers()) == ["fast", "slow", "new"]
+
+
+def test_unhealthy_provider_is_ranked_last():
+    first, second = FakeProvider("first"), FakeProvider("second")
+    router = LLMRouter([first, second], error_rate_threshold=0.5, min_samples=4)
+    for _ in range(4):
+        router.stats["first"].record(True, 0.1)
+        router.stats["second"].record(True, 1.0)
+    assert names(router.ranked_providers()) == ["first", "second"]
+    for _ in range(4):
+        router.record_failure("first")
+    assert not router.is_healthy(first)
+    assert names(router.ranked_providers()) == ["second", "first"]
+
+
+def test_fails_over_to_next_provider_on_error():
+    broken = FakeProvider("broken", error=RuntimeError("503"))
+    backup = FakeProvider("backup")
+    router = LLMRouter([broken, backup])
+    completion = asyncio.run(router.complete([{"role": "user", "content": "hi"}]))
+    assert completion.provider == "backup"
+    assert broken.calls == 1
+    assert router.stats["broken"].outcomes[-1] is False
+    assert router.stats["backup"].outcomes[-1] is True
+
+
+def test_timeout_is_recorded_with_latency_and_fails_over():
+    hung = FakeProvider("hung", delay=1.0)
+    backup = FakeProvider("backup")
+    router = LLMRouter([hung, backup], timeout=0.05)
+    completion = asyncio.run(router.complete([]))
+    assert completion.provider == "backup"
+    assert list(router.stats["hung"].outcomes) == [False]
+    assert router.stats["hung"].percentile(0.5) >= 0.05
+
+
+def test_raises_last_error_when_all_providers_fail():
+    router = LLMRouter([FakeProvider("a", error=RuntimeError("a")), FakeProvider("b", error=ValueError("b"))])
+    with pytest.raises(ValueError):
+        asyncio.run(router.complete([]))
+
+
+def test_hedge_returns_faster_secondary():
+    slow = FakeProvider("slow", delay=0.5)
+    fast = FakeProvider("fast")
+    router = LLMRouter([slow, fast], hedge_enabled=True, hedge_min_delay=0.01)
+    completion = asyncio.run(router.complete([]))
+    assert completion.provider == "fast"
+    assert slow.calls == 1 and fast.calls == 1
+
+
+def test_hedge_cancels_loser_and_records_its_wait():
+    slow = FakeProvider("slow", delay=0.5)
+    fast = FakeProvider("fast")
+    router = LLMRouter([slow, fast], hedge_enabled=True, hedge_min_delay=0.01)
+    asyncio.run(router.complete([]))
+    assert list(router.stats["slow"].outcomes) == []
+    assert len(router.stats["slow"].latencies) == 1
+
+
+def test_hedge_switches_when_primary_fails_during_delay():
+    broken = FakeProvider("broken", error=RuntimeError("503"))
+    backup = FakeProvider("backup")
+    router = LLMRouter([broken, backup], hedge_enabled=True, hedge_min_delay=1.0)
+    completion = asyncio.run(router.complete([]))
+    assert completion.provider == "backup"
+    assert list(router.stats["broken"].outcomes) == [False]
+
+
+def test_cancelling_during_hedge_delay_cancels_provider_call():
+    async def run():
+        hung = FakeProvider("hung", delay=10)
+        router = LLMRouter([hung, FakeProvider("backup")], hedge_enabled=True, hedge_min_delay=5)
+        request = asyncio.create_task(router.complete([]))
+        await asyncio.sleep(0.01)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        await asyncio.sleep(0)
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return router, pending
+
+    router, pending = asyncio.run(run())
+    assert pending == []
+    assert len(router.stats["hung"].latencies) == 1
@@ -0,0 +1,143 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from routes.consultation import get_user_consultations, recommend_medicines_for_consultation
+from services import search_cursor
+from services.search_cursor import (
+    MemorySearchCursorBackend,
+    MongoSearchCursorBackend,
+    SearchCursorStore,
+    decode_cursor,
+    decode_keyset_cursor,
+    encode_cursor,
+    encode_keyset_cursor,
+    get_search_cursor_store,
+)
+
+
+def forge(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def response_errors(response) -> str:
+    return json.loads(response.body)["errors"]
+
+
+def test_offset_cursor_round_trip():
+    cursor = encode_cursor("abc123", 8)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("abc123", 8)
+
+
+def test_offset_cursor_rejects_tampering():
+    assert decode_cursor("không-phải-base64") is None
+    assert decode_cursor(encode_cursor("abc", 4)[:-3]) is None
+    assert decode_cursor(forge({"t": "abc", "o": -1})) is None
+    assert decode_cursor(forge({"t": 123, "o": 0})) is None
+    assert decode_cursor(forge({"t": "abc", "o": "x"})) is None
+    assert decode_cursor(forge({"t": "abc"})) is None
+
+
+def test_keyset_cursor_round_trip():
+    created_at = datetime(2026, 1, 2, 3, 4, 5, 678000)
+    document_id = ObjectId()
+    assert decode_keyset_cursor(encode_keyset_cursor(created_at, str(document_id))) == (created_at, document_id)
+
+
+def test_keyset_cursor_without_created_at():
+    document_id = ObjectId()
+    assert decode_keyset_cursor(encode_keyset_cursor(None, str(document_id))) == (None, document_id)
+
+
+def test_keyset_cursor_rejects_tampering():
+    valid_id = str(ObjectId())
+    assert decode_keyset_cursor("%%%") is None
+    assert decode_keyset_cursor(forge({"c": "hôm qua", "i": valid_id})) is None
+    assert decode_keyset_cursor(forge({"c": "2026-01-01T00:00:00", "i": "not-an-id"})) is None
+    assert decode_keyset_cursor(forge({"i": valid_id})) is None
+    # Cursor offset không dùng được cho phân trang keyset
+    assert decode_keyset_cursor(encode_cursor("abc", 4)) is None
+
+
+def test_memory_store_expires_and_evicts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(search_cursor.time, "monotonic", lambda: now[0])
+    store = SearchCursorStore(MemorySearchCursorBackend(ttl_seconds=10, max_entries=2))
+
+    async def run():
+        first = await store.save([0.1], {"medicine_id": "a"})
+        assert (await store.get(first))["context"] == {"medicine_id": "a"}
+        now[0] += 11
+        assert await store.get(first) is None
+
+        oldest = await store.save([0.1], {})
+        newer = await store.save([0.2], {})
+        newest = await store.save([0.3], {})
+        assert await store.get(oldest) is None
+        assert await store.get(newer) is not None and await store.get(newest) is not None
+
+    asyncio.run(run())
+
+
+def test_mongo_store_is_shared_between_workers(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = mongomock_motor.AsyncMongoMockClient()["pharmacy"]
+    monkeypatch.setattr(search_cursor, "get_database", lambda: database)
+
+    async def run():
+        worker_a = SearchCursorStore(MongoSearchCursorBackend(ttl_seconds=600))
+        worker_b = SearchCursorStore(MongoSearchCursorBackend(ttl_seconds=600))
+        token = await worker_a.save([0.1, 0.2], {"consultation_id": "c1", "search_query": "Điều trị cảm cúm"})
+        entry = await worker_b.get(token)
+        assert entry == {
+            "embedding": [0.1, 0.2],
+            "context": {"consultation_id": "c1", "search_query": "Điều trị cảm cúm"},
+        }
+        assert await worker_b.get("khong-ton-tai") is None
+        # Entry quá hạn nhưng TTL monitor chưa xóa thì không được dùng
+        await database["search_cursors"].update_one(
+            {"_id": token}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        assert await worker_b.get(token) is None
+
+    asyncio.run(run())
+
+
+def test_store_backend_errors_are_misses():
+    class BrokenBackend:
+        async def save(self, token, entry):
+            raise ConnectionError("mongo down")
+
+        async def get(self, token):
+            raise ConnectionError("mongo down")
+
+    store = SearchCursorStore(BrokenBackend())
+    assert asyncio.run(store.save([0.1], {})) is None
+    assert asyncio.run(store.get("abc")) is None
+
+
+def test_recommend_rejects_cursor_of_another_consultation():
+    token = asyncio.run(get_search_cursor_store().save([0.1, 0.2], {"consultation_id": "consultation-a"}))
+    cursor = encode_cursor(token, 4)
+    response = asyncio.run(recommend_medicines_for_consultation(None, "consultation-b", cursor=cursor))
+    assert response.status_code == 400
+    assert response_errors(response) == "Cursor không hợp lệ hoặc đã hết hạn"
+
+
+def test_recommend_rejects_unknown_token():
+    cursor = encode_cursor("het-han", 4)
+    response = asyncio.run(recommend_medicines_for_consultation(None, "consultation-a", cursor=cursor))
+    assert response.status_code == 400
+    assert response_errors(response) == "Cursor không hợp lệ hoặc đã hết hạn"
+
+
+def test_history_rejects_tampered_cursor():
+    response = asyncio.run(get_user_consultations("user", cursor=forge({"c": "x", "i": "y"})))
+    assert response.status_code == 400
+    assert response_errors(response) == "Cursor không hợp lệ"
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": [1, 2]}
+
+    async def run():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(3)))
+        return flight, results
+
+    flight, results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [coalesced for _, coalesced in results] == [False, True, True]
+    assert all(result == {"value": [1, 2]} for result, _ in results)
+    # Request được gộp nhận bản sao để không sửa chung kết quả của leader
+    assert results[1][0] is not results[0][0]
+    assert flight._calls == {}
+
+
+def test_different_keys_run_separately():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return len(calls)
+
+    async def run():
+        flight = SingleFlight("test")
+        return await asyncio.gather(flight.do("a", work), flight.do("b", work))
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    async def run():
+        flight = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        leader = asyncio.create_task(flight.do("key", work))
+        follower = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == ("done", True)
+
+
+def test_call_is_cancelled_when_all_waiters_cancel():
+    async def run():
+        flight = SingleFlight("test")
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await started.wait()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        return flight
+
+    flight = asyncio.run(run())
+    assert flight._calls == {}
+
+
+def test_error_is_shared_and_key_is_released():
+    async def run():
+        flight = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError("lỗi")
+
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        return flight, results
+
+    flight, results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight._calls == {}
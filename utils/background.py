@@ -0,0 +1,30 @@
+import asyncio
+import logging
+from typing import Awaitable, Set
+
+logger = logging.getLogger(__name__)
+
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def spawn(awaitable: Awaitable, name: str = None) -> asyncio.Task:
+    """
+    Chạy công việc nền không chặn request, giữ tham chiếu tới task cho đến khi hoàn thành
+
+    Args:
+        awaitable: Coroutine cần chạy nền
+        name: Tên task (dùng khi log lỗi)
+
+    Returns:
+        Task đã được tạo
+    """
+    task = asyncio.ensure_future(awaitable)
+    _background_tasks.add(task)
+
+    def _on_done(done: asyncio.Task):
+        _background_tasks.discard(done)
+        if not done.cancelled() and done.exception() is not None:
+            logger.error(f"Lỗi trong tác vụ nền {name or done}: {done.exception()}")
+
+    task.add_done_callback(_on_done)
+    return task
@@ -0,0 +1,93 @@
+import gzip
+from typing import Dict, List, Optional, Set
+
+from fastapi import Request, Response
+
+from config.config import get_settings
+from utils.http_cache import encoded_etag, not_modified_total
+from utils.metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli là tùy chọn, không có thì chỉ dùng gzip
+    brotli = None
+
+response_bytes = metrics.counter(
+    "http_response_bytes_total", "Số byte body response theo endpoint, trước (raw) và sau nén (sent)"
+)
+compressed_responses = metrics.counter(
+    "http_compressed_responses_total", "Số response theo endpoint và encoding (br/gzip/identity)"
+)
+
+_endpoints: Set[str] = set()
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Chọn encoding theo Accept-Encoding của client: ưu tiên br (nếu có thư viện brotli), sau đó gzip"""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress_response(request: Request, response: Response, endpoint: str) -> Response:
+    """Nén body response theo encoding client hỗ trợ khi body vượt ngưỡng, ghi nhận số byte tiết kiệm"""
+    settings = get_settings()
+    body = response.body
+    response.headers["Vary"] = "Accept-Encoding"
+    encoding = None
+    if settings.COMPRESSION_ENABLED and len(body) >= settings.COMPRESSION_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding == "br":
+        response.body = brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    elif encoding == "gzip":
+        response.body = gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+        response.headers["Content-Length"] = str(len(response.body))
+        if "etag" in response.headers:
+            response.headers["ETag"] = encoded_etag(response.headers["etag"], encoding)
+    _endpoints.add(endpoint)
+    response_bytes.inc(len(body), endpoint=endpoint, kind="raw")
+    response_bytes.inc(len(response.body), endpoint=endpoint, kind="sent")
+    compressed_responses.inc(endpoint=endpoint, encoding=encoding or "identity")
+    return response
+
+
+def compression_report() -> List[Dict]:
+    """Số byte tiết kiệm theo endpoint nhờ nén và nhờ 304 (ước tính theo kích thước trung bình đã gửi)"""
+    report = []
+    for endpoint in sorted(_endpoints):
+        raw = response_bytes.value(endpoint=endpoint, kind="raw")
+        sent = response_bytes.value(endpoint=endpoint, kind="sent")
+        responses = sum(
+            compressed_responses.value(endpoint=endpoint, encoding=encoding) for encoding in ("br", "gzip", "identity")
+        )
+        not_modified = not_modified_total.value(endpoint=endpoint)
+        average_sent = sent / responses if responses else 0.0
+        report.append(
+            {
+                "endpoint": endpoint,
+                "responses": int(responses),
+                "not_modified": int(not_modified),
+                "raw_bytes": int(raw),
+                "sent_bytes": int(sent),
+                "compression_saved_bytes": int(raw - sent),
+                "compression_ratio": round(sent / raw, 3) if raw else None,
+                "not_modified_saved_bytes_estimate": int(not_modified * average_sent),
+            }
+        )
+    return report
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Awaitable, TypeVar
+
+from fastapi import Request
+
+T = TypeVar("T")
+
+
+class ClientDisconnectedError(Exception):
+    """Client đã ngắt kết nối trước khi xử lý xong request"""
+
+
+async def cancel_on_disconnect(
+    request: Request, awaitable: Awaitable[T], poll_interval: float = 0.5
+) -> T:
+    """
+    Chạy awaitable và hủy nó nếu client ngắt kết nối giữa chừng
+
+    Args:
+        request: Request hiện tại
+        awaitable: Công việc cần chạy (ví dụ lời gọi LLM)
+        poll_interval: Chu kỳ kiểm tra trạng thái kết nối (giây)
+
+    Returns:
+        Kết quả của awaitable
+
+    Raises:
+        ClientDisconnectedError: Khi client ngắt kết nối và công việc đã bị hủy
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                raise ClientDisconnectedError()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
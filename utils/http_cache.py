@@ -0,0 +1,71 @@
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request, Response
+
+from utils.http_response import dumps
+from utils.metrics import metrics
+
+not_modified_total = metrics.counter(
+    "http_not_modified_total", "Số response 304 Not Modified theo endpoint (không cần tạo lại body)"
+)
+
+CACHE_CONTROL = "private, no-cache"
+# Mỗi encoding là một representation khác nhau nên ETag mạnh được thêm hậu tố encoding
+ENCODING_SUFFIXES = ("-br", "-gzip")
+
+
+def result_etag(endpoint: str, params: Dict[str, Any], results: List[Dict[str, Any]], index_version: int) -> str:
+    """
+    ETag mạnh cho kết quả tìm kiếm, tính từ id + điểm tương đồng của kết quả, tham số request
+    và phiên bản chỉ mục thuốc (đổi khi thuốc được embedding lại/cập nhật/xóa)
+    """
+    key = [
+        endpoint,
+        index_version,
+        params,
+        [(result["medicine_id"], round(float(result["similarity_score"]), 6)) for result in results],
+    ]
+    return '"' + hashlib.blake2b(dumps(key), digest_size=16).hexdigest() + '"'
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag của representation đã nén (thêm hậu tố encoding vào trong dấu nháy)"""
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def etag_matches(request: Request, etag: str) -> Optional[str]:
+    """
+    Tìm ETag trong If-None-Match khớp với kết quả hiện tại (so sánh yếu theo RFC 9110, bỏ tiền tố W/
+    và hậu tố encoding). Trả về ETag client gửi để dùng lại trong 304, None nếu không khớp
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    for candidate in (item.strip() for item in header.split(",")):
+        if candidate == "*":
+            return etag
+        opaque = candidate.removeprefix("W/")
+        base = opaque
+        for suffix in ENCODING_SUFFIXES:
+            if base.endswith(f'{suffix}"'):
+                base = base[: -len(suffix) - 1] + '"'
+                break
+        if base == etag:
+            return opaque
+    return None
+
+
+def not_modified(endpoint: str, etag: str) -> Response:
+    """Response 304: client dùng lại bản đã lưu, server không phải lấy thông tin thuốc và tạo body"""
+    not_modified_total.inc(endpoint=endpoint)
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"},
+    )
+
+
+def set_etag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
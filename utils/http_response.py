@@ -1,15 +1,47 @@
-from typing import List, Optional, TypeVar, Union
+from decimal import Decimal
+from typing import Any, List, Optional, TypeVar, Union
+
+import orjson
 from fastapi.responses import JSONResponse
+from pydantic import BaseModel
 
 T = TypeVar("T")
 
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    """Kiểu orjson không tự serialize được: model pydantic, set, Decimal, ObjectId..."""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Serialize dữ liệu thành JSON (UTF-8) bằng orjson.
+    Hỗ trợ sẵn UUID, datetime, dataclass, numpy; ObjectId và các kiểu khác được chuyển thành chuỗi
+    """
+    return orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse dùng orjson thay cho json.dumps của thư viện chuẩn"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
 
 def json(
     data: Optional[Union[T, List[T]]] = None,
     message: str = "Thành công",
     status: int = 200,
     locale: str = "en",
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Tạo response thành công theo định dạng chuẩn
 
@@ -20,7 +52,7 @@ def json(
         locale: Ngôn ngữ
 
     Returns:
-        JSONResponse với status code chính xác
+        FastJSONResponse với status code chính xác
     """
     response_data = {
         "data": data,
@@ -29,7 +61,7 @@ def json(
         "locale": locale,
         "errors": None,
     }
-    return JSONResponse(content=response_data, status_code=status)
+    return FastJSONResponse(content=response_data, status_code=status)
 
 
 def fail(
@@ -37,7 +69,7 @@ def fail(
     status: int = 500,
     errors: Optional[List[str]] = None,
     locale: str = "vi",
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Tạo response lỗi theo định dạng chuẩn
 
@@ -48,7 +80,7 @@ def fail(
         locale: Ngôn ngữ
 
     Returns:
-        JSONResponse với status code lỗi chính xác
+        FastJSONResponse với status code lỗi chính xác
     """
     response_data = {
         "data": None,
@@ -57,14 +89,14 @@ def fail(
         "locale": locale,
         "errors": errors or message,
     }
-    return JSONResponse(content=response_data, status_code=status)
+    return FastJSONResponse(content=response_data, status_code=status)
 
 
 def validation(
     validation_errors: List[str],
     message: str = "Dữ liệu đầu vào không hợp lệ",
     locale: str = "vi",
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Tạo response lỗi validation
 
@@ -74,7 +106,7 @@ def validation(
         locale: Ngôn ngữ
 
     Returns:
-        JSONResponse với status code 400
+        FastJSONResponse với status code 400
     """
     response_data = {
         "data": None,
@@ -83,10 +115,10 @@ def validation(
         "locale": locale,
         "errors": "; ".join(validation_errors),
     }
-    return JSONResponse(content=response_data, status_code=400)
+    return FastJSONResponse(content=response_data, status_code=400)
 
 
-def not_found(resource: str = "Tài nguyên", locale: str = "vi") -> JSONResponse:
+def not_found(resource: str = "Tài nguyên", locale: str = "vi") -> FastJSONResponse:
     """
     Tạo response không tìm thấy
 
@@ -95,7 +127,7 @@ def not_found(resource: str = "Tài nguyên", locale: str = "vi") -> JSONRespons
         locale: Ngôn ngữ
 
     Returns:
-        JSONResponse với status code 404
+        FastJSONResponse với status code 404
     """
     response_data = {
         "data": None,
@@ -104,11 +136,11 @@ def not_found(resource: str = "Tài nguyên", locale: str = "vi") -> JSONRespons
         "locale": locale,
         "errors": f"{resource} không tồn tại trong hệ thống",
     }
-    return JSONResponse(content=response_data, status_code=404)
+    return FastJSONResponse(content=response_data, status_code=404)
 
 def unauthorized(message: str = "Không có quyền truy cập",
     locale: str = "vi"
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     Tạo response không có quyền truy cập
 
@@ -117,7 +149,7 @@ def unauthorized(message: str = "Không có quyền truy cập",
         locale: Ngôn ngữ
 
     Returns:
-        JSONResponse với status code 401
+        FastJSONResponse với status code 401
     """
     response_data = {
         "data": None,
@@ -126,4 +158,4 @@ def unauthorized(message: str = "Không có quyền truy cập",
         "locale": locale,
         "errors": message
     }
-    return JSONResponse(content=response_data, status_code=401)
+    return FastJSONResponse(content=response_data, status_code=401)
@@ -0,0 +1,93 @@
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+_THINK_BLOCK = re.compile(r"<think>.*?</think>", flags=re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+# Trạng thái trả về của extract_json_object
+COMPLETE = "complete"  # Object đầy đủ, không có text thừa
+EXTRACTED = "extracted"  # Object đầy đủ nhưng nằm giữa text/markdown thừa
+REPAIRED = "repaired"  # Output bị cắt, đã đóng lại các string/array/object còn mở
+NOT_FOUND = "not_found"
+
+
+def strip_think(text: str) -> str:
+    """Bỏ các khối <think>...</think>; khối think chưa đóng (bị cắt) thì bỏ toàn bộ phần sau"""
+    text = _THINK_BLOCK.sub("", text)
+    index = text.find("<think>")
+    return text[:index] if index != -1 else text
+
+
+def _closers(stack: List[str]) -> str:
+    return "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+
+
+def _loads(candidate: str) -> Any:
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        # Lỗi hay gặp của LLM: dấu phẩy thừa trước } hoặc ]
+        return json.loads(_TRAILING_COMMA.sub(r"\1", candidate))
+
+
+def extract_json_object(text: str) -> Tuple[Optional[Any], str]:
+    """
+    Tìm object JSON cân bằng đầu tiên trong text. Nếu text bị cắt giữa chừng thì sửa bằng cách
+    đóng string/array/object đang mở, lùi về giá trị hoàn chỉnh gần nhất khi cần.
+    Trả về (object, trạng thái)
+    """
+    start = text.find("{")
+    if start == -1:
+        return None, NOT_FOUND
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    # Các vị trí cắt an toàn: ngay sau một giá trị hoàn chỉnh hoặc ngay sau dấu mở
+    checkpoints: List[Tuple[int, List[str]]] = []
+    for pos in range(start, len(text)):
+        char = text[pos]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+            checkpoints.append((pos + 1, list(stack)))
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                candidate = text[start : pos + 1]
+                try:
+                    parsed = _loads(candidate)
+                except ValueError:
+                    return None, NOT_FOUND
+                status = COMPLETE if not text[:start].strip() and not text[pos + 1 :].strip() else EXTRACTED
+                return parsed, status
+            checkpoints.append((pos + 1, list(stack)))
+        elif char == ",":
+            checkpoints.append((pos, list(stack)))
+
+    body = text[start:]
+    candidates = []
+    if in_string:
+        # Giữ phần string dang dở (vd mô tả bị cắt giữa câu) nếu nó là giá trị, không phải key
+        partial = body[:-1] if escape else body
+        candidates.append(partial + '"' + _closers(stack))
+    candidates.append(body.rstrip() + _closers(stack))
+    for checkpoint, checkpoint_stack in reversed(checkpoints):
+        candidates.append(text[start:checkpoint] + _closers(checkpoint_stack))
+    for candidate in candidates:
+        try:
+            return _loads(candidate), REPAIRED
+        except ValueError:
+            continue
+    return None, NOT_FOUND
@@ -0,0 +1,172 @@
+import bisect
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _label_name(key: LabelKey) -> str:
+    return ",".join(f"{name}={value}" for name, value in key) or "_"
+
+
+def _pick(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))]
+
+
+class Counter:
+    """Bộ đếm tăng dần theo nhãn"""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {_label_name(key): value for key, value in self._values.items()}
+
+
+class Gauge(Counter):
+    """Giá trị tức thời theo nhãn"""
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Phân phối giá trị (độ trễ, kích thước...) theo bucket, kèm percentile từ cửa sổ mẫu gần nhất"""
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        window: int = 1024,
+    ):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+        self._series: Dict[LabelKey, Dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "buckets": [0] * (len(self.buckets) + 1),
+                    "samples": deque(maxlen=self.window),
+                }
+                self._series[key] = series
+            series["count"] += 1
+            series["sum"] += value
+            series["buckets"][bisect.bisect_left(self.buckets, value)] += 1
+            series["samples"].append(value)
+
+    def percentile(self, q: float, **labels) -> Optional[float]:
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            samples = list(series["samples"]) if series else []
+        return _pick(sorted(samples), q)
+
+    def summary(self, **labels) -> Dict:
+        """Gộp mọi series có chứa các nhãn đã cho (ví dụ theo profile, bất kể model/mode)"""
+        wanted = set(_label_key(labels))
+        count, total, samples = 0, 0.0, []
+        with self._lock:
+            for key, series in self._series.items():
+                if wanted.issubset(key):
+                    count += series["count"]
+                    total += series["sum"]
+                    samples.extend(series["samples"])
+        ordered = sorted(samples)
+        return {"count": count, "sum": total, "p50": _pick(ordered, 0.5), "p95": _pick(ordered, 0.95)}
+
+    def snapshot(self) -> Dict[str, Dict]:
+        result = {}
+        with self._lock:
+            items = [(key, dict(series, samples=list(series["samples"]))) for key, series in self._series.items()]
+        for key, series in items:
+            ordered = sorted(series["samples"])
+            bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+            cumulative, running = {}, 0
+            for bound, count in zip(bounds, series["buckets"]):
+                running += count
+                cumulative[bound] = running
+            result[_label_name(key)] = {
+                "count": series["count"],
+                "sum": round(series["sum"], 6),
+                "p50": _pick(ordered, 0.5),
+                "p95": _pick(ordered, 0.95),
+                "p99": _pick(ordered, 0.99),
+                "buckets": cumulative,
+            }
+        return result
+
+
+class MetricsRegistry:
+    """Registry metrics trong process, xuất qua endpoint /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(
+        self, name: str, description: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, description, buckets)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {
+                "type": type(metric).__name__.lower(),
+                "description": metric.description,
+                "values": metric.snapshot(),
+            }
+            for metric in metrics
+        }
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Dict
+
+from pymongo import monitoring
+
+from utils.metrics import metrics
+
+pool_connections = metrics.gauge("mongo_pool_connections", "Số kết nối đang mở trong pool MongoDB")
+pool_checked_out = metrics.gauge("mongo_pool_checked_out", "Số kết nối đang được sử dụng")
+pool_utilization = metrics.gauge(
+    "mongo_pool_utilization", "Tỉ lệ kết nối đang dùng so với maxPoolSize (0-1)"
+)
+pool_checkout_wait = metrics.histogram(
+    "mongo_pool_checkout_wait_seconds", "Thời gian chờ lấy kết nối từ pool"
+)
+pool_events = metrics.counter(
+    "mongo_pool_events_total", "Sự kiện của pool MongoDB (created, closed, checkout_failed, cleared)"
+)
+write_ops = metrics.counter(
+    "mongo_write_ops_total", "Số lệnh ghi gửi tới MongoDB theo lệnh (insert, update, delete...) và kết quả"
+)
+write_op_latency = metrics.histogram("mongo_write_op_seconds", "Thời gian thực thi lệnh ghi MongoDB")
+
+WRITE_COMMANDS = {"insert", "update", "delete", "findAndModify"}
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Theo dõi pool kết nối của pymongo và xuất metrics (số kết nối, mức sử dụng, thời gian chờ)"""
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._open: Dict[str, int] = defaultdict(int)
+        self._checked_out: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        # Motor chạy pymongo trong thread pool: check out bắt đầu và kết thúc trên cùng một thread
+        self._local = threading.local()
+
+    @staticmethod
+    def _address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def _update(self, address: str, open_delta: int = 0, checked_out_delta: int = 0):
+        with self._lock:
+            self._open[address] = max(0, self._open[address] + open_delta)
+            self._checked_out[address] = max(0, self._checked_out[address] + checked_out_delta)
+            pool_connections.set(self._open[address], address=address)
+            pool_checked_out.set(self._checked_out[address], address=address)
+            if self.max_pool_size:
+                pool_utilization.set(self._checked_out[address] / self.max_pool_size, address=address)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pool_events.inc(event="cleared")
+
+    def pool_closed(self, event):
+        address = self._address(event)
+        with self._lock:
+            self._open[address] = 0
+            self._checked_out[address] = 0
+        self._update(address)
+
+    def connection_created(self, event):
+        pool_events.inc(event="created")
+        self._update(self._address(event), open_delta=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pool_events.inc(event="closed")
+        self._update(self._address(event), open_delta=-1)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        pool_events.inc(event="checkout_failed")
+        self._observe_wait()
+
+    def connection_checked_out(self, event):
+        self._observe_wait()
+        self._update(self._address(event), checked_out_delta=1)
+
+    def connection_checked_in(self, event):
+        self._update(self._address(event), checked_out_delta=-1)
+
+    def _observe_wait(self):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+            self._local.started = None
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Đếm các lệnh ghi gửi tới MongoDB (một insert_many là một lệnh insert) để đo số round-trip ghi"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name in WRITE_COMMANDS:
+            write_ops.inc(command=event.command_name, outcome="ok")
+            write_op_latency.observe(event.duration_micros / 1_000_000, command=event.command_name)
+
+    def failed(self, event):
+        if event.command_name in WRITE_COMMANDS:
+            write_ops.inc(command=event.command_name, outcome="error")
+
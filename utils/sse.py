@@ -0,0 +1,24 @@
+from typing import Any
+
+from utils.http_response import dumps
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # Tắt buffering của nginx để client nhận ngay từng event
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    Tạo một Server-Sent Event
+
+    Args:
+        event: Tên event
+        data: Dữ liệu (được serialize thành JSON)
+
+    Returns:
+        Chuỗi event theo định dạng text/event-stream
+    """
+    payload = dumps(data).decode()
+    return f"event: {event}\ndata: {payload}\n\n"